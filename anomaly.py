@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+import warnings
+
+import numpy as np
+import rasterio
+
+import gpp_vat
+import raster_align
+
+
+# Per-pixel climatology and z-score rasters, one subfolder per layer
+ANOMALY_PATH = "anomaly_rasters/"
+
+# Layers with a yearly series on a fixed grid
+ANOMALY_LAYERS = ["precipitation", "gpp"]
+
+
+def layer_folder(layer):
+    return os.path.join(ANOMALY_PATH, layer)
+
+
+def anomaly_path(layer, year):
+    return os.path.join(layer_folder(layer), f"{year}_z.tif")
+
+
+def read_year(layer, year):
+    """Yearly source raster as float64 with NaN for nodata, and its profile."""
+    path = raster_align.list_layer_files(layer)[year]
+    with rasterio.open(path) as src:
+        data = src.read(1).astype(np.float64)
+        if src.nodata is not None:
+            data[data == src.nodata] = np.nan
+        profile = src.profile
+    if layer == "gpp":
+        data[data >= gpp_vat.GPP_FILL_MIN] = np.nan
+    return data, profile
+
+
+class Climatology:
+    """Welford running mean / variance per pixel, saved as a 3-band GeoTIFF (count, mean, M2)
+    plus a JSON with the years it contains and their file times."""
+
+    def __init__(self, layer):
+        self.layer = layer
+        self.tif_path = os.path.join(layer_folder(layer), "climatology.tif")
+        self.json_path = os.path.join(layer_folder(layer), "climatology.json")
+        self.years = {}
+        self.count = self.mean = self.m2 = None
+        self.profile = None
+        if os.path.exists(self.tif_path) and os.path.exists(self.json_path):
+            with open(self.json_path) as f:
+                self.years = {int(y): mtime for y, mtime in json.load(f).items()}
+            with rasterio.open(self.tif_path) as src:
+                self.count, self.mean, self.m2 = src.read()
+                self.profile = src.profile
+
+    def add(self, data, profile):
+        """Adds one year to the running statistics (pixels with NaN are skipped)."""
+        if self.count is None:
+            self.count = np.zeros(data.shape)
+            self.mean = np.zeros(data.shape)
+            self.m2 = np.zeros(data.shape)
+            self.profile = profile
+        valid = np.isfinite(data)
+        self.count += valid
+        delta = np.where(valid, data - self.mean, 0.0)
+        self.mean += np.divide(delta, self.count, out=np.zeros_like(delta), where=self.count > 0)
+        self.m2 += delta * np.where(valid, data - self.mean, 0.0)
+
+    def std(self):
+        # Population standard deviation, as np.nanstd
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.sqrt(self.m2 / self.count)
+
+    def update(self):
+        """Adds the years not yet in the climatology. A year whose file changed since it was
+        added cannot be taken out of the running sums, so the climatology is rebuilt.
+        Returns the years added."""
+        files = raster_align.list_layer_files(self.layer)
+        changed = [y for y, mtime in self.years.items() if y not in files or os.path.getmtime(files[y]) > mtime]
+        if changed:
+            self.years, self.count = {}, None
+        added = [y for y in files if y not in self.years]
+        for year in added:
+            data, profile = read_year(self.layer, year)
+            self.add(data, profile)
+            self.years[year] = os.path.getmtime(files[year])
+        if added:
+            self.save()
+        return added
+
+    def save(self):
+        os.makedirs(layer_folder(self.layer), exist_ok=True)
+        profile = dict(self.profile, dtype="float64", count=3, nodata=None, compress="deflate")
+        with rasterio.open(self.tif_path, "w", **profile) as dst:
+            dst.write(np.stack([self.count, self.mean, self.m2]))
+        with open(self.json_path, "w") as f:
+            json.dump(self.years, f)
+
+
+def build_anomalies(layer):
+    """Updates the climatology of a layer and writes the z-score raster of every year that is
+    missing or older than the climatology. Only one year is in memory at a time."""
+    clim = Climatology(layer)
+    clim.update()
+    if clim.count is None:
+        return []
+    std = clim.std()
+    std[std == 0] = np.nan
+    profile = dict(clim.profile, dtype="float32", count=1, nodata=np.nan, compress="deflate")
+    clim_mtime = os.path.getmtime(clim.tif_path)
+
+    for year in clim.years:
+        out_path = anomaly_path(layer, year)
+        if os.path.exists(out_path) and os.path.getmtime(out_path) >= clim_mtime:
+            continue
+        data, _ = read_year(layer, year)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            z = ((data - clim.mean) / std).astype(np.float32)
+        with rasterio.open(out_path, "w", **profile) as dst:
+            dst.write(z, 1)
+    return sorted(clim.years)
+
+
+def anomaly_files(layer):
+    """Sorted file names of the z-score rasters of a layer (built or updated first)."""
+    return [os.path.basename(anomaly_path(layer, year)) for year in build_anomalies(layer)]
+
+
+if __name__ == "__main__":
+    # Usage: python anomaly.py [layer ...]
+    for layer in sys.argv[1:] or ANOMALY_LAYERS:
+        years = build_anomalies(layer)
+        print(f"{layer}: {years[0]}-{years[-1]} ({len(years)} years) -> {layer_folder(layer)}")
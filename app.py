@@ -1,5 +1,4 @@
 import streamlit as st
-import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
@@ -8,79 +7,28 @@ import numpy as np
 import geopandas as gpd
 
 import pydeck as pdk
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 
-from PIL import Image
-import time
-import rasterio
 from rasterio.plot import show
 
-
-# Funzione per aggiornare il frame del player 1
-def update_frame_1():
-    if st.session_state.play_1:
-        # Incrementa l'indice del frame
-        st.session_state.frame_index_1 = (st.session_state.frame_index_1 + 1) % len(tif_files_sorted_1)
-        time.sleep(0.5)  # Ritardo di 0.5 secondo
-        st.rerun()  # Riavvia l'app per aggiornare il frame
-
-# Funzione per aggiornare il frame del player 2
-def update_frame_2():
-    if st.session_state.play_2:
-        # Incrementa l'indice del frame
-        st.session_state.frame_index_2 = (st.session_state.frame_index_2 + 1) % len(tif_files_sorted_2)
-        time.sleep(0.5)  # Ritardo di 0.5 secondo
-        st.rerun()  # Riavvia l'app per aggiornare il frame
-
-# Funzione per aggiornare il frame del player 3
-def update_frame_3():
-    if st.session_state.play_3:
-        # Incrementa l'indice del frame
-        st.session_state.frame_index_3 = (st.session_state.frame_index_3 + 1) % len(tif_files_sorted_3)
-        time.sleep(0.5)  # Ritardo di 1 secondo
-        st.rerun()  # Riavvia l'app per aggiornare il frame
-
-# Funzione per aggiornare il frame del player 4
-def update_frame_4():
-    if st.session_state.play_4:
-        # Incrementa l'indice del frame
-        st.session_state.frame_index_4 = (st.session_state.frame_index_4 + 1) % len(tif_files_sorted_4)
-        time.sleep(0.5)  # Ritardo di 1 secondo
-        st.rerun()  # Riavvia l'app per aggiornare il frame
-
-
-# Funzione per caricare e ordinare i file .tif
-def load_and_sort_tif_files(folder_path):
-    tif_files = [
-        f for f in os.listdir(folder_path)
-        if f.endswith('.tif') and f[:4].isdigit() and 'R' in f
-    ]
-    return sorted(tif_files, key=lambda x: int(x[:4]))
-
-# Funzione per caricare e ordinare i file .tif
-def load_and_sort_tif_files2(folder_path):
-    tif_files = [
-        f for f in os.listdir(folder_path)
-        if f.endswith('.tif') and f[:4].isdigit() and '_GP' in f
-    ]
-    return sorted(tif_files, key=lambda x: int(x[:4]))
-
-def load_and_sort_tif_files3(folder_path):
-    tif_files = [
-        f for f in os.listdir(folder_path)
-        if f.endswith('.tif') and f[11:15].isdigit() and 'Assaba' in f
-    ]
-    return sorted(tif_files, key=lambda x: int(x[11:15]))
-
-# Funzione per caricare e ordinare i file .tif
-def load_and_sort_tif_files4(folder_path):
-    tif_files = [
-        f for f in os.listdir(folder_path)
-        if f.endswith('.tif') and f[:4].isdigit() and 'LCT' in f
-    ]
-    return sorted(tif_files, key=lambda x: int(x[:4]))
-
-
+import ingest
+import partitions
+import anomaly
+import choropleth
+import exposure
+import frame_prefetch
+import gpp_vat
+import hotspots
+import query_backend
+import raster_align
+import raster_catalog
+import raster_roi
+import season
+import shared_cache
+import spi
+import temporal
+import tile_server
 
 
 # --- PAGE CONFIGURATION ---
@@ -92,27 +40,82 @@ if "selected_page" not in st.session_state:
 # --- SIDEBAR MENU ---
 st.sidebar.title("📊 Navigation Menu")
 
-pages = ["Introduction","Rainfall Analysis", "Seasonal Analysis", "Geographical Distribution", "Land Use", "Raw Data", "Credits"]
-page = st.sidebar.radio("Select an analysis:", pages, index=pages.index(st.session_state["selected_page"]))
+pages = ["Introduction","Rainfall Analysis", "Seasonal Analysis", "Drought (SPI)", "Geographical Distribution", "Population Exposure", "Land Use", "Raw Data", "Credits"]
+# The radio is bound to selected_page: the page buttons change it in their callback, before
+# the run, so moving to another page costs a single run
+page = st.sidebar.radio("Select an analysis:", pages, key="selected_page")
+
+
+def go_to_page(step):
+    st.session_state["selected_page"] = pages[(pages.index(st.session_state["selected_page"]) + step) % len(pages)]
+
+
+def page_navigation():
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        st.button("← Previous page", on_click=go_to_page, args=(-1,))
+    with col3:
+        st.button("Next page →", on_click=go_to_page, args=(1,))
+
 
 st.sidebar.title("📱 WebApp settings")
 use_same_slider = st.sidebar.checkbox("Use the same slider for all analyses", value=True)
 
+# Countries available in the partitioned store (only folder names are listed, no data is read)
+available_countries = partitions.list_partitions("rainfall", "country") or ["BFA"]
+country = st.sidebar.selectbox("Country:", available_countries, format_func=lambda c: partitions.COUNTRY_NAMES.get(c, c))
+country_name = partitions.COUNTRY_NAMES.get(country, country)
+
+# Engine used for the rainfall aggregations (dense array or pandas in memory, or DuckDB / Polars over the parquet store)
+backends = query_backend.available_backends()
+backend_name = st.sidebar.selectbox(
+    "Query backend:", backends,
+    index=backends.index(query_backend.DEFAULT_BACKEND) if query_backend.DEFAULT_BACKEND in backends else 0
+)
+
 # --- DATA LOADING AND PREPARATION ---
+# st.cache_data keeps results in this process; shared_cache.memoize shares them between the
+# replicas (disk store or Redis), so a new replica starts warm; the keys carry the generation of
+# the store, as the data versions restart after a rebuild
+@st.cache_data
+@shared_cache.memoize("load_data", scope=ingest.store_generation)
+def load_data(country="BFA", version=0):
+    # Same read path as the query backends: the partitions of the country, else the raw CSV
+    return query_backend.read_rainfall(country)
+
 @st.cache_data
-def load_data():
-    df = pd.read_csv("bfa-rainfall-adm2-full.csv", parse_dates=["date"], low_memory=False)
-    df = df.iloc[1:]  # Remove the first row if not needed
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")  # Convert the 'date' column to datetime
-    df["rfh"] = pd.to_numeric(df["rfh"], errors="coerce")  # Convert rainfall values to numeric
-    return df
+@shared_cache.memoize("load_indicators", scope=lambda: ingest.store_generation("climate-change", "climate-change_bfa.csv"))
+def load_indicators(country="BFA"):
+    if partitions.has_dataset("climate-change"):
+        return partitions.read_dataset("climate-change", country=country)
+    df_land = pd.read_csv("climate-change_bfa.csv")
+    return df_land[df_land["Country Name"] == partitions.COUNTRY_NAMES.get(country, country)]
+
+@st.cache_resource
+def get_rainfall_backend(backend_name, country, version=0):
+    # Only the pandas backend keeps the whole table in memory
+    df = load_data(country, version) if backend_name == "pandas" else None
+    return query_backend.get_backend(backend_name, country, df=df, version=version)
 
-df = load_data()
+@st.cache_data
+@shared_cache.memoize("rainfall_query", scope=ingest.store_generation)
+def cached_rainfall_query(backend_name, country, version, query, *args):
+    backend = get_rainfall_backend(backend_name, country, ingest.data_version(country))
+    return getattr(backend, query)(*args)
+
+def rainfall_query(backend_name, country, query, *args):
+    # Results are cached on the last ingest that touched the queried window,
+    # so appending a new dekad only recomputes the windows that contain it
+    if len(args) >= 2:
+        version = ingest.window_version(country, args[0], args[1])
+    else:
+        version = ingest.data_version(country)
+    return cached_rainfall_query(backend_name, country, version, query, *args)
+
+min_date, max_date = rainfall_query(backend_name, country, "date_bounds")
 
 # --- HANDLE SLIDERS ACROSS PAGES ---
 if use_same_slider:
-    min_date = df["date"].min()
-    max_date = df["date"].max()
     start_date, end_date = st.sidebar.slider(
         "Select the analysis period:",
         min_value=min_date.date(),
@@ -120,6 +123,9 @@ if use_same_slider:
         value=(pd.to_datetime("2010-01-01").date(), pd.to_datetime("2020-12-31").date()),
         format="YYYY-MM-DD"
     )
+else:
+    # Every chart section has its own slider
+    start_date = end_date = None
 
 # --- RAINFALL ANALYSIS ---
 if page == "Introduction":
@@ -150,551 +156,761 @@ This analysis is intended to support policymakers in making informed decisions t
 
 """)
 
-    col1, col2 , col3= st.columns([1, 2, 1])
+    page_navigation()
 
-    with col1:
-        if st.button("← Previous page"):
-            next_page_index = (pages.index(page) - 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
-    with col2:
-        st.write("")
 
-    with col3:
-        if st.button("Next page →"):
-            next_page_index = (pages.index(page) + 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
+elif page == "Rainfall Analysis":
+    st.title(f"📊 Rainfall Analysis in {country_name}")
+
+    @st.fragment
+    def daily_rainfall_section(start_date, end_date):
+        if not use_same_slider:
+            start_date, end_date = st.slider(
+                "Select the analysis period:",
+                min_value=min_date.date(),
+                max_value=max_date.date(),
+                value=(pd.to_datetime("2021-06-01").date(), pd.to_datetime("2022-06-01").date()),
+                format="YYYY-MM-DD"
+            )
 
+        # Aggregate data: daily rainfall sum
+        df_daily_sum = rainfall_query(backend_name, country, "daily_sum", start_date, end_date)
 
-elif page == "Rainfall Analysis":
-    st.title("📊 Rainfall Analysis in Burkina Faso")
-
-    if not use_same_slider:
-        min_date = df["date"].min()
-        max_date = df["date"].max()
-        start_date, end_date = st.slider(
-            "Select the analysis period:",
-            min_value=min_date.date(),
-            max_value=max_date.date(),
-            value=(pd.to_datetime("2021-06-01").date(), pd.to_datetime("2022-06-01").date()),
-            format="YYYY-MM-DD"
-        )
+        # --- PLOT ---
+        fig, ax = plt.subplots(figsize=(12, 6))
+        # Main line showing daily rainfall
+        ax.plot(df_daily_sum["date"], df_daily_sum["rfh"], marker='o', linestyle='-', color='b', linewidth=2, markersize=6, label='Rainfall')
+
+        # Highlight minimum and maximum values if data exists
+        if not df_daily_sum.empty:
+            min_value = df_daily_sum["rfh"].min()
+            max_value = df_daily_sum["rfh"].max()
+            min_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmin(), "date"]
+            max_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmax(), "date"]
+
+            ax.scatter(min_date_point, min_value, color='red', s=100, label="Min Rainfall")
+            ax.scatter(max_date_point, max_value, color='green', s=100, label="Max Rainfall")
+            ax.text(min_date_point, min_value, f"Min: {min_value:.2f} mm", fontsize=10, verticalalignment='bottom', horizontalalignment='right', color='red', fontweight='bold')
+            ax.text(max_date_point, max_value, f"Max: {max_value:.2f} mm", fontsize=10, verticalalignment='top', horizontalalignment='left', color='green', fontweight='bold')
+
+            # --- REGRESSION LINES FOR EXTREME RAINFALL ---
+        # Define thresholds for high and low rainfall using quantiles
+        high_threshold = df_daily_sum["rfh"].quantile(0.9)
+        low_threshold = df_daily_sum["rfh"].quantile(0.1)
+
+        # Filter the data for high rainfall (extreme high) and low rainfall (extreme low)
+        df_high = df_daily_sum[df_daily_sum["rfh"] >= high_threshold]
+        df_low = df_daily_sum[df_daily_sum["rfh"] <= low_threshold]
+
+        # Regression for high rainfall days
+        if not df_high.empty and len(df_high) >= 2:
+            x_high = df_high["date"].map(lambda d: d.toordinal())
+            y_high = df_high["rfh"]
+            coeffs_high = np.polyfit(x_high, y_high, 1)
+            poly_high = np.poly1d(coeffs_high)
+            x_vals_high = np.linspace(x_high.min(), x_high.max(), 100)
+            x_dates_high = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_high]
+            y_vals_high = poly_high(x_vals_high)
+            ax.plot(x_dates_high, y_vals_high, color="darkgreen", linestyle="--", linewidth=2, label="Regression (High Rainfall)")
+
+        # Regression for low rainfall days
+        if not df_low.empty and len(df_low) >= 2:
+            x_low = df_low["date"].map(lambda d: d.toordinal())
+            y_low = df_low["rfh"]
+            coeffs_low = np.polyfit(x_low, y_low, 1)
+            poly_low = np.poly1d(coeffs_low)
+            x_vals_low = np.linspace(x_low.min(), x_low.max(), 100)
+            x_dates_low = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_low]
+            y_vals_low = poly_low(x_vals_low)
+            ax.plot(x_dates_low, y_vals_low, color="darkred", linestyle="--", linewidth=2, label="Regression (Low Rainfall)")
+
+        # --- DYNAMIC X-AXIS LABELS MANAGEMENT ---
+        date_range_days = (end_date - start_date).days  # Number of days selected
+        if date_range_days > 14600:  # > 40 years → every 10 years
+            locator = mdates.YearLocator(10)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 7300:  # > 20 years → every 5 years
+            locator = mdates.YearLocator(5)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 3650:  # > 10 years → every 2 years
+            locator = mdates.YearLocator(2)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 1825:  # > 5 years → every year
+            locator = mdates.YearLocator(1)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 730:  # > 2 years → every 6 months
+            locator = mdates.MonthLocator(interval=6)
+            formatter = mdates.DateFormatter("%Y-%m")
+        elif date_range_days > 365:  # > 1 year → every 3 months
+            locator = mdates.MonthLocator(interval=3)
+            formatter = mdates.DateFormatter("%Y-%m")
+        elif date_range_days > 180:  # > 6 months → every month
+            locator = mdates.MonthLocator(interval=1)
+            formatter = mdates.DateFormatter("%Y-%m")
+        elif date_range_days > 90:  # > 3 months → every 15 days
+            locator = mdates.DayLocator(interval=15)
+            formatter = mdates.DateFormatter("%Y-%m-%d")
+        elif date_range_days > 30:  # > 1 month → every week
+            locator = mdates.DayLocator(interval=7)
+            formatter = mdates.DateFormatter("%Y-%m-%d")
+        else:  # Less than a month → every 3 days
+            locator = mdates.DayLocator(interval=3)
+            formatter = mdates.DateFormatter("%Y-%m-%d")
+
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(formatter)
+
+
+
+        plt.xticks(rotation=45)
+        ax.grid(True, linestyle="--", alpha=0.6)
+        ax.set_title(f"Daily Rainfall from {start_date} to {end_date}", fontsize=14, fontweight="bold")
+        ax.set_xlabel("Date", fontsize=12)
+        ax.set_ylabel("Rainfall (mm)", fontsize=12)
+        ax.legend()
 
-    df_filtered = df[
-        (df["date"] >= pd.to_datetime(start_date, format="%Y-%m-%d")) &
-        (df["date"] <= pd.to_datetime(end_date, format="%Y-%m-%d"))
-    ]
+        st.pyplot(fig)
 
-    # Aggregate data: daily rainfall sum
-    df_daily_sum = df_filtered.groupby("date")["rfh"].sum().reset_index()
-    df_daily_sum = df_daily_sum.sort_values(by="date").reset_index(drop=True)
-
-    # --- PLOT ---
-    fig, ax = plt.subplots(figsize=(12, 6))
-    # Main line showing daily rainfall
-    ax.plot(df_daily_sum["date"], df_daily_sum["rfh"], marker='o', linestyle='-', color='b', linewidth=2, markersize=6, label='Rainfall')
-
-    # Highlight minimum and maximum values if data exists
-    if not df_daily_sum.empty:
-        min_value = df_daily_sum["rfh"].min()
-        max_value = df_daily_sum["rfh"].max()
-        min_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmin(), "date"]
-        max_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmax(), "date"]
-
-        ax.scatter(min_date_point, min_value, color='red', s=100, label="Min Rainfall")
-        ax.scatter(max_date_point, max_value, color='green', s=100, label="Max Rainfall")
-        ax.text(min_date_point, min_value, f"Min: {min_value:.2f} mm", fontsize=10, verticalalignment='bottom', horizontalalignment='right', color='red', fontweight='bold')
-        ax.text(max_date_point, max_value, f"Max: {max_value:.2f} mm", fontsize=10, verticalalignment='top', horizontalalignment='left', color='green', fontweight='bold')
-
-        # --- REGRESSION LINES FOR EXTREME RAINFALL ---
-    # Define thresholds for high and low rainfall using quantiles
-    high_threshold = df_daily_sum["rfh"].quantile(0.9)
-    low_threshold = df_daily_sum["rfh"].quantile(0.1)
-
-    # Filter the data for high rainfall (extreme high) and low rainfall (extreme low)
-    df_high = df_daily_sum[df_daily_sum["rfh"] >= high_threshold]
-    df_low = df_daily_sum[df_daily_sum["rfh"] <= low_threshold]
-
-    # Regression for high rainfall days
-    if not df_high.empty and len(df_high) >= 2:
-        x_high = df_high["date"].map(lambda d: d.toordinal())
-        y_high = df_high["rfh"]
-        coeffs_high = np.polyfit(x_high, y_high, 1)
-        poly_high = np.poly1d(coeffs_high)
-        x_vals_high = np.linspace(x_high.min(), x_high.max(), 100)
-        x_dates_high = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_high]
-        y_vals_high = poly_high(x_vals_high)
-        ax.plot(x_dates_high, y_vals_high, color="darkgreen", linestyle="--", linewidth=2, label="Regression (High Rainfall)")
-
-    # Regression for low rainfall days
-    if not df_low.empty and len(df_low) >= 2:
-        x_low = df_low["date"].map(lambda d: d.toordinal())
-        y_low = df_low["rfh"]
-        coeffs_low = np.polyfit(x_low, y_low, 1)
-        poly_low = np.poly1d(coeffs_low)
-        x_vals_low = np.linspace(x_low.min(), x_low.max(), 100)
-        x_dates_low = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_low]
-        y_vals_low = poly_low(x_vals_low)
-        ax.plot(x_dates_low, y_vals_low, color="darkred", linestyle="--", linewidth=2, label="Regression (Low Rainfall)")
-
-    # --- DYNAMIC X-AXIS LABELS MANAGEMENT ---
-    date_range_days = (end_date - start_date).days  # Number of days selected
-    if date_range_days > 14600:  # > 40 years → every 10 years
-        locator = mdates.YearLocator(10)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 7300:  # > 20 years → every 5 years
-        locator = mdates.YearLocator(5)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 3650:  # > 10 years → every 2 years
-        locator = mdates.YearLocator(2)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 1825:  # > 5 years → every year
-        locator = mdates.YearLocator(1)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 730:  # > 2 years → every 6 months
-        locator = mdates.MonthLocator(interval=6)
-        formatter = mdates.DateFormatter("%Y-%m")
-    elif date_range_days > 365:  # > 1 year → every 3 months
-        locator = mdates.MonthLocator(interval=3)
-        formatter = mdates.DateFormatter("%Y-%m")
-    elif date_range_days > 180:  # > 6 months → every month
-        locator = mdates.MonthLocator(interval=1)
-        formatter = mdates.DateFormatter("%Y-%m")
-    elif date_range_days > 90:  # > 3 months → every 15 days
-        locator = mdates.DayLocator(interval=15)
-        formatter = mdates.DateFormatter("%Y-%m-%d")
-    elif date_range_days > 30:  # > 1 month → every week
-        locator = mdates.DayLocator(interval=7)
-        formatter = mdates.DateFormatter("%Y-%m-%d")
-    else:  # Less than a month → every 3 days
-        locator = mdates.DayLocator(interval=3)
-        formatter = mdates.DateFormatter("%Y-%m-%d")
-
-    ax.xaxis.set_major_locator(locator)
-    ax.xaxis.set_major_formatter(formatter)
-
-
-
-    plt.xticks(rotation=45)
-    ax.grid(True, linestyle="--", alpha=0.6)
-    ax.set_title(f"Daily Rainfall from {start_date} to {end_date}", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Date", fontsize=12)
-    ax.set_ylabel("Rainfall (mm)", fontsize=12)
-    ax.legend()
-
-    st.pyplot(fig)
+        # --- COMMENTS ON THE ANALYSIS ---
+        st.write("**Comments on Rainfall Analysis:**")
+        st.write("""
+        This graph displays the daily total rainfall over the selected period.
+        The marked points indicate the days with the lowest and highest rainfall.
+        Understanding these extremes is crucial:
+        - A prolonged period of low rainfall might signal drought conditions, potentially affecting water availability and crop yields.
+        - Conversely, extremely high rainfall events can lead to flooding, causing damage to infrastructure and agricultural land.
+        """)
 
-    # --- COMMENTS ON THE ANALYSIS ---
-    st.write("**Comments on Rainfall Analysis:**")
-    st.write("""
-    This graph displays the daily total rainfall over the selected period.
-    The marked points indicate the days with the lowest and highest rainfall.
-    Understanding these extremes is crucial:
-    - A prolonged period of low rainfall might signal drought conditions, potentially affecting water availability and crop yields.
-    - Conversely, extremely high rainfall events can lead to flooding, causing damage to infrastructure and agricultural land.
-    """)
 
+            # --- SEASONAL EXTREME AMPLITUDE ANALYSIS ---
+        st.subheader("Seasonal Extreme Amplitude Analysis")
 
-        # --- SEASONAL EXTREME AMPLITUDE ANALYSIS ---
-    st.subheader("Seasonal Extreme Amplitude Analysis")
-    # Filter daily data for the selected period (using df_filtered from Seasonal Analysis)
-    df_seasonal_daily = df_filtered.copy()
+        # Define rainy season months and dry season months
+        rainy_months = [5, 6, 7, 8, 9, 10]
+        dry_months = [11, 12, 1, 2, 3, 4]
 
-    # Define rainy season months and dry season months
-    rainy_months = [5, 6, 7, 8, 9, 10]
-    dry_months = [11, 12, 1, 2, 3, 4]
+        # For rainy season: compute daily extremes by year
+        rainy_extremes = rainfall_query(backend_name, country, "seasonal_extremes", start_date, end_date, rainy_months)
 
-    # For rainy season: filter data and compute daily extremes by year
-    rainy_df = df_seasonal_daily[df_seasonal_daily["date"].dt.month.isin(rainy_months)]
-    rainy_extremes = rainy_df.groupby(rainy_df["date"].dt.year)["rfh"].agg(min_rain="min", max_rain="max").reset_index()
-    rainy_extremes.columns = ["year", "min_rain", "max_rain"]
+        # For dry season: compute daily extremes by year
+        dry_extremes = rainfall_query(backend_name, country, "seasonal_extremes", start_date, end_date, dry_months)
 
-    # For dry season: filter data and compute daily extremes by year
-    dry_df = df_seasonal_daily[df_seasonal_daily["date"].dt.month.isin(dry_months)]
-    dry_extremes = dry_df.groupby(dry_df["date"].dt.year)["rfh"].agg(min_rain="min", max_rain="max").reset_index()
-    dry_extremes.columns = ["year", "min_rain", "max_rain"]
+        # Create a plot with two subplots: one for rainy season and one for dry season
+        fig_ext, (ax_rainy, ax_dry) = plt.subplots(2, 1, figsize=(12, 10), sharex=True)
 
-    # Create a plot with two subplots: one for rainy season and one for dry season
-    fig_ext, (ax_rainy, ax_dry) = plt.subplots(2, 1, figsize=(12, 10), sharex=True)
+        # Plot for rainy season extremes
+        ax_rainy.plot(rainy_extremes["year"], rainy_extremes["max_rain"], marker="o", label="Max Rainfall (Rainy Season)", color="blue")
+        ax_rainy.plot(rainy_extremes["year"], rainy_extremes["min_rain"], marker="o", label="Min Rainfall (Rainy Season)", color="orange")
+        ax_rainy.set_title("Rainy Season Extreme Amplitudes by Year")
+        ax_rainy.set_ylabel("Rainfall (mm)")
+        ax_rainy.legend()
+        ax_rainy.grid(True)
 
-    # Plot for rainy season extremes
-    ax_rainy.plot(rainy_extremes["year"], rainy_extremes["max_rain"], marker="o", label="Max Rainfall (Rainy Season)", color="blue")
-    ax_rainy.plot(rainy_extremes["year"], rainy_extremes["min_rain"], marker="o", label="Min Rainfall (Rainy Season)", color="orange")
-    ax_rainy.set_title("Rainy Season Extreme Amplitudes by Year")
-    ax_rainy.set_ylabel("Rainfall (mm)")
-    ax_rainy.legend()
-    ax_rainy.grid(True)
+        # Plot for dry season extremes
+        ax_dry.plot(dry_extremes["year"], dry_extremes["max_rain"], marker="o", label="Max Rainfall (Dry Season)", color="green")
+        ax_dry.plot(dry_extremes["year"], dry_extremes["min_rain"], marker="o", label="Min Rainfall (Dry Season)", color="red")
+        ax_dry.set_title("Dry Season Extreme Amplitudes by Year")
+        ax_dry.set_xlabel("Year")
+        ax_dry.set_ylabel("Rainfall (mm)")
+        ax_dry.legend()
+        ax_dry.grid(True)
 
-    # Plot for dry season extremes
-    ax_dry.plot(dry_extremes["year"], dry_extremes["max_rain"], marker="o", label="Max Rainfall (Dry Season)", color="green")
-    ax_dry.plot(dry_extremes["year"], dry_extremes["min_rain"], marker="o", label="Min Rainfall (Dry Season)", color="red")
-    ax_dry.set_title("Dry Season Extreme Amplitudes by Year")
-    ax_dry.set_xlabel("Year")
-    ax_dry.set_ylabel("Rainfall (mm)")
-    ax_dry.legend()
-    ax_dry.grid(True)
+        st.pyplot(fig_ext)
 
-    st.pyplot(fig_ext)
+        st.write("""
+        **Comments on Seasonal Extreme Amplitude Analysis:**
+        The charts above display, for each year, the maximum and minimum daily rainfall values during the rainy and dry seasons.
+        - In the rainy season, an increasing trend in maximum values might indicate a higher risk of intense rainfall events and potential flooding.
+        - In the dry season, particularly low minimum values could signal worsening drought conditions.
+        These trends are essential for understanding seasonal climate variability and for planning in agriculture and water management.
+        """)
 
-    st.write("""
-    **Comments on Seasonal Extreme Amplitude Analysis:**
-    The charts above display, for each year, the maximum and minimum daily rainfall values during the rainy and dry seasons.
-    - In the rainy season, an increasing trend in maximum values might indicate a higher risk of intense rainfall events and potential flooding.
-    - In the dry season, particularly low minimum values could signal worsening drought conditions.
-    These trends are essential for understanding seasonal climate variability and for planning in agriculture and water management.
-    """)
+    daily_rainfall_section(start_date, end_date)
 
 
     st.title("📈 Annual Rainfall Trends")
 
-    if not use_same_slider:
-        min_date = df["date"].min()
-        max_date = df["date"].max()
-        start_date, end_date = st.slider(
-            "Select the analysis period:",
-            min_value=min_date.date(),
-            max_value=max_date.date(),
-            value=(pd.to_datetime("2010-01-01").date(), pd.to_datetime("2020-12-31").date()),
-            format="YYYY-MM-DD"
-        )
+    @st.fragment
+    def annual_rainfall_section(start_date, end_date):
+        if not use_same_slider:
+            start_date, end_date = st.slider(
+                "Select the analysis period:",
+                min_value=min_date.date(),
+                max_value=max_date.date(),
+                value=(pd.to_datetime("2010-01-01").date(), pd.to_datetime("2020-12-31").date()),
+                format="YYYY-MM-DD"
+            )
 
-    df_filtered = df[
-        (df["date"] >= pd.to_datetime(start_date, format="%Y-%m-%d")) &
-        (df["date"] <= pd.to_datetime(end_date, format="%Y-%m-%d"))
-    ]
-    df_filtered["year"] = df_filtered["date"].dt.year
-    df_annual_filtered = df_filtered.groupby("year")["rfh"].sum().reset_index()
-
-    # Perform linear regression to detect trend
-    if not df_annual_filtered.empty:
-        coeffs = np.polyfit(df_annual_filtered["year"], df_annual_filtered["rfh"], 1)
-        trend_line = np.poly1d(coeffs)
-        df_annual_filtered["trend"] = trend_line(df_annual_filtered["year"])
-
-        # Determine minimum and maximum annual rainfall
-        min_year = df_annual_filtered.loc[df_annual_filtered["rfh"].idxmin(), "year"]
-        min_value = df_annual_filtered["rfh"].min()
-        max_year = df_annual_filtered.loc[df_annual_filtered["rfh"].idxmax(), "year"]
-        max_value = df_annual_filtered["rfh"].max()
-
-        # Create a bar chart with trend line
+        df_annual_filtered = rainfall_query(backend_name, country, "annual_totals", start_date, end_date)
+
+        # Perform linear regression to detect trend
+        if not df_annual_filtered.empty:
+            coeffs = np.polyfit(df_annual_filtered["year"], df_annual_filtered["rfh"], 1)
+            trend_line = np.poly1d(coeffs)
+            df_annual_filtered["trend"] = trend_line(df_annual_filtered["year"])
+
+            # Determine minimum and maximum annual rainfall
+            min_year = df_annual_filtered.loc[df_annual_filtered["rfh"].idxmin(), "year"]
+            min_value = df_annual_filtered["rfh"].min()
+            max_year = df_annual_filtered.loc[df_annual_filtered["rfh"].idxmax(), "year"]
+            max_value = df_annual_filtered["rfh"].max()
+
+            # Create a bar chart with trend line
+            fig, ax = plt.subplots(figsize=(12, 6))
+            ax.bar(df_annual_filtered["year"], df_annual_filtered["rfh"], color="b", alpha=0.7, label="Total Rainfall")
+            ax.plot(df_annual_filtered["year"], df_annual_filtered["trend"], color="r", linestyle="--", linewidth=2, label="Trend Line")
+            ax.scatter(min_year, min_value, color="green", s=100, label="Minimum")
+            ax.scatter(max_year, max_value, color="red", s=100, label="Maximum")
+            ax.text(min_year, min_value, f"Min: {min_value:.2f} mm", fontsize=10, verticalalignment="bottom", horizontalalignment="right", color="green", fontweight="bold")
+            ax.text(max_year, max_value, f"Max: {max_value:.2f} mm", fontsize=10, verticalalignment="top", horizontalalignment="left", color="red", fontweight="bold")
+            ax.set_xlabel("Year", fontsize=12)
+            ax.set_ylabel("Total Rainfall (mm)", fontsize=12)
+            ax.set_title(f"Annual Rainfall Trends ({start_date} - {end_date})", fontsize=14, fontweight="bold")
+            ax.legend()
+            ax.grid(axis="y", linestyle="--", alpha=0.7)
+
+            st.pyplot(fig)
+
+            # --- COMMENTS ON THE ANALYSIS ---
+            st.write("**Comments on Annual Rainfall Trends:**")
+            st.write("""
+            This chart shows the total annual rainfall along with a linear trend.
+            Significant year-to-year fluctuations can reflect changes in climate patterns.
+            An upward trend might indicate an increased risk of flooding, whereas a downward trend may suggest a move toward drier conditions,
+            which could impact water resources and agricultural productivity.
+            """)
+
+    annual_rainfall_section(start_date, end_date)
+
+    page_navigation()
+
+
+
+# --- SEASONAL ANALYSIS ---
+if page == "Seasonal Analysis":
+    st.title("🌦️ Seasonal Rainfall Analysis")
+
+    # Detected rainy seasons, shared by the dry/wet month bands and the onset and cessation section
+    seasons = season.load_seasons(country, ingest.data_version(country))
+    season_medians = season.national_medians(seasons)
+
+    @st.fragment
+    def seasonal_bands_section(start_date, end_date, season_medians):
+        if not use_same_slider:
+            start_date, end_date = st.slider(
+                "Select the analysis period:",
+                min_value=min_date.date(),
+                max_value=max_date.date(),
+                value=(pd.to_datetime("2021-06-01").date(), pd.to_datetime("2022-06-01").date()),
+                format="YYYY-MM-DD"
+            )
+
+        # Aggregate data: daily rainfall sum
+        df_daily_sum = rainfall_query(backend_name, country, "daily_sum", start_date, end_date)
+
+        # --- PLOT ---
         fig, ax = plt.subplots(figsize=(12, 6))
-        ax.bar(df_annual_filtered["year"], df_annual_filtered["rfh"], color="b", alpha=0.7, label="Total Rainfall")
-        ax.plot(df_annual_filtered["year"], df_annual_filtered["trend"], color="r", linestyle="--", linewidth=2, label="Trend Line")
-        ax.scatter(min_year, min_value, color="green", s=100, label="Minimum")
-        ax.scatter(max_year, max_value, color="red", s=100, label="Maximum")
-        ax.text(min_year, min_value, f"Min: {min_value:.2f} mm", fontsize=10, verticalalignment="bottom", horizontalalignment="right", color="green", fontweight="bold")
-        ax.text(max_year, max_value, f"Max: {max_value:.2f} mm", fontsize=10, verticalalignment="top", horizontalalignment="left", color="red", fontweight="bold")
-        ax.set_xlabel("Year", fontsize=12)
-        ax.set_ylabel("Total Rainfall (mm)", fontsize=12)
-        ax.set_title(f"Annual Rainfall Trends ({start_date} - {end_date})", fontsize=14, fontweight="bold")
+        # Main line showing daily rainfall
+        ax.plot(df_daily_sum["date"], df_daily_sum["rfh"], marker='o', linestyle='-', color='b', linewidth=2, markersize=6, label='Rainfall')
+
+        # Highlight minimum and maximum values if data exists
+        if not df_daily_sum.empty:
+            min_value = df_daily_sum["rfh"].min()
+            max_value = df_daily_sum["rfh"].max()
+            min_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmin(), "date"]
+            max_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmax(), "date"]
+
+            ax.scatter(min_date_point, min_value, color='red', s=100, label="Min Rainfall")
+            ax.scatter(max_date_point, max_value, color='green', s=100, label="Max Rainfall")
+            ax.text(min_date_point, min_value, f"Min: {min_value:.2f} mm", fontsize=10, verticalalignment='bottom', horizontalalignment='right', color='red', fontweight='bold')
+            ax.text(max_date_point, max_value, f"Max: {max_value:.2f} mm", fontsize=10, verticalalignment='top', horizontalalignment='left', color='green', fontweight='bold')
+
+            # --- REGRESSION LINES FOR EXTREME RAINFALL ---
+        # Define thresholds for high and low rainfall using quantiles
+        high_threshold = df_daily_sum["rfh"].quantile(0.9)
+        low_threshold = df_daily_sum["rfh"].quantile(0.1)
+
+        # Filter the data for high rainfall (extreme high) and low rainfall (extreme low)
+        df_high = df_daily_sum[df_daily_sum["rfh"] >= high_threshold]
+        df_low = df_daily_sum[df_daily_sum["rfh"] <= low_threshold]
+
+        # Regression for high rainfall days
+        if not df_high.empty and len(df_high) >= 2:
+            x_high = df_high["date"].map(lambda d: d.toordinal())
+            y_high = df_high["rfh"]
+            coeffs_high = np.polyfit(x_high, y_high, 1)
+            poly_high = np.poly1d(coeffs_high)
+            x_vals_high = np.linspace(x_high.min(), x_high.max(), 100)
+            x_dates_high = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_high]
+            y_vals_high = poly_high(x_vals_high)
+            ax.plot(x_dates_high, y_vals_high, color="darkgreen", linestyle="--", linewidth=2, label="Regression (High Rainfall)")
+
+        # Regression for low rainfall days
+        if not df_low.empty and len(df_low) >= 2:
+            x_low = df_low["date"].map(lambda d: d.toordinal())
+            y_low = df_low["rfh"]
+            coeffs_low = np.polyfit(x_low, y_low, 1)
+            poly_low = np.poly1d(coeffs_low)
+            x_vals_low = np.linspace(x_low.min(), x_low.max(), 100)
+            x_dates_low = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_low]
+            y_vals_low = poly_low(x_vals_low)
+            ax.plot(x_dates_low, y_vals_low, color="darkred", linestyle="--", linewidth=2, label="Regression (Low Rainfall)")
+
+        # --- DYNAMIC X-AXIS LABELS MANAGEMENT ---
+        date_range_days = (end_date - start_date).days  # Number of days selected
+        if date_range_days > 14600:  # > 40 years → every 10 years
+            locator = mdates.YearLocator(10)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 7300:  # > 20 years → every 5 years
+            locator = mdates.YearLocator(5)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 3650:  # > 10 years → every 2 years
+            locator = mdates.YearLocator(2)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 1825:  # > 5 years → every year
+            locator = mdates.YearLocator(1)
+            formatter = mdates.DateFormatter("%Y")
+        elif date_range_days > 730:  # > 2 years → every 6 months
+            locator = mdates.MonthLocator(interval=6)
+            formatter = mdates.DateFormatter("%Y-%m")
+        elif date_range_days > 365:  # > 1 year → every 3 months
+            locator = mdates.MonthLocator(interval=3)
+            formatter = mdates.DateFormatter("%Y-%m")
+        elif date_range_days > 180:  # > 6 months → every month
+            locator = mdates.MonthLocator(interval=1)
+            formatter = mdates.DateFormatter("%Y-%m")
+        elif date_range_days > 90:  # > 3 months → every 15 days
+            locator = mdates.DayLocator(interval=15)
+            formatter = mdates.DateFormatter("%Y-%m-%d")
+        elif date_range_days > 30:  # > 1 month → every week
+            locator = mdates.DayLocator(interval=7)
+            formatter = mdates.DateFormatter("%Y-%m-%d")
+        else:  # Less than a month → every 3 days
+            locator = mdates.DayLocator(interval=3)
+            formatter = mdates.DateFormatter("%Y-%m-%d")
+
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(formatter)
+
+
+            # --- COLORED BANDS FOR DRY AND WET MONTHS ---
+        # We will loop over each month in the selected period and compute the total rainfall.
+        # For rainy season months: if total > 300 mm then mark as wet, else as dry.
+        # For dry season months: if total < 50 mm then mark as dry, else as wet.
+        # The rainy season of each year runs from the median detected onset to the median cessation
+        # over the units (May to October for the years with no detected season).
+        label_flags = {
+            "Dry Month (Rainy Season)": False,
+            "Wet Month (Rainy Season)": False,
+            "Dry Month (Dry Season)": False,
+            "Wet Month (Dry Season)": False
+        }
+        rainy_months = [5, 6, 7, 8, 9, 10]
+        dry_months = [11, 12, 1, 2, 3, 4]
+        # Create a date range of month starts between start_date and end_date
+        month_starts = pd.date_range(start=pd.Timestamp(start_date), end=pd.Timestamp(end_date), freq='MS')
+        for m in month_starts:
+            # Get the end of the month
+            month_end = m + pd.offsets.MonthEnd(0)
+            # Calculate the total rainfall for the month using the daily sums
+            monthly_total = df_daily_sum[(df_daily_sum["date"] >= m) & (df_daily_sum["date"] <= month_end)]["rfh"].sum()
+            # Determine if the month belongs to the rainy or dry season and apply thresholds
+            onset_doy, cessation_doy = season_medians.reindex([m.year]).iloc[0][["onset", "cessation"]]
+            if np.isfinite(onset_doy) and np.isfinite(cessation_doy):
+                in_rainy_season = month_end.dayofyear >= onset_doy and m.dayofyear < cessation_doy
+            else:
+                in_rainy_season = m.month in rainy_months
+            if in_rainy_season:
+                # For rainy season, threshold: 300 mm
+                if monthly_total > 3000:
+                    label = "Wet Month (Rainy Season)"
+                    color = "lightblue"
+                else:
+                    label = "Dry Month (Rainy Season)"
+                    color = "salmon"
+            else:
+                # For dry season, threshold: 50 mm
+                if monthly_total < 1000:
+                    label = "Dry Month (Dry Season)"
+                    color = "salmon"
+                else:
+                    label = "Wet Month (Dry Season)"
+                    color = "lightblue"
+            # Add the colored band for this month, ensuring each label appears only once in the legend
+            if not label_flags[label]:
+                ax.axvspan(m, month_end, color=color, alpha=0.3, label=label)
+                label_flags[label] = True
+            else:
+                ax.axvspan(m, month_end, color=color, alpha=0.3)
+        plt.xticks(rotation=45)
+        ax.grid(True, linestyle="--", alpha=0.6)
+        ax.set_title(f"Daily Rainfall from {start_date} to {end_date}", fontsize=14, fontweight="bold")
+        ax.set_xlabel("Date", fontsize=12)
+        ax.set_ylabel("Rainfall (mm)", fontsize=12)
         ax.legend()
-        ax.grid(axis="y", linestyle="--", alpha=0.7)
 
         st.pyplot(fig)
 
         # --- COMMENTS ON THE ANALYSIS ---
-        st.write("**Comments on Annual Rainfall Trends:**")
+        st.write("**Comments on Rainfall Analysis:**")
         st.write("""
-        This chart shows the total annual rainfall along with a linear trend.
-        Significant year-to-year fluctuations can reflect changes in climate patterns.
-        An upward trend might indicate an increased risk of flooding, whereas a downward trend may suggest a move toward drier conditions,
-        which could impact water resources and agricultural productivity.
+        This graph displays the daily total rainfall over the selected period.
+        The marked points indicate the days with the lowest and highest rainfall.
+        Understanding these extremes is crucial:
+        - A prolonged period of low rainfall might signal drought conditions, potentially affecting water availability and crop yields.
+        - Conversely, extremely high rainfall events can lead to flooding, causing damage to infrastructure and agricultural land.
         """)
 
-    col1, col2 , col3= st.columns([1, 2, 1])
-
-    with col1:
-        if st.button("← Previous page"):
-            next_page_index = (pages.index(page) - 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
-    with col2:
-        st.write("")
+    seasonal_bands_section(start_date, end_date, season_medians)
+
+    @st.fragment
+    def monthly_rainfall_section(start_date, end_date):
+        if not use_same_slider:
+            start_date, end_date = st.slider(
+                "Select the analysis period:",
+                min_value=min_date.date(),
+                max_value=max_date.date(),
+                value=(pd.to_datetime("2010-01-01").date(), pd.to_datetime("2020-12-31").date()),
+                format="YYYY-MM-DD"
+            )
 
-    with col3:
-        if st.button("Next page →"):
-            next_page_index = (pages.index(page) + 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
+        df_seasonal = rainfall_query(backend_name, country, "monthly_sum", start_date, end_date)
 
+        # Create the seasonal average graph
+        fig, ax = plt.subplots(figsize=(12, 6))
+        df_monthly_avg = df_seasonal.groupby("month")["rfh"].mean().reset_index()
+        ax.bar(df_monthly_avg["month"], df_monthly_avg["rfh"], color="b", alpha=0.7, label="Average Monthly Rainfall")
+        ax.set_xlabel("Month", fontsize=12)
+        ax.set_ylabel("Average Rainfall (mm)", fontsize=12)
+        ax.set_title(f"Average Monthly Rainfall ({start_date} - {end_date})", fontsize=14, fontweight="bold")
+        ax.set_xticks(range(1, 13))
+        ax.set_xticklabels(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
+        ax.legend()
+        ax.grid(axis="y", linestyle="--", alpha=0.7)
+        st.pyplot(fig)
 
+        # --- COMMENTS ON THE ANALYSIS ---
+        st.write("**Comments on Seasonal Analysis:**")
+        st.write("""
+        The bar chart above presents the average monthly rainfall.
+        This helps in identifying seasonal patterns: months with consistently low rainfall may indicate a dry season,
+        whereas months with high rainfall are likely during the wet season.
+        Such insights are vital for planning agricultural activities and managing water resources.
+        """)
 
-# --- SEASONAL ANALYSIS ---
-if page == "Seasonal Analysis":
-    st.title("🌦️ Seasonal Rainfall Analysis")
+        # The year filter only reruns the yearly trends, the average above covers the whole period
+        @st.fragment
+        def yearly_trends_section(df_seasonal):
+            # Checkbox to filter by specific years
+            filter_years = st.checkbox("Select specific years", value=False)
+            selected_years = df_seasonal["year"].unique()
+            if filter_years:
+                selected_years = st.multiselect("Select the years to display:", df_seasonal["year"].unique(), default=df_seasonal["year"].unique())
+            df_seasonal_filtered = df_seasonal[df_seasonal["year"].isin(selected_years)]
+
+            # Plot seasonal trends per year
+            fig, ax = plt.subplots(figsize=(12, 6))
+            for year in df_seasonal_filtered["year"].unique():
+                df_yearly = df_seasonal_filtered[df_seasonal_filtered["year"] == year]
+                ax.plot(df_yearly["month"], df_yearly["rfh"], marker='o', linestyle='-', alpha=0.6, label=str(year))
+            ax.set_xlabel("Month", fontsize=12)
+            ax.set_ylabel("Total Rainfall (mm)", fontsize=12)
+            ax.set_title(f"Yearly Seasonal Trends ({start_date} - {end_date})", fontsize=14, fontweight="bold")
+            ax.set_xticks(range(1, 13))
+            ax.set_xticklabels(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
+            ax.legend()
+            ax.grid(axis="y", linestyle="--", alpha=0.7)
+            st.pyplot(fig)
+
+             # --- COMMENTS ON THE ANALYSIS ---
+            st.write(
+            "Consistent seasonal peaks\n\n"
+            "– The peaks in August have remained similar in recent years without significant variations. This could indicate stabilization in rainfall patterns.\n\n"
+            "- Comparing the distribution in recent years and then the 80s, the graphic shows **lower interannual variability**. If the curves from recent years are closer together compared to previous years, it might mean that **rainfall patterns are becoming more predictable**.\n\n"
+            "- Overall, the rainfall has been quite stable in the last 40 years. We can predict it will not change much."
+            )
 
-    if not use_same_slider:
-        min_date = df["date"].min()
-        max_date = df["date"].max()
-        start_date, end_date = st.slider(
-            "Select the analysis period:",
-            min_value=min_date.date(),
-            max_value=max_date.date(),
-            value=(pd.to_datetime("2021-06-01").date(), pd.to_datetime("2022-06-01").date()),
-            format="YYYY-MM-DD"
-        )
+        yearly_trends_section(df_seasonal)
 
-    df_filtered = df[
-        (df["date"] >= pd.to_datetime(start_date, format="%Y-%m-%d")) &
-        (df["date"] <= pd.to_datetime(end_date, format="%Y-%m-%d"))
-    ]
+    monthly_rainfall_section(start_date, end_date)
 
-    # Aggregate data: daily rainfall sum
-    df_daily_sum = df_filtered.groupby("date")["rfh"].sum().reset_index()
-    df_daily_sum = df_daily_sum.sort_values(by="date").reset_index(drop=True)
-
-    # --- PLOT ---
-    fig, ax = plt.subplots(figsize=(12, 6))
-    # Main line showing daily rainfall
-    ax.plot(df_daily_sum["date"], df_daily_sum["rfh"], marker='o', linestyle='-', color='b', linewidth=2, markersize=6, label='Rainfall')
-
-    # Highlight minimum and maximum values if data exists
-    if not df_daily_sum.empty:
-        min_value = df_daily_sum["rfh"].min()
-        max_value = df_daily_sum["rfh"].max()
-        min_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmin(), "date"]
-        max_date_point = df_daily_sum.loc[df_daily_sum["rfh"].idxmax(), "date"]
-
-        ax.scatter(min_date_point, min_value, color='red', s=100, label="Min Rainfall")
-        ax.scatter(max_date_point, max_value, color='green', s=100, label="Max Rainfall")
-        ax.text(min_date_point, min_value, f"Min: {min_value:.2f} mm", fontsize=10, verticalalignment='bottom', horizontalalignment='right', color='red', fontweight='bold')
-        ax.text(max_date_point, max_value, f"Max: {max_value:.2f} mm", fontsize=10, verticalalignment='top', horizontalalignment='left', color='green', fontweight='bold')
-
-        # --- REGRESSION LINES FOR EXTREME RAINFALL ---
-    # Define thresholds for high and low rainfall using quantiles
-    high_threshold = df_daily_sum["rfh"].quantile(0.9)
-    low_threshold = df_daily_sum["rfh"].quantile(0.1)
-
-    # Filter the data for high rainfall (extreme high) and low rainfall (extreme low)
-    df_high = df_daily_sum[df_daily_sum["rfh"] >= high_threshold]
-    df_low = df_daily_sum[df_daily_sum["rfh"] <= low_threshold]
-
-    # Regression for high rainfall days
-    if not df_high.empty and len(df_high) >= 2:
-        x_high = df_high["date"].map(lambda d: d.toordinal())
-        y_high = df_high["rfh"]
-        coeffs_high = np.polyfit(x_high, y_high, 1)
-        poly_high = np.poly1d(coeffs_high)
-        x_vals_high = np.linspace(x_high.min(), x_high.max(), 100)
-        x_dates_high = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_high]
-        y_vals_high = poly_high(x_vals_high)
-        ax.plot(x_dates_high, y_vals_high, color="darkgreen", linestyle="--", linewidth=2, label="Regression (High Rainfall)")
-
-    # Regression for low rainfall days
-    if not df_low.empty and len(df_low) >= 2:
-        x_low = df_low["date"].map(lambda d: d.toordinal())
-        y_low = df_low["rfh"]
-        coeffs_low = np.polyfit(x_low, y_low, 1)
-        poly_low = np.poly1d(coeffs_low)
-        x_vals_low = np.linspace(x_low.min(), x_low.max(), 100)
-        x_dates_low = [pd.Timestamp.fromordinal(int(x)) for x in x_vals_low]
-        y_vals_low = poly_low(x_vals_low)
-        ax.plot(x_dates_low, y_vals_low, color="darkred", linestyle="--", linewidth=2, label="Regression (Low Rainfall)")
-
-    # --- DYNAMIC X-AXIS LABELS MANAGEMENT ---
-    date_range_days = (end_date - start_date).days  # Number of days selected
-    if date_range_days > 14600:  # > 40 years → every 10 years
-        locator = mdates.YearLocator(10)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 7300:  # > 20 years → every 5 years
-        locator = mdates.YearLocator(5)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 3650:  # > 10 years → every 2 years
-        locator = mdates.YearLocator(2)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 1825:  # > 5 years → every year
-        locator = mdates.YearLocator(1)
-        formatter = mdates.DateFormatter("%Y")
-    elif date_range_days > 730:  # > 2 years → every 6 months
-        locator = mdates.MonthLocator(interval=6)
-        formatter = mdates.DateFormatter("%Y-%m")
-    elif date_range_days > 365:  # > 1 year → every 3 months
-        locator = mdates.MonthLocator(interval=3)
-        formatter = mdates.DateFormatter("%Y-%m")
-    elif date_range_days > 180:  # > 6 months → every month
-        locator = mdates.MonthLocator(interval=1)
-        formatter = mdates.DateFormatter("%Y-%m")
-    elif date_range_days > 90:  # > 3 months → every 15 days
-        locator = mdates.DayLocator(interval=15)
-        formatter = mdates.DateFormatter("%Y-%m-%d")
-    elif date_range_days > 30:  # > 1 month → every week
-        locator = mdates.DayLocator(interval=7)
-        formatter = mdates.DateFormatter("%Y-%m-%d")
-    else:  # Less than a month → every 3 days
-        locator = mdates.DayLocator(interval=3)
-        formatter = mdates.DateFormatter("%Y-%m-%d")
-
-    ax.xaxis.set_major_locator(locator)
-    ax.xaxis.set_major_formatter(formatter)
-
-
-        # --- COLORED BANDS FOR DRY AND WET MONTHS ---
-    # We will loop over each month in the selected period and compute the total rainfall.
-    # For rainy season months (May to October): if total > 300 mm then mark as wet, else as dry.
-    # For dry season months (November to April): if total < 50 mm then mark as dry, else as wet.
-    label_flags = {
-        "Dry Month (Rainy Season)": False,
-        "Wet Month (Rainy Season)": False,
-        "Dry Month (Dry Season)": False,
-        "Wet Month (Dry Season)": False
-    }
-    rainy_months = [5, 6, 7, 8, 9, 10]
-    dry_months = [11, 12, 1, 2, 3, 4]
-    # Create a date range of month starts between start_date and end_date
-    month_starts = pd.date_range(start=pd.Timestamp(start_date), end=pd.Timestamp(end_date), freq='MS')
-    for m in month_starts:
-        # Get the end of the month
-        month_end = m + pd.offsets.MonthEnd(0)
-        # Calculate the total rainfall for the month using the daily sums
-        monthly_total = df_daily_sum[(df_daily_sum["date"] >= m) & (df_daily_sum["date"] <= month_end)]["rfh"].sum()
-        # Determine if the month belongs to the rainy or dry season and apply thresholds
-        if m.month in rainy_months:
-            # For rainy season, threshold: 300 mm
-            if monthly_total > 3000:
-                label = "Wet Month (Rainy Season)"
-                color = "lightblue"
-            else:
-                label = "Dry Month (Rainy Season)"
-                color = "salmon"
+    # --- RAINY SEASON ONSET AND CESSATION PER ADM2 UNIT ---
+    @st.fragment
+    def season_onset_section(seasons, season_medians):
+        st.subheader("Rainy season onset and cessation")
+        season_labels = {"Onset": "onset", "Cessation": "cessation", "Length (days)": "length"}
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            season_metric = season_labels[st.radio("Show:", list(season_labels), key="season_metric")]
+            show_trend = st.checkbox("Trend (days per decade)", value=False, key="season_trend")
+        with col2:
+            season_years = [int(y) for y in season_medians.dropna().index] or [int(seasons["years"][-1])]
+            season_year = st.select_slider("Year:", options=season_years, value=season_years[-1], key="season_year",
+                                           disabled=show_trend)
+
+        if show_trend:
+            unit_values = season.trend(seasons, season_metric)
+            limit = float(np.nanmax(np.abs(unit_values))) if np.isfinite(unit_values).any() else 1.0
+            vmin, vmax, cmap_name = -limit, limit, "RdBu_r" if season_metric != "length" else "RdBu"
         else:
-            # For dry season, threshold: 50 mm
-            if monthly_total < 1000:
-                label = "Dry Month (Dry Season)"
-                color = "salmon"
+            unit_values = seasons[season_metric][:, list(seasons["years"]).index(season_year)]
+            finite = unit_values[np.isfinite(unit_values)]
+            vmin, vmax = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+            cmap_name = "viridis"
+
+        if raster_roi.load_boundaries(2):
+            values = choropleth.feature_values(seasons["pcodes"], unit_values)
+            season_layer = pdk.Layer(
+                "GeoJsonLayer",
+                id="adm2-season",
+                data=tile_server.boundaries_url(2),
+                get_fill_color=choropleth.fill_expression(choropleth.value_colors(values, vmin, vmax, cmap_name)),
+                update_triggers={"getFillColor": [season_metric, show_trend, season_year]},
+                get_line_color=[80, 80, 80],
+                line_width_min_pixels=0.5,
+                pickable=True,
+            )
+            lon, lat = choropleth.boundaries_center(2)
+            st.pydeck_chart(pdk.Deck(
+                layers=[season_layer],
+                initial_view_state=pdk.ViewState(longitude=lon, latitude=lat, zoom=5.5),
+                tooltip={"text": "{name} ({pcode})"},
+            ))
+            if show_trend:
+                st.caption(f"Change of the {season_metric} from {seasons['years'][0]} on: {vmin:+.1f} to {vmax:+.1f} days per decade; grey = too few seasons.")
+            elif season_metric == "length":
+                st.caption(f"{season_year}: season length from {vmin:.0f} to {vmax:.0f} days; grey = no season detected.")
             else:
-                label = "Wet Month (Dry Season)"
-                color = "lightblue"
-        # Add the colored band for this month, ensuring each label appears only once in the legend
-        if not label_flags[label]:
-            ax.axvspan(m, month_end, color=color, alpha=0.3, label=label)
-            label_flags[label] = True
+                first, last = (pd.Timestamp(season_year, 1, 1) + pd.Timedelta(days=v - 1) for v in (vmin, vmax))
+                st.caption(f"{season_year}: {season_metric} from {first:%d %b} (dark) to {last:%d %b} (light); grey = no season detected.")
         else:
-            ax.axvspan(m, month_end, color=color, alpha=0.3)
-    plt.xticks(rotation=45)
-    ax.grid(True, linestyle="--", alpha=0.6)
-    ax.set_title(f"Daily Rainfall from {start_date} to {end_date}", fontsize=14, fontweight="bold")
-    ax.set_xlabel("Date", fontsize=12)
-    ax.set_ylabel("Rainfall (mm)", fontsize=12)
-    ax.legend()
+            st.dataframe(pd.DataFrame({"Pcode": seasons["pcodes"], "name": seasons["names"], season_metric: unit_values}))
+
+        # Median onset and cessation over the units, with their linear trends
+        fig, ax = plt.subplots(figsize=(12, 5))
+        medians = season_medians.dropna()
+        for metric, color in [("onset", "green"), ("cessation", "darkorange")]:
+            ax.plot(medians.index, medians[metric], marker="o", color=color, label=f"Median {metric}")
+            if len(medians) >= 2:
+                coeffs = np.polyfit(medians.index, medians[metric], 1)
+                ax.plot(medians.index, np.poly1d(coeffs)(medians.index), color=color, linestyle="--",
+                        label=f"Trend ({coeffs[0] * 10:+.1f} days/decade)")
+        ticks = pd.date_range("2001-04-01", "2001-12-01", freq="MS")
+        ax.set_yticks(ticks.dayofyear)
+        ax.set_yticklabels(ticks.strftime("%d %b"))
+        ax.set_xlabel("Year", fontsize=12)
+        ax.set_ylabel("Date", fontsize=12)
+        ax.set_title("Rainy season onset and cessation (median over the ADM2 units)", fontsize=14, fontweight="bold")
+        ax.legend()
+        ax.grid(linestyle="--", alpha=0.6)
+        st.pyplot(fig)
 
-    st.pyplot(fig)
+        st.write("**Comments on the rainy season:**")
+        st.write(f"""
+        The season is detected in every unit and year from the dekadal rainfall. The onset is the first dekad from 1 May with
+        at least {season.ONSET_RAIN:.0f} mm and no dry dekad (below {season.DRY_DEKAD:.0f} mm) in the following
+        {season.DRY_SPELL_DEKADS * 10} days, so that sowing is not followed by a long dry spell; the cessation is the first dekad
+        from 1 September that begins {season.CESSATION_DEKADS} dekads in a row below {season.CESSATION_RAIN:.0f} mm.
+        Units shown in grey had no season meeting these criteria (a failed season, or missing data).
+        """)
 
-    # --- COMMENTS ON THE ANALYSIS ---
-    st.write("**Comments on Rainfall Analysis:**")
-    st.write("""
-    This graph displays the daily total rainfall over the selected period.
-    The marked points indicate the days with the lowest and highest rainfall.
-    Understanding these extremes is crucial:
-    - A prolonged period of low rainfall might signal drought conditions, potentially affecting water availability and crop yields.
-    - Conversely, extremely high rainfall events can lead to flooding, causing damage to infrastructure and agricultural land.
-    """)
+    season_onset_section(seasons, season_medians)
 
-    if not use_same_slider:
-        min_date = df["date"].min()
-        max_date = df["date"].max()
-        start_date, end_date = st.slider(
-            "Select the analysis period:",
-            min_value=min_date.date(),
-            max_value=max_date.date(),
-            value=(pd.to_datetime("2010-01-01").date(), pd.to_datetime("2020-12-31").date()),
-            format="YYYY-MM-DD"
-        )
 
-    df_filtered = df[
-        (df["date"] >= pd.to_datetime(start_date, format="%Y-%m-%d")) &
-        (df["date"] <= pd.to_datetime(end_date, format="%Y-%m-%d"))
-    ]
-    df_filtered["year"] = df_filtered["date"].dt.year
-    df_filtered["month"] = df_filtered["date"].dt.month
-    df_seasonal = df_filtered.groupby(["year", "month"])["rfh"].sum().reset_index()
-
-    # Checkbox to filter by specific years
-    filter_years = st.checkbox("Select specific years", value=False)
-    selected_years = df_seasonal["year"].unique()
-    if filter_years:
-        selected_years = st.multiselect("Select the years to display:", df_seasonal["year"].unique(), default=df_seasonal["year"].unique())
-    df_seasonal_filtered = df_seasonal[df_seasonal["year"].isin(selected_years)]
-
-    # Create the seasonal average graph
-    fig, ax = plt.subplots(figsize=(12, 6))
-    df_monthly_avg = df_seasonal_filtered.groupby("month")["rfh"].mean().reset_index()
-    ax.bar(df_monthly_avg["month"], df_monthly_avg["rfh"], color="b", alpha=0.7, label="Average Monthly Rainfall")
-    ax.set_xlabel("Month", fontsize=12)
-    ax.set_ylabel("Average Rainfall (mm)", fontsize=12)
-    ax.set_title(f"Average Monthly Rainfall ({start_date} - {end_date})", fontsize=14, fontweight="bold")
-    ax.set_xticks(range(1, 13))
-    ax.set_xticklabels(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
-    ax.legend()
-    ax.grid(axis="y", linestyle="--", alpha=0.7)
-    st.pyplot(fig)
+    page_navigation()
 
-    # --- COMMENTS ON THE ANALYSIS ---
-    st.write("**Comments on Seasonal Analysis:**")
-    st.write("""
-    The bar chart above presents the average monthly rainfall.
-    This helps in identifying seasonal patterns: months with consistently low rainfall may indicate a dry season,
-    whereas months with high rainfall are likely during the wet season.
-    Such insights are vital for planning agricultural activities and managing water resources.
-    """)
 
-    # Plot seasonal trends per year
-    fig, ax = plt.subplots(figsize=(12, 6))
-    for year in df_seasonal_filtered["year"].unique():
-        df_yearly = df_seasonal_filtered[df_seasonal_filtered["year"] == year]
-        ax.plot(df_yearly["month"], df_yearly["rfh"], marker='o', linestyle='-', alpha=0.6, label=str(year))
-    ax.set_xlabel("Month", fontsize=12)
-    ax.set_ylabel("Total Rainfall (mm)", fontsize=12)
-    ax.set_title(f"Yearly Seasonal Trends ({start_date} - {end_date})", fontsize=14, fontweight="bold")
-    ax.set_xticks(range(1, 13))
-    ax.set_xticklabels(["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"])
-    ax.legend()
-    ax.grid(axis="y", linestyle="--", alpha=0.7)
-    st.pyplot(fig)
-
-     # --- COMMENTS ON THE ANALYSIS ---
-    st.write(
-    "Consistent seasonal peaks\n\n"
-    "– The peaks in August have remained similar in recent years without significant variations. This could indicate stabilization in rainfall patterns.\n\n"
-    "- Comparing the distribution in recent years and then the 80s, the graphic shows **lower interannual variability**. If the curves from recent years are closer together compared to previous years, it might mean that **rainfall patterns are becoming more predictable**.\n\n"
-    "- Overall, the rainfall has been quite stable in the last 40 years. We can predict it will not change much."
-    )
+# --- DROUGHT (SPI) ---
+elif page == "Drought (SPI)":
+    st.title("🏜️ Drought Monitoring with the Standardized Precipitation Index")
+
+    @st.cache_data
+    def load_spi(country, scale, version):
+        return spi.compute_spi(country, scale, version)
+
+    @st.fragment
+    def spi_section():
+        col1, col2 = st.columns(2)
+        with col1:
+            scale = st.selectbox("Accumulation period (months):", spi.SPI_SCALES, index=1)
+        df_spi = load_spi(country, scale, ingest.data_version(country))
+        with col2:
+            unit = st.selectbox("Unit:", ["All units (mean)"] + list(df_spi.columns))
+
+        start_year, end_year = st.slider("Years:", int(df_spi.index.year.min()), int(df_spi.index.year.max()),
+                                         (max(int(df_spi.index.year.min()), int(df_spi.index.year.max()) - 20), int(df_spi.index.year.max())))
+        df_window = df_spi[(df_spi.index.year >= start_year) & (df_spi.index.year <= end_year)]
+        series = df_window.mean(axis=1) if unit == "All units (mean)" else df_window[unit]
+
+        # Serie SPI con le classi di siccità
+        fig, ax = plt.subplots(figsize=(12, 5))
+        ax.bar(series.index, series.clip(upper=0), width=25, color="firebrick", label="Dry")
+        ax.bar(series.index, series.clip(lower=0), width=25, color="steelblue", label="Wet")
+        for level, style in [(-1.0, ":"), (-1.5, "--"), (-2.0, "-")]:
+            ax.axhline(level, color="gray", linestyle=style, linewidth=1)
+        ax.set_ylim(-spi.SPI_LIMIT, spi.SPI_LIMIT)
+        ax.set_xlabel("Month", fontsize=12)
+        ax.set_ylabel(f"SPI-{scale}", fontsize=12)
+        ax.set_title(f"SPI-{scale} – {unit}", fontsize=14, fontweight="bold")
+        ax.legend()
+        ax.grid(axis="y", linestyle="--", alpha=0.7)
+        st.pyplot(fig)
 
+        # Quota di unità in siccità (SPI ≤ -1) per mese
+        share = spi.drought_share(df_window)
+        fig, ax = plt.subplots(figsize=(12, 3))
+        ax.fill_between(share.index, share * 100, color="salmon")
+        ax.set_ylabel("% of units", fontsize=12)
+        ax.set_title(f"Units in drought (SPI-{scale} ≤ -1)", fontsize=14, fontweight="bold")
+        ax.grid(axis="y", linestyle="--", alpha=0.7)
+        st.pyplot(fig)
 
-    col1, col2 , col3= st.columns([1, 2, 1])
+        latest = df_spi.ffill().iloc[-1]
+        st.write(f"**Latest month ({df_spi.index[-1]:%Y-%m}) by class:**")
+        st.dataframe(latest.map(spi.spi_class).value_counts().rename("units"))
 
-    with col1:
-        if st.button("← Previous page"):
-            next_page_index = (pages.index(page) - 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
-    with col2:
-        st.write("")
+    spi_section()
 
-    with col3:
-        if st.button("Next page →"):
-            next_page_index = (pages.index(page) + 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
+    # --- COMMENTS ON THE ANALYSIS ---
+    st.write("**Comments on the SPI:**")
+    st.write("""
+    The SPI compares the rainfall accumulated over the last 1, 3, 6 or 12 months with the usual rainfall of the same
+    period in the same unit: a gamma distribution is fitted per unit and calendar month on the reference years, and the
+    probability of the observed total is expressed in standard deviations. Values below -1 indicate moderate drought,
+    below -1.5 severe and below -2 extreme drought. Short scales follow agricultural drought, long scales hydrological drought.
+    """)
+
+    page_navigation()
 
             
 # --- GEOGRAPHICAL DISTRIBUTION ---
 elif page == "Geographical Distribution":
     st.title("🗺️ Geographical Distribution")
-    st.write("Coming soon: Visualization of rainfall by region.")
-
-    # Percorso alle cartelle
-    folder_path_1 = "Climate_Precipitation_Data/"
-    folder_path_2 = "MODIS_Gross_Primary_Production_GPP/"
-    folder_path_3 = "Gridded_Population_Density_Data/"  # Terza cartella
-    folder_path_4 = "Modis_Land_Cover_Data/"  # Quarta cartella
 
-    # Carica e ordina i file per tutte le cartelle
-    tif_files_sorted_1 = load_and_sort_tif_files(folder_path_1)
-    tif_files_sorted_2 = load_and_sort_tif_files2(folder_path_2)
-    tif_files_sorted_3 = load_and_sort_tif_files3(folder_path_3)  # Terza cartella
-    tif_files_sorted_4 = load_and_sort_tif_files4(folder_path_4)  # Quarta cartella
+    # Mappe per tile e confini serviti in locale; se la porta è occupata da un'altra replica
+    # sullo stesso host si usa il suo server (il tentativo si ripete a ogni run, se si ferma)
+    tile_server.start_server()
+    if not tile_server.reachable_from(st.context.headers.get("Host", "")):
+        st.warning(f"The map tiles are served on {tile_server.server_url()}, which the browser cannot reach "
+                   "from another machine: set TILE_HOST (e.g. 0.0.0.0) or TILE_SERVER_URL.")
+
+    # --- Rainfall by ADM2 unit: totals from the (Pcode x month) cube, boundaries loaded once by URL ---
+    st.subheader("Rainfall by ADM2 unit")
+    @st.fragment
+    def rainfall_map_section():
+        if raster_roi.load_boundaries(2):
+            cube = choropleth.load_cube(country, ingest.data_version(country))
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                metric = st.radio("Show:", ["Total (mm)", "Anomaly (%)"], key="choropleth_metric")
+            with col2:
+                window = st.select_slider("Period:", options=cube.periods, value=(cube.periods[-12], cube.periods[-1]),
+                                          key="choropleth_window")
+            colors, (vmin, vmax), _ = choropleth.fill_colors(cube, *window, metric="total" if metric.startswith("Total") else "anomaly")
+            units_layer = pdk.Layer(
+                "GeoJsonLayer",
+                id="adm2-rainfall",  # same id on every rerun: deck.gl updates the layer instead of rebuilding it
+                data=tile_server.boundaries_url(2),
+                get_fill_color=choropleth.fill_expression(colors),
+                update_triggers={"getFillColor": [window, metric]},
+                get_line_color=[80, 80, 80],
+                line_width_min_pixels=0.5,
+                pickable=True,
+            )
+            lon, lat = choropleth.boundaries_center(2)
+            st.pydeck_chart(pdk.Deck(
+                layers=[units_layer],
+                initial_view_state=pdk.ViewState(longitude=lon, latitude=lat, zoom=5.5),
+                tooltip={"text": "{name} ({pcode})"},
+            ))
+            st.caption(f"{window[0]} to {window[1]}: colour scale from {vmin:.0f} to {vmax:.0f} "
+                       f"{'mm' if metric.startswith('Total') else '% of the usual rainfall of the same months'}; grey = no data.")
+        else:
+            st.info("ADM2 boundaries not found: add the COD-AB GeoJSON (see raster_roi.ADM_BOUNDARIES) to show the map.")
+
+    rainfall_map_section()
+
+    # --- Hotspot delle anomalie di pioggia: Gi* e Moran locale con pesi di contiguità ADM2 ---
+    st.subheader("Rainfall anomaly hotspots")
+    @st.fragment
+    def hotspot_section():
+        if raster_roi.load_boundaries(2):
+            period_labels = {"Whole year": "year", "Rainy season (May–October)": "season"}
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                hotspot_period = period_labels[st.radio("Rainfall over:", list(period_labels), key="hotspot_period")]
+            result = hotspots.load_hotspots(country, hotspot_period, ingest.data_version(country))
+            hotspot_years = [int(y) for y in result["years"]]
+            with col2:
+                hotspot_year = st.select_slider("Year:", options=hotspot_years, value=hotspot_years[-1], key="hotspot_year")
+            hotspot_layer = pdk.Layer(
+                "GeoJsonLayer",
+                id="adm2-hotspots",
+                data=tile_server.boundaries_url(2),
+                get_fill_color=choropleth.fill_expression(hotspots.cluster_colors(result, hotspot_year)),
+                update_triggers={"getFillColor": [hotspot_period, hotspot_year]},
+                get_line_color=[80, 80, 80],
+                line_width_min_pixels=0.5,
+                pickable=True,
+            )
+            lon, lat = choropleth.boundaries_center(2)
+            st.pydeck_chart(pdk.Deck(
+                layers=[hotspot_layer],
+                initial_view_state=pdk.ViewState(longitude=lon, latitude=lat, zoom=5.5),
+                tooltip={"text": "{name} ({pcode})"},
+            ))
+            t = hotspot_years.index(hotspot_year)
+            counts = np.bincount(result["cluster"][:, t][result["cluster"][:, t] >= 0], minlength=len(hotspots.CLUSTERS))
+            st.caption(" · ".join(f"{label}: {counts[code]}" for code, (label, _) in hotspots.CLUSTERS.items())
+                       + "; grey = no data.")
+            significant = result["cluster"][:, t] > 0
+            if significant.any():
+                st.dataframe(pd.DataFrame({
+                    "Pcode": result["pcodes"][significant],
+                    "Class": [hotspots.CLUSTERS[c][0] for c in result["cluster"][significant, t]],
+                    "Anomaly (std)": result["anomaly"][significant, t],
+                    "Gi* (z)": result["gi"][significant, t],
+                    "Local Moran's I": result["moran"][significant, t],
+                    "p-value": result["p"][significant, t],
+                }).sort_values("Gi* (z)").round(3), hide_index=True)
+            st.write(f"""
+            Every unit's {'annual' if hotspot_period == 'year' else 'rainy-season'} rainfall is compared with its own
+            years (standardized anomaly), then with the anomalies of the units that share a border with it. Units whose
+            neighbourhood is significantly wet or dry ({hotspots.PERMUTATIONS} conditional permutations, p ≤ {hotspots.ALPHA})
+            form clusters; outliers are units significantly different from their neighbours.
+            """)
+        else:
+            st.info("ADM2 boundaries not found: add the COD-AB GeoJSON (see raster_roi.ADM_BOUNDARIES) to show the map.")
+
+    hotspot_section()
+
+    # Elenco dei frame e statistiche per le legende dal catalogo dei raster, senza aprire i file;
+    # la scansione delle cartelle (solo i file cambiati vengono riletti) si ripete al massimo ogni 10 minuti
+    @st.cache_data(ttl=600)
+    def load_raster_catalog():
+        return raster_catalog.refresh()
+
+    # Quinta cartella: anomalie (z-score) per pixel, aggiornate in modo incrementale
+    anomaly_labels = {"GPP": "gpp", "Precipitation": "precipitation"}
+    anomaly_layer = anomaly_labels[st.selectbox("Anomaly layer:", list(anomaly_labels))]
+    anomaly_years = anomaly.build_anomalies(anomaly_layer)
+    catalog = load_raster_catalog()
+    if [entry["year"] for entry in raster_catalog.frames(catalog, f"{anomaly_layer}_anomaly")] != anomaly_years:
+        load_raster_catalog.clear()
+        catalog = load_raster_catalog()
+
+    frames_1 = raster_catalog.frames(catalog, "precipitation")
+    frames_2 = raster_catalog.frames(catalog, "gpp")
+    frames_3 = raster_catalog.frames(catalog, "population")
+    frames_4 = raster_catalog.frames(catalog, "landcover")
+    frames_5 = raster_catalog.frames(catalog, f"{anomaly_layer}_anomaly")
+
+    # Region of interest: only the raster blocks intersecting it are read
+    roi_options = {"Full extent": {}}
+    roi_options.update({name: {"region": name} for name in raster_roi.REGIONS})
+    for adm_level in (1, 2):
+        roi_options.update({f"{name} ({pcode})": {"pcode": pcode} for pcode, name in raster_roi.adm_units(adm_level).items()})
+    roi = roi_options[st.selectbox("Region of interest:", list(roi_options))]
 
     # Inizializza lo stato della sessione per i player
     if "play_1" not in st.session_state:
@@ -717,275 +933,327 @@ elif page == "Geographical Distribution":
     if "frame_index_4" not in st.session_state:
         st.session_state.frame_index_4 = 0  # Indice del frame corrente per il player 4
 
+    if "play_5" not in st.session_state:
+        st.session_state.play_5 = False  # Stato di riproduzione per il player 5
+    if "frame_index_5" not in st.session_state:
+        st.session_state.frame_index_5 = 0  # Indice del frame corrente per il player 5
+
+    # Decodifica dei frame su un pool di thread: i frame correnti dei cinque player partono insieme
+    @st.cache_resource
+    def get_frame_prefetcher():
+        return frame_prefetch.FramePrefetcher()
+
+    # Il prefetcher è condiviso dal processo: le code sono per sessione e player
+    prefetcher = get_frame_prefetcher()
+    session_id = get_script_run_ctx().session_id
+    for player_key, frames in enumerate([frames_1, frames_2, frames_3, frames_4, frames_5], start=1):
+        if frames:
+            index = st.session_state[f"frame_index_{player_key}"] % len(frames)
+            prefetcher.prefetch(session_id, player_key, [frames[index]["path"]], roi)
+
     # Funzione per creare un player con legenda e descrizione
-    def create_player(col1, col2, folder_path, tif_files_sorted, player_key, title, description, cmap):
+    def show_player(frames, player_key, title, description, cmap, histogram=None, vrange=(None, None)):
+        # Una riga per player: un fragment scrive solo nei contenitori creati al suo interno
+        col1, col2 = st.columns([2, 3])  # Prima colonna per il player, seconda per la descrizione
         with col1:
             st.subheader(title)
 
-            # Bottone Play/Pause
-            if st.button(f"▶️ Play {player_key}" if not st.session_state[f"play_{player_key}"] else f"⏸️ Pause {player_key}", key=f"play_button_{player_key}"):
-                st.session_state[f"play_{player_key}"] = not st.session_state[f"play_{player_key}"]
+            if not frames:
+                st.warning("Nessun file disponibile per questo player.")
+            else:
+                # Bottone Play/Pause: riesegue la pagina una volta, per avviare o fermare il timer del fragment
+                if st.button(f"▶️ Play {player_key}" if not st.session_state[f"play_{player_key}"] else f"⏸️ Pause {player_key}", key=f"play_button_{player_key}"):
+                    st.session_state[f"play_{player_key}"] = not st.session_state[f"play_{player_key}"]
+                    st.rerun()
+
+                # Slider per selezionare il frame (anno); in riproduzione ogni esecuzione avanza di un frame
+                slider_key = f"frame_slider_{player_key}"
+                frame = st.session_state.get(slider_key, st.session_state[f"frame_index_{player_key}"])
                 if st.session_state[f"play_{player_key}"]:
-                    globals()[f"update_frame_{player_key}"]()  # Avvia l'aggiornamento del frame
-
-            # Slider per selezionare il frame (anno)
-            frame_index = st.slider(
-                "",
-                0, len(tif_files_sorted) - 1,
-                st.session_state[f"frame_index_{player_key}"],
-                key=f"frame_slider_{player_key}"
-            )
+                    frame += 1
+                st.session_state[slider_key] = frame % len(frames)
+                st.session_state[f"frame_index_{player_key}"] = st.slider("Frame", 0, len(frames) - 1, key=slider_key, label_visibility="collapsed")
 
-            # Mostra l'immagine corrispondente al frame selezionato
-            if st.session_state[f"frame_index_{player_key}"] < len(tif_files_sorted):
-                filename = tif_files_sorted[st.session_state[f"frame_index_{player_key}"]]
-                year = filename[:4] if player_key != 3 else filename[11:15]  # Gestione anno per Population Density
-                file_path = os.path.join(folder_path, filename)
+                # Mostra l'immagine corrispondente al frame selezionato
+                entry = frames[st.session_state[f"frame_index_{player_key}"]]
+                year = entry["year"]
+                file_path = entry["path"]
 
                 try:
-                    with rasterio.open(file_path) as src:
-                        # Leggi i dati
-                        data = src.read(1)  # Leggi la prima banda
-
-                        # Crea una figura per la visualizzazione
+                    # Leggi solo la finestra della regione, ridotta alla risoluzione della figura
+                    data, transform = prefetcher.get(file_path, roi)
+
+                    # Decodifica in background i prossimi anni (o quelli vicini, se il player è fermo)
+                    indices = prefetcher.neighbours(frames, st.session_state[f"frame_index_{player_key}"],
+                                                    st.session_state[f"play_{player_key}"])
+                    prefetcher.prefetch(session_id, player_key, [frames[i]["path"] for i in indices], roi)
+
+                    if data is None:
+                        # La regione scelta è fuori dal raster (i raster coprono solo l'Assaba)
+                        st.info(f"Year {year}: the selected region is outside the extent of this raster.")
+                    elif not data.count():
+                        st.info(f"Year {year}: no valid pixels in the selected region.")
+                    else:
+                        # Crea una figura per la visualizzazione; scala dei colori comune a tutti gli anni (dal catalogo)
                         fig, ax = plt.subplots(figsize=(6, 4))  # Ridimensiona la figura
-                        show(src, ax=ax, cmap=cmap)
+                        show(data, transform=transform, ax=ax, cmap=cmap, vmin=vrange[0], vmax=vrange[1])
+                        fig.colorbar(ax.get_images()[0], ax=ax, shrink=0.8)
                         ax.set_title(f"Year {year}")
                         ax.axis('off')
 
                         # Mostra la figura in Streamlit
                         st.pyplot(fig)
+                        if entry["min"] is not None:
+                            st.caption(f"{year}: values from {entry['min']:.4g} to {entry['max']:.4g}, mean {entry['mean']:.4g} "
+                                       f"({entry['valid_pixels']:,} valid pixels, {entry['shape'][1]}×{entry['shape'][0]}, {entry['dtype']})")
+
+                        # Legenda e istogramma delle classi, letti dalla tabella degli attributi in cache
+                        if histogram is not None:
+                            df_hist = histogram(int(year))
+                            colors = plt.get_cmap(cmap)(np.linspace(0, 1, len(df_hist)))
+                            fig_hist, ax_hist = plt.subplots(figsize=(6, 2.5))
+                            ax_hist.barh(df_hist["class"], df_hist["area_km2"], color=colors)
+                            ax_hist.invert_yaxis()
+                            ax_hist.set_xlabel("Area (km²)")
+                            ax_hist.set_title(f"GPP classes {year} (kg C/m²/year)")
+                            st.pyplot(fig_hist)
 
                 except Exception as e:
-                    st.error(f"Errore nel file {filename}: {str(e)}")
-            else:
-                st.warning("Nessun file disponibile per questo frame.")
+                    st.error(f"Errore nel file {file_path}: {str(e)}")
 
         with col2:
             # Descrizione dettagliata con spazio aggiuntivo
             st.markdown("<div style='margin-bottom: 210px;'></div>", unsafe_allow_html=True)  # Aggiunge spazio
             st.markdown(f"**Description:** {description}")
-            st.markdown("<div style='margin-bottom: 390px;'></div>", unsafe_allow_html=True)  # Aggiunge spazio
 
-    # Crea una colonna per i player e una per la descrizione
-    col1, col2 = st.columns([2, 3])  # Prima colonna per i player, seconda per la descrizione
+    # Ogni player è un fragment: in riproduzione si riesegue da solo ogni 0.5 secondi, senza la pagina
+    def create_player(frames, player_key, *args, **kwargs):
+        run_every = 0.5 if st.session_state[f"play_{player_key}"] else None
+        st.fragment(show_player, run_every=run_every)(frames, player_key, *args, **kwargs)
 
     # Player 1 (Climate_Precipitation_Data)
-    create_player(col1, col2, folder_path_1, tif_files_sorted_1, 1, "Climate Precipitation",
-                  "The geographical distribution of rainfall in the Sahel has changed over the years, showing a clear trend of increasing concentration in the southern regions. Meanwhile, the northern areas are becoming progressively drier, indicating a shift in precipitation patterns that could have significant environmental and socio-economic impacts.", 'viridis')
+    create_player(frames_1, 1, "Climate Precipitation",
+                  "The geographical distribution of rainfall in the Sahel has changed over the years, showing a clear trend of increasing concentration in the southern regions. Meanwhile, the northern areas are becoming progressively drier, indicating a shift in precipitation patterns that could have significant environmental and socio-economic impacts.", 'viridis',
+                  vrange=raster_catalog.layer_range(catalog, "precipitation"))
 
     # Player 2 (GPP)
-    create_player(col1, col2, folder_path_2, tif_files_sorted_2, 2, "Gross Primary Production, GPP",
-                  "This map shows Burkina Faso’s Gross Primary Productivity (GPP) in 2021. It is shaped like the country’s outline and is divided into two main colors—yellow and dark blue—indicating different GPP values across the territory. The northern and northeastern areas are predominantly shown in yellow, while the central and southern regions appear mostly in dark blue. This color contrast illustrates variations in vegetation productivity, with the darker tones generally reflecting higher productivity levels.", 'plasma')
+    create_player(frames_2, 2, "Gross Primary Production, GPP",
+                  "This map shows Burkina Faso’s Gross Primary Productivity (GPP) in 2021. It is shaped like the country’s outline and is divided into two main colors—yellow and dark blue—indicating different GPP values across the territory. The northern and northeastern areas are predominantly shown in yellow, while the central and southern regions appear mostly in dark blue. This color contrast illustrates variations in vegetation productivity, with the darker tones generally reflecting higher productivity levels.", 'plasma',
+                  histogram=gpp_vat.class_histogram, vrange=raster_catalog.layer_range(catalog, "gpp"))
 
     # Player 3 (Population Density)
-    create_player(col1, col2, folder_path_3, tif_files_sorted_3, 3, "Population Density",
-                  "The population density is highest in three locations corresponding to the inhabited centers and does not change over the years.", 'inferno')
+    create_player(frames_3, 3, "Population Density",
+                  "The population density is highest in three locations corresponding to the inhabited centers and does not change over the years.", 'inferno',
+                  vrange=raster_catalog.layer_range(catalog, "population"))
 
     # Player 4 (land cover)
-    create_player(col1, col2, folder_path_4, tif_files_sorted_4, 4, "Land cover",
-                  "The map showing land use cover for agricultural purposes reveals an interesting trend over the years. At the beginning of the 2000s, the area dedicated to agriculture was relatively limited. However, around 2010, there was a noticeable increase in agricultural land use, likely driven by factors such as growing demand for food, technological advancements, or policy changes. This upward trend continued for some time, but in recent years, the map indicates a downward trend in agricultural land use. This decline could be attributed to various factors, including urbanization, land degradation, shifts toward more sustainable practices, or changes in agricultural policies. Overall, the map highlights the dynamic nature of land use and the impact of socio-economic and environmental factors on agricultural landscapes", 'magma')
-
-    # Avvia l'aggiornamento automatico se i player sono in riproduzione
-    if st.session_state.play_1:
-        update_frame_1()
-    if st.session_state.play_2:
-        update_frame_2()
-    if st.session_state.play_3:
-        update_frame_3()
-    if st.session_state.play_4:
-        update_frame_4()
-
-    # Pulsanti per navigare tra le pagine
-    col1, col2, col3 = st.columns([1, 2, 1])
+    create_player(frames_4, 4, "Land cover",
+                  "The map showing land use cover for agricultural purposes reveals an interesting trend over the years. At the beginning of the 2000s, the area dedicated to agriculture was relatively limited. However, around 2010, there was a noticeable increase in agricultural land use, likely driven by factors such as growing demand for food, technological advancements, or policy changes. This upward trend continued for some time, but in recent years, the map indicates a downward trend in agricultural land use. This decline could be attributed to various factors, including urbanization, land degradation, shifts toward more sustainable practices, or changes in agricultural policies. Overall, the map highlights the dynamic nature of land use and the impact of socio-economic and environmental factors on agricultural landscapes", 'magma',
+                  vrange=raster_catalog.layer_range(catalog, "landcover"))
+
+    # Player 5 (anomalie): scala simmetrica attorno allo zero
+    z_limit = max((abs(v) for v in raster_catalog.layer_range(catalog, f"{anomaly_layer}_anomaly") if v is not None), default=None)
+    create_player(frames_5, 5, "Anomaly (z-score)",
+                  "Each pixel is compared with its own climatology over all the available years: the z-score is the distance from the per-pixel mean in standard deviations. Red pixels are below their usual value (drier or less productive years), blue pixels above it.", 'RdBu',
+                  vrange=(-z_limit, z_limit) if z_limit else (None, None))
+
+    # Mappa interattiva: tile XYZ servite in locale, renderizzate una volta e poi lette dalla cache su disco
+    @st.fragment
+    def interactive_map_section():
+        st.subheader("Interactive map")
+        layer_labels = {"Climate Precipitation": "precipitation", "Gross Primary Production, GPP": "gpp",
+                        "Population Density": "population", "Land cover": "landcover",
+                        "Rainfall–GPP correlation": "correlation"}
+        col1, col2 = st.columns(2)
+        with col1:
+            map_layer = layer_labels[st.selectbox("Layer:", list(layer_labels), key="map_layer")]
+        with col2:
+            if map_layer == "correlation":
+                # Una mappa per metodo e ritardo invece di una per anno (calcolate al primo uso)
+                with st.spinner("Computing the correlation maps..."):
+                    maps = list(tile_server.layer_files("correlation"))
+                lag_labels = {"lag0": "same year", "lag1": "previous year's rainfall"}
+                map_year = st.selectbox("Map:", maps, key="map_correlation",
+                                        format_func=lambda name: f"{name.split('_')[0].title()}, {lag_labels[name.split('_')[1]]}")
+            else:
+                map_year = st.selectbox("Year:", list(raster_align.list_layer_files(map_layer)), key="map_year")
+        if map_layer == "correlation":
+            st.caption("Per-pixel correlation between the yearly rainfall and the yearly GPP over all the common years, "
+                       "on the GPP grid: blue pixels respond to wetter years with more production, red pixels the opposite. "
+                       "Pixels with fewer than 8 valid years are left empty.")
+
+        lon, lat = tile_server.layer_center(map_layer)
+        tile_url = tile_server.tile_url(map_layer, map_year)
+        # TerrainLayer is the tiled bitmap layer that pydeck can configure from Python:
+        # a flat elevation decoder leaves only the texture, i.e. the raster tiles
+        raster_layer = pdk.Layer(
+            "TerrainLayer",
+            elevation_data=tile_url,
+            texture=tile_url,
+            elevation_decoder={"rScaler": 0, "gScaler": 0, "bScaler": 0, "offset": 0},
+            min_zoom=0,
+            max_zoom=12,
+        )
+        st.pydeck_chart(pdk.Deck(
+            layers=[raster_layer],
+            initial_view_state=pdk.ViewState(longitude=lon, latitude=lat, zoom=7),
+        ))
 
-    with col1:
-        if st.button("← Previous page"):
-            next_page_index = (pages.index(page) - 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
-    with col2:
-        st.write("")
+    interactive_map_section()
 
-    with col3:
-        if st.button("Next page →"):
-            next_page_index = (pages.index(page) + 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
+    page_navigation()
 
 
-# --- RAW DATA ---
-elif page == "Raw Data":
-    st.title("📜 Raw Data")
-    st.write("Preview of the rainfall dataset:")
-    st.dataframe(df)
+# --- POPULATION EXPOSURE ---
+elif page == "Population Exposure":
+    st.title("👥 Population Exposure to Rainfall Anomalies")
 
-    st.write("Preview of the climate change dataset dataset:")
-    file_path = "climate-change_bfa.csv"
-    df_land = pd.read_csv(file_path)
-    df_burkina = df_land[df_land["Country Name"] == "Burkina Faso"]
-    st.dataframe(df_burkina)
+    @st.cache_data
+    def load_exposure(z_threshold):
+        return exposure.load_exposure(z_threshold=z_threshold)
 
+    @st.fragment
+    def exposure_section():
+        z_threshold = st.slider("Anomaly threshold (standard deviations):", 0.5, 2.0, 1.0, step=0.25)
+        df_exposure = load_exposure(z_threshold)
 
-    col1, col2 , col3= st.columns([1, 2, 1])
+        region = st.selectbox("Region:", sorted(df_exposure["region"].unique()))
+        df_region = df_exposure[df_exposure["region"] == region]
 
-    with col1:
-        if st.button("← Previous page"):
-            next_page_index = (pages.index(page) - 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
-    with col2:
-        st.write("")
+        fig, ax = plt.subplots(figsize=(12, 6))
+        ax.bar(df_region["year"], df_region["pop_drought"], color="salmon", label="Population under drought")
+        ax.bar(df_region["year"], df_region["pop_excess"], bottom=df_region["pop_drought"], color="lightblue", label="Population under excess rain")
+        ax.plot(df_region["year"], df_region["population"], color="black", marker="o", linestyle="--", label="Total population")
+        ax.set_xlabel("Year", fontsize=12)
+        ax.set_ylabel("People", fontsize=12)
+        ax.set_title(f"People Exposed to Rainfall Anomalies in {region} (|z| ≥ {z_threshold})", fontsize=14, fontweight="bold")
+        ax.legend()
+        ax.grid(axis="y", linestyle="--", alpha=0.7)
+        ax.ticklabel_format(style='plain', axis='y')
+        st.pyplot(fig)
 
-    with col3:
-        if st.button("Next page →"):
-            next_page_index = (pages.index(page) + 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
+        st.dataframe(df_region.set_index("year")[["population", "pop_drought", "pop_excess", "share_drought", "share_excess"]])
 
-# --- LAND USE ---
-if page == "Land Use":
-    st.title("🌍 Land Use in Burkina Faso")
-
-    # Load the dataset for land use
-    file_path = "climate-change_bfa.csv"
-    df_land = pd.read_csv(file_path)
-    df_burkina = df_land[df_land["Country Name"] == "Burkina Faso"]
-
-    # Filter the three main indicators
-    agriculture = df_burkina[df_burkina["Indicator Name"] == "Agricultural land (% of land area)"]
-    forest = df_burkina[df_burkina["Indicator Name"] == "Forest area (% of land area)"]
-    arable = df_burkina[df_burkina["Indicator Name"] == "Arable land (% of land area)"]
-
-    # Merge the three datasets by year
-    df_selected = pd.merge(agriculture[['Year', 'Value']], forest[['Year', 'Value']], on="Year", suffixes=('_agriculture', '_forest'))
-    df_selected = pd.merge(df_selected, arable[['Year', 'Value']], on="Year")
-    df_selected.rename(columns={"Value": "Value_arable"}, inplace=True)
-
-    # Convert values to numeric
-    df_selected['Value_agriculture'] = pd.to_numeric(df_selected['Value_agriculture'], errors='coerce')
-    df_selected['Value_forest'] = pd.to_numeric(df_selected['Value_forest'], errors='coerce')
-    df_selected['Value_arable'] = pd.to_numeric(df_selected['Value_arable'], errors='coerce')
-
-    # Convert 'Year' to datetime and sort
-    df_selected['Year'] = pd.to_datetime(df_selected['Year'], format='%Y')
-    df_selected = df_selected.sort_values(by="Year", ascending=True)
-
-    # Add interactive slider for Land Use analysis
-    if use_same_slider:
-        start_year = start_date.year
-        end_year = end_date.year
-    else:
-        min_year_land = int(df_selected['Year'].min().year)
-        max_year_land = int(df_selected['Year'].max().year)
-        start_year, end_year = st.slider(
-            "Select the analysis period for Land Use:",
-            min_value=min_year_land,
-            max_value=max_year_land,
-            value=(min_year_land, max_year_land),
-            step=1
-        )
-
-    # Filter the land use data based on the selected year range
-    df_selected = df_selected[(df_selected['Year'].dt.year >= start_year) & (df_selected['Year'].dt.year <= end_year)]
+    exposure_section()
 
-    # Create the plot
-    fig, ax = plt.subplots(figsize=(10, 5))
-    ax.plot(df_selected['Year'], df_selected['Value_agriculture'], label="Agricultural Land (%)", color="green", linewidth=2)
-    ax.plot(df_selected['Year'], df_selected['Value_forest'], label="Forest Area (%)", color="brown", linewidth=2, linestyle="dashed")
-    ax.plot(df_selected['Year'], df_selected['Value_arable'], label="Arable Land (%)", color="blue", linewidth=2, linestyle="dotted")
-    ax.set_xlabel("Year")
-    ax.set_ylabel("Percentage of Total Area")
-    ax.set_title(f"Agricultural, Forest, and Arable Land in Burkina Faso ({start_year} - {end_year})", fontsize=14, fontweight="bold")
-    ax.legend()
-    ax.grid(True)
-    ax.ticklabel_format(style='plain', axis='y')
-    st.pyplot(fig)
+    # --- COMMENTS ON THE ANALYSIS ---
+    st.write("**Comments on Population Exposure:**")
+    st.write("""
+    Each pixel of the precipitation rasters is compared with its own average over all the years (z-score).
+    Years below the threshold count as drought, years above it as excess rain, and the population living in those pixels
+    (from the gridded population density, closest available year) is summed per region.
+    Unlike national averages, these figures weight every anomaly by the number of people who actually live there.
+    """)
 
-    # --- CORRELATION BETWEEN ANNUAL RAINFALL AND LAND USE INDICATORS ---
-    # Aggregate annual rainfall from the rainfall dataset
-    df_rainfall = df.copy()
-    df_rainfall["year"] = df_rainfall["date"].dt.year
-    df_annual_rainfall = df_rainfall.groupby("year")["rfh"].sum().reset_index()
-    df_annual_rainfall.rename(columns={"rfh": "Total_Rainfall"}, inplace=True)
+    page_navigation()
 
-    # Ensure df_selected has an integer 'year' column for merging
-    df_selected["year"] = df_selected["Year"].dt.year
+# --- RAW DATA ---
+elif page == "Raw Data":
+    st.title("📜 Raw Data")
+    st.write("Preview of the rainfall dataset:")
+    st.dataframe(get_rainfall_backend(backend_name, country, ingest.data_version(country)).preview())
 
-    # Merge the land use data with the annual rainfall data on the year column
-    df_merged = pd.merge(df_selected, df_annual_rainfall, left_on="year", right_on="year", how="inner")
+    st.write("Preview of the climate change dataset dataset:")
+    df_burkina = load_indicators(country)
+    st.dataframe(df_burkina)
 
-    # Compute the correlation matrix including Total_Rainfall and land use indicators
-    corr_cols = ["Value_agriculture", "Value_forest", "Value_arable", "Total_Rainfall"]
-    corr_matrix = df_merged[corr_cols].corr()
 
-    st.write("### Correlation Matrix between Annual Rainfall and Land Use Indicators:")
-    st.dataframe(corr_matrix)
+    page_navigation()
 
+# --- LAND USE ---
+if page == "Land Use":
+    st.title(f"🌍 Land Use in {country_name}")
+
+    # Land-use indicators (annual) and rainfall (dekadal, summed per year and averaged over the
+    # units) on the same yearly axis, from the temporal alignment layer
+    df_panel = temporal.align(["land_use", "rainfall"], "year", country=country)
+    df_selected = df_panel.rename(columns={
+        "land_use.agriculture": "Value_agriculture",
+        "land_use.forest": "Value_forest",
+        "land_use.arable": "Value_arable",
+        "rainfall.rfh": "Total_Rainfall",
+    }).dropna(subset=["Value_agriculture", "Value_forest", "Value_arable"], how="all")
+    df_selected["Year"] = df_selected.index
+
+    @st.fragment
+    def land_use_section(df_selected, start_date, end_date):
+        # Add interactive slider for Land Use analysis
+        if use_same_slider:
+            start_year = start_date.year
+            end_year = end_date.year
+        else:
+            min_year_land = int(df_selected['Year'].min().year)
+            max_year_land = int(df_selected['Year'].max().year)
+            start_year, end_year = st.slider(
+                "Select the analysis period for Land Use:",
+                min_value=min_year_land,
+                max_value=max_year_land,
+                value=(min_year_land, max_year_land),
+                step=1
+            )
 
+        # Filter the land use data based on the selected year range
+        df_selected = df_selected[(df_selected['Year'].dt.year >= start_year) & (df_selected['Year'].dt.year <= end_year)]
+
+        # Create the plot
+        fig, ax = plt.subplots(figsize=(10, 5))
+        ax.plot(df_selected['Year'], df_selected['Value_agriculture'], label="Agricultural Land (%)", color="green", linewidth=2)
+        ax.plot(df_selected['Year'], df_selected['Value_forest'], label="Forest Area (%)", color="brown", linewidth=2, linestyle="dashed")
+        ax.plot(df_selected['Year'], df_selected['Value_arable'], label="Arable Land (%)", color="blue", linewidth=2, linestyle="dotted")
+        ax.set_xlabel("Year")
+        ax.set_ylabel("Percentage of Total Area")
+        ax.set_title(f"Agricultural, Forest, and Arable Land in {country_name} ({start_year} - {end_year})", fontsize=14, fontweight="bold")
+        ax.legend()
+        ax.grid(True)
+        ax.ticklabel_format(style='plain', axis='y')
+        st.pyplot(fig)
 
-    # --- COMMENTS ON THE ANALYSIS ---
-    st.write("**Comments on Land Use Analysis:**")
-    st.write("""
-    The above line charts illustrate the trends in land use over time.
-    Notably, if agricultural land is expanding while forest area declines, it might suggest deforestation to make way for farming,
-    which could have negative consequences on biodiversity, carbon sequestration, and climate regulation.
-    The correlation matrix helps quantify these relationships and indicates how changes in one type of land use may be associated with changes in another.
-    """)
+        # --- CORRELATION BETWEEN ANNUAL RAINFALL AND LAND USE INDICATORS ---
+        # Years with both the indicators and a complete year of rainfall
+        df_merged = df_selected.dropna(subset=["Total_Rainfall"])
 
-    # --- CORRELATION BETWEEN ANNUAL RAINFALL AND LAND USE INDICATORS ---
-    # Aggregate annual rainfall from the rainfall dataset
-    df_rainfall = df.copy()
-    df_rainfall["year"] = df_rainfall["date"].dt.year
-    df_annual_rainfall = df_rainfall.groupby("year")["rfh"].sum().reset_index()
-    df_annual_rainfall.rename(columns={"rfh": "Total_Rainfall"}, inplace=True)
+        # Compute the correlation matrix including Total_Rainfall and land use indicators
+        corr_cols = ["Value_agriculture", "Value_forest", "Value_arable", "Total_Rainfall"]
+        corr_matrix = df_merged[corr_cols].corr()
 
-    # Ensure df_selected has an integer 'year' column for merging
-    df_selected["year"] = df_selected["Year"].dt.year
+        st.write("### Correlation Matrix between Annual Rainfall and Land Use Indicators:")
+        st.dataframe(corr_matrix)
 
-    # Merge the land use data with the annual rainfall data on the year column
-    df_merged = pd.merge(df_selected, df_annual_rainfall, left_on="year", right_on="year", how="inner")
 
-    # Compute the correlation matrix including Total_Rainfall and land use indicators
-    corr_cols = ["Value_agriculture", "Value_forest", "Value_arable", "Total_Rainfall"]
-    corr_matrix = df_merged[corr_cols].corr()
 
-    st.write("### Correlation Matrix between Annual Rainfall and Land Use Indicators:")
+        # --- COMMENTS ON THE ANALYSIS ---
+        st.write("**Comments on Land Use Analysis:**")
+        st.write("""
+        The above line charts illustrate the trends in land use over time.
+        Notably, if agricultural land is expanding while forest area declines, it might suggest deforestation to make way for farming,
+        which could have negative consequences on biodiversity, carbon sequestration, and climate regulation.
+        The correlation matrix helps quantify these relationships and indicates how changes in one type of land use may be associated with changes in another.
+        """)
 
+        st.write("### Correlation Matrix between Annual Rainfall and Land Use Indicators:")
 
-    import seaborn as sns
-    # Create a heatmap of the correlation matrix
-    fig_corr, ax_corr = plt.subplots(figsize=(8, 6))
-    sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", ax=ax_corr)
-    ax_corr.set_title("Correlation Heatmap: Land Use & Annual Rainfall", fontsize=14, fontweight="bold")
-    st.pyplot(fig_corr)
-    #st.dataframe(corr_matrix)
 
-    # Comments on the correlation analysis
-    st.write("""
-    **Comments on Rainfall and Land Use Correlation:**
-    This merged analysis shows how annual total rainfall correlates with different land use indicators.
-    For instance:
-    - A negative correlation between Total Rainfall and Forest Area might suggest that drier conditions are associated with a decline in forest cover.
-    - A positive correlation with Agricultural Land could indicate that higher rainfall supports more extensive farming areas.
-    These insights are crucial for understanding how climatic factors can influence land use dynamics, potentially affecting biodiversity, water resources, and agricultural productivity.
-    """)
+        import seaborn as sns
+        # Create a heatmap of the correlation matrix
+        fig_corr, ax_corr = plt.subplots(figsize=(8, 6))
+        sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", ax=ax_corr)
+        ax_corr.set_title("Correlation Heatmap: Land Use & Annual Rainfall", fontsize=14, fontweight="bold")
+        st.pyplot(fig_corr)
+        #st.dataframe(corr_matrix)
 
-    col1, col2 , col3= st.columns([1, 2, 1])
+        # Comments on the correlation analysis
+        st.write("""
+        **Comments on Rainfall and Land Use Correlation:**
+        This merged analysis shows how annual total rainfall correlates with different land use indicators.
+        For instance:
+        - A negative correlation between Total Rainfall and Forest Area might suggest that drier conditions are associated with a decline in forest cover.
+        - A positive correlation with Agricultural Land could indicate that higher rainfall supports more extensive farming areas.
+        These insights are crucial for understanding how climatic factors can influence land use dynamics, potentially affecting biodiversity, water resources, and agricultural productivity.
+        """)
 
-    with col1:
-        if st.button("← Previous page"):
-            next_page_index = (pages.index(page) - 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
-    with col2:
-        st.write("")
+    land_use_section(df_selected, start_date, end_date)
 
-    with col3:
-        if st.button("Next page →"):
-            next_page_index = (pages.index(page) + 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
+    page_navigation()
 
 # --- CREDITS PAGE ---
 if page == "Credits":
@@ -1005,18 +1273,4 @@ if page == "Credits":
     st.write("Thank you for using our application!")
 
 
-    col1, col2 , col3= st.columns([1, 2, 1])
-
-    with col1:
-        if st.button("← Previous page"):
-            next_page_index = (pages.index(page) - 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
-    with col2:
-        st.write("")
-
-    with col3:
-        if st.button("Next page →"):
-            next_page_index = (pages.index(page) + 1) % len(pages)
-            st.session_state["selected_page"] = pages[next_page_index]
-            st.rerun()
+    page_navigation()
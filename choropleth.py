@@ -0,0 +1,182 @@
+import json
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from matplotlib import colormaps
+from shapely.geometry import mapping, shape
+
+import ingest
+import partitions
+import raster_roi
+
+
+# Boundaries simplified once for drawing (tolerance in degrees, ~500 m)
+BOUNDARIES_PATH = os.path.join(partitions.STORE_PATH, "boundaries")
+SIMPLIFY_TOLERANCE = 0.005
+
+# Fill of the units with no rainfall data in the window
+NO_DATA_COLOR = [200, 200, 200, 120]
+
+# Colour scales: total (mm) and anomaly (% of the usual rainfall of the same months)
+TOTAL_CMAP = "YlGnBu"
+ANOMALY_CMAP = "BrBG"
+ANOMALY_RANGE = 50
+
+
+def boundaries_path(adm_level=2):
+    return os.path.join(BOUNDARIES_PATH, f"adm{adm_level}_simplified.geojson")
+
+
+def simplified_boundaries(adm_level=2):
+    """GeoJSON (bytes) of the ADM units with simplified geometries and, for every feature, its
+    pcode, name and idx (its position, used to look up the fill colour). Written once."""
+    path = boundaries_path(adm_level)
+    source = raster_roi.ADM_BOUNDARIES.get(adm_level)
+    if os.path.exists(path) and (source is None or not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)):
+        with open(path, "rb") as f:
+            return f.read()
+
+    features = []
+    for idx, feature in enumerate(raster_roi.load_boundaries(adm_level)):
+        props = feature["properties"]
+        geom = shapely.simplify(shape(feature["geometry"]), SIMPLIFY_TOLERANCE, preserve_topology=True)
+        # Coordinates on a ~10 m grid: finer than the simplification, and short in the JSON
+        geom = shapely.set_precision(geom, 0.0001)
+        features.append({
+            "type": "Feature",
+            "properties": {
+                "idx": idx,
+                "pcode": props.get(f"ADM{adm_level}_PCODE"),
+                "name": props.get(f"ADM{adm_level}_FR") or props.get(f"ADM{adm_level}_EN"),
+            },
+            "geometry": mapping(geom),
+        })
+    data = json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":")).encode()
+    os.makedirs(BOUNDARIES_PATH, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return data
+
+
+@lru_cache(maxsize=4)
+def boundary_pcodes(adm_level=2):
+    return [feature["properties"]["pcode"] for feature in json.loads(simplified_boundaries(adm_level))["features"]]
+
+
+@lru_cache(maxsize=4)
+def boundaries_center(adm_level=2):
+    """(longitude, latitude) of the centre of the boundaries' bounding box."""
+    features = json.loads(simplified_boundaries(adm_level))["features"]
+    left, bottom, right, top = shapely.total_bounds([shape(f["geometry"]) for f in features])
+    return float(left + right) / 2, float(bottom + top) / 2
+
+
+class RainfallCube:
+    """Monthly rainfall as a (Pcode x month) array, with cumulative sums along the months so
+    the total of any window is one subtraction per unit."""
+
+    def __init__(self, monthly):
+        self.pcodes = np.array(sorted(monthly["Pcode"].unique()))
+        self.first_year = int(monthly["year"].min())
+        months = (monthly["year"].astype(int) - self.first_year) * 12 + monthly["month"].astype(int) - 1
+        n_months = int(months.max()) + 1
+        rows = np.searchsorted(self.pcodes, monthly["Pcode"].to_numpy())
+
+        self.values = np.full((len(self.pcodes), n_months), np.nan, dtype=np.float32)
+        self.values[rows, months.to_numpy()] = monthly["rfh"].to_numpy()
+
+        # Long-term mean of every calendar month, per unit
+        by_month = self.values[:, :n_months // 12 * 12].reshape(len(self.pcodes), -1, 12)
+        with np.errstate(invalid="ignore"):
+            self.climatology = np.nanmean(by_month, axis=1) if by_month.size else np.full((len(self.pcodes), 12), np.nan)
+
+        filled = np.nan_to_num(self.values)
+        expected = self.climatology[:, np.arange(n_months) % 12]
+        zero = np.zeros((len(self.pcodes), 1), dtype=np.float64)
+        self.cum_total = np.hstack([zero, np.cumsum(filled, axis=1, dtype=np.float64)])
+        self.cum_count = np.hstack([zero, np.cumsum(np.isfinite(self.values), axis=1, dtype=np.float64)])
+        self.cum_expected = np.hstack([zero, np.cumsum(np.where(np.isfinite(self.values), expected, 0), axis=1,
+                                                       dtype=np.float64)])
+
+    @property
+    def periods(self):
+        """Labels "YYYY-MM" of the months of the cube."""
+        n = self.values.shape[1]
+        return [f"{self.first_year + i // 12}-{i % 12 + 1:02d}" for i in range(n)]
+
+    def index(self, period):
+        year, month = (int(p) for p in period.split("-"))
+        return (year - self.first_year) * 12 + month - 1
+
+    def window(self, start, end):
+        """Total (mm), anomaly (% of the usual total of the same months) and months with data,
+        per unit, for the months from start to end ("YYYY-MM", inclusive)."""
+        i, j = self.index(start), self.index(end) + 1
+        total = self.cum_total[:, j] - self.cum_total[:, i]
+        count = self.cum_count[:, j] - self.cum_count[:, i]
+        expected = self.cum_expected[:, j] - self.cum_expected[:, i]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            anomaly = np.where(expected > 0, (total / expected - 1) * 100, np.nan)
+        total = np.where(count > 0, total, np.nan)
+        return total, anomaly, count
+
+
+@lru_cache(maxsize=4)
+def load_cube(country="BFA", version=0):
+    """Rainfall cube of a country, rebuilt when an ingest changes the data version."""
+    return RainfallCube(ingest.read_monthly(country))
+
+
+def feature_values(pcodes, values, adm_level=2):
+    """Values (one per pcode, pcodes sorted) in the order of the boundary features; NaN for the
+    features with no value."""
+    pcodes = np.asarray(pcodes)
+    features = boundary_pcodes(adm_level)
+    pos = np.searchsorted(pcodes, features)
+    last = np.minimum(pos, len(pcodes) - 1)
+    found = (pos < len(pcodes)) & (pcodes[last] == features)
+    return np.where(found, np.asarray(values, dtype=np.float64)[last], np.nan)
+
+
+def value_colors(values, vmin, vmax, cmap_name):
+    """RGBA list of values on a colour scale; NO_DATA_COLOR for NaN."""
+    scaled = np.clip((values - vmin) / ((vmax - vmin) or 1), 0, 1)
+    rgba = colormaps[cmap_name](np.nan_to_num(scaled), bytes=True).astype(int)
+    rgba[:, 3] = 200
+    rgba[~np.isfinite(values)] = NO_DATA_COLOR
+    return rgba.tolist()
+
+
+def fill_colors(cube, start, end, adm_level=2, metric="total"):
+    """RGBA fill of every boundary feature (in the order of their idx) for a window, with the
+    colour range used."""
+    total, anomaly, _ = cube.window(start, end)
+    values = feature_values(cube.pcodes, total if metric == "total" else anomaly, adm_level)
+    if metric == "total":
+        vmin, vmax = 0.0, float(np.nanmax(values)) if np.isfinite(values).any() else 1.0
+        cmap = TOTAL_CMAP
+    else:
+        vmin, vmax = -ANOMALY_RANGE, ANOMALY_RANGE
+        cmap = ANOMALY_CMAP
+    return value_colors(values, vmin, vmax, cmap), (vmin, vmax), values
+
+
+def fill_expression(colors):
+    """deck.gl accessor that picks each feature's colour from a literal array by its idx.
+
+    The geometry is loaded by URL and stays cached in the browser: when the window changes
+    only this expression (a few bytes per unit) is sent again."""
+    # pydeck adds the "@@=" expression prefix to string accessors
+    return json.dumps(colors, separators=(",", ":")) + "[properties.idx]"
+
+
+if __name__ == "__main__":
+    # Usage: python choropleth.py start end   (YYYY-MM)
+    cube = load_cube("BFA", ingest.data_version("BFA"))
+    start, end = (sys.argv[1], sys.argv[2]) if len(sys.argv) > 2 else (cube.periods[-12], cube.periods[-1])
+    total, anomaly, _ = cube.window(start, end)
+    for pcode, t, a in zip(cube.pcodes, total, anomaly):
+        print(f"{pcode}  {t:8.1f} mm  {a:+6.1f} %")
@@ -0,0 +1,115 @@
+import contextlib
+import os
+import warnings
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from scipy.stats import rankdata
+
+import gpp_vat
+import raster_align
+
+
+# Precipitation of year t - lag against GPP of year t, per pixel: lag 0 is the response in the
+# same year, lag 1 the carry-over of the previous rainy season
+LAGS = [0, 1]
+METHODS = ["pearson", "spearman"]
+
+# Pixels with fewer valid year pairs get no coefficient
+MIN_YEARS = 8
+
+# Rows of the grid processed per pass: only these rows of every year are in memory
+BLOCK_ROWS = 256
+
+
+def correlation_grid():
+    """The GPP grid: GPP keeps its resolution, precipitation is resampled onto it."""
+    return raster_align.TargetGrid.from_layer("gpp")
+
+
+def correlation_folder(grid):
+    return os.path.join(raster_align.ALIGNED_PATH, grid.key, "correlation")
+
+
+def map_name(method, lag):
+    return f"{method}_lag{lag}"
+
+
+def map_path(grid, method, lag):
+    return os.path.join(correlation_folder(grid), f"{map_name(method, lag)}.tif")
+
+
+def pearson(x, y, min_years=MIN_YEARS):
+    """Correlation along the first axis over the positions where both x and y are finite."""
+    both = np.isfinite(x) & np.isfinite(y)
+    n = both.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dx = np.where(both, x - np.where(both, x, 0).sum(axis=0) / n, 0.0)
+        dy = np.where(both, y - np.where(both, y, 0).sum(axis=0) / n, 0.0)
+        r = (dx * dy).sum(axis=0) / np.sqrt((dx * dx).sum(axis=0) * (dy * dy).sum(axis=0))
+    return np.where(n >= min_years, r, np.nan)
+
+
+def spearman(x, y, min_years=MIN_YEARS):
+    """Pearson correlation of the ranks (ties averaged), ranked over the common valid years."""
+    both = np.isfinite(x) & np.isfinite(y)
+    rx = rankdata(np.where(both, x, np.nan), axis=0, nan_policy="omit")
+    ry = rankdata(np.where(both, y, np.nan), axis=0, nan_policy="omit")
+    return pearson(rx, ry, min_years)
+
+
+def block_correlations(precip, gpp, lags=LAGS):
+    """{(method, lag): coefficients} for one block of (year, row, col) stacks."""
+    out = {}
+    for lag in lags:
+        x, y = precip[:len(precip) - lag], gpp[lag:]
+        out[("pearson", lag)] = pearson(x, y)
+        out[("spearman", lag)] = spearman(x, y)
+    return out
+
+
+def compute_correlations(grid=None, block_rows=BLOCK_ROWS):
+    """Writes one GeoTIFF per method and lag on the grid. The stacks are read block by block of
+    rows and every coefficient is computed for the whole block at once."""
+    stack = raster_align.AlignedStack(grid or correlation_grid())
+    grid = stack.grid
+    years = stack.common_years("precipitation", "gpp")
+    os.makedirs(correlation_folder(grid), exist_ok=True)
+    with contextlib.ExitStack() as files:
+        precip_srcs = [files.enter_context(rasterio.open(stack.path("precipitation", y))) for y in years]
+        gpp_srcs = [files.enter_context(rasterio.open(stack.path("gpp", y))) for y in years]
+        dsts = {(method, lag): files.enter_context(rasterio.open(map_path(grid, method, lag), "w", **grid.profile()))
+                for method in METHODS for lag in LAGS}
+
+        for row0 in range(0, grid.height, block_rows):
+            window = Window(0, row0, grid.width, min(block_rows, grid.height - row0))
+            precip = np.stack([src.read(1, window=window) for src in precip_srcs]).astype(np.float64)
+            gpp = np.stack([src.read(1, window=window) for src in gpp_srcs]).astype(np.float64)
+            gpp[gpp >= gpp_vat.GPP_FILL_MIN] = np.nan
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                for key, r in block_correlations(precip, gpp).items():
+                    dsts[key].write(r.astype(np.float32), 1, window=window)
+    return years
+
+
+def correlation_files(grid=None):
+    """{map name: path} of the correlation maps, recomputed only when an aligned input raster
+    is newer than them."""
+    stack = raster_align.AlignedStack(grid or correlation_grid())
+    paths = {map_name(method, lag): map_path(stack.grid, method, lag) for method in METHODS for lag in LAGS}
+    inputs = [stack.path(layer, y) for y in stack.common_years("precipitation", "gpp") for layer in ("precipitation", "gpp")]
+    if not all(os.path.exists(p) for p in paths.values()) or \
+            min(os.path.getmtime(p) for p in paths.values()) < max(os.path.getmtime(p) for p in inputs):
+        compute_correlations(stack.grid)
+    return paths
+
+
+if __name__ == "__main__":
+    # Usage: python correlation.py
+    for name, path in correlation_files().items():
+        with rasterio.open(path) as src:
+            r = src.read(1)
+        r = r[np.isfinite(r)]
+        print(f"{name}: median r {np.median(r):+.2f}, {np.mean(r > 0) * 100:.0f}% of {len(r):,} pixels positive -> {path}")
@@ -0,0 +1,124 @@
+import contextlib
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window
+
+import raster_align
+import raster_roi
+
+
+# Name of the pixels of the grid that fall outside every ADM unit (the rasters cover Assaba)
+GRID_REGION = "Assaba"
+
+# Rows of the grid processed per pass
+BLOCK_ROWS = 256
+
+
+def pixel_area_km2(grid):
+    """Area of the grid cells in km², one value per row (cells shrink with latitude in EPSG:4326)."""
+    rows = np.arange(grid.height) + 0.5
+    if grid.crs.is_geographic:
+        lat = grid.transform.f + grid.transform.e * rows
+        km_x = abs(grid.transform.a) * 111.32 * np.cos(np.radians(lat))
+        km_y = abs(grid.transform.e) * 110.57
+        return (km_x * km_y)[:, None]
+    return np.full((grid.height, 1), abs(grid.transform.a * grid.transform.e) / 1e6)
+
+
+def region_labels(grid, adm_level=2):
+    """Integer label of the ADM unit of every grid cell (0 = GRID_REGION) and the label names."""
+    names = [GRID_REGION]
+    shapes = []
+    for pcode, name in raster_roi.adm_units(adm_level).items():
+        geom = raster_roi.adm_geometry(pcode=pcode)
+        shapes.append((transform_geom("EPSG:4326", grid.crs, geom.__geo_interface__), len(names)))
+        names.append(name)
+    if not shapes:
+        return np.zeros(grid.shape, dtype=np.int32), names
+    labels = rasterize(shapes, out_shape=grid.shape, transform=grid.transform, fill=0, dtype="int32")
+    return labels, names
+
+
+def nearest_year(year, years):
+    # Population is only available every 5 years: use the closest one, the earlier one on ties
+    return min(years, key=lambda y: (abs(y - year), y))
+
+
+def cache_path(grid, z_threshold, adm_level):
+    return os.path.join(raster_align.ALIGNED_PATH, grid.key, f"exposure_z{z_threshold:g}_adm{adm_level}.csv")
+
+
+def compute_exposure(grid=None, z_threshold=1.0, adm_level=2, block_rows=BLOCK_ROWS):
+    """People living under drought (z <= -threshold) or excess rain (z >= threshold) per region and year.
+
+    The precipitation z-score is computed per pixel against the mean and standard deviation of
+    all the years. The grid is processed in blocks of rows, so only block_rows rows of every
+    year are in memory at once."""
+    stack = raster_align.AlignedStack(grid)
+    grid = stack.grid
+    precip_years = stack.years("precipitation")
+    pop_years = stack.years("population")
+    labels, names = region_labels(grid, adm_level)
+    area = pixel_area_km2(grid)
+
+    totals = np.zeros((len(precip_years), 3, len(names)))
+    with contextlib.ExitStack() as files:
+        precip_srcs = [files.enter_context(rasterio.open(stack.path("precipitation", y))) for y in precip_years]
+        pop_srcs = {y: files.enter_context(rasterio.open(stack.path("population", y))) for y in pop_years}
+
+        for row0 in range(0, grid.height, block_rows):
+            window = Window(0, row0, grid.width, min(block_rows, grid.height - row0))
+            rows = slice(row0, row0 + int(window.height))
+            lab = labels[rows].ravel()
+
+            precip = np.stack([src.read(1, window=window) for src in precip_srcs])
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # cells with no data in any year
+                mean = np.nanmean(precip, axis=0)
+                std = np.nanstd(precip, axis=0)
+            z = (precip - mean) / np.where(std > 0, std, np.nan)
+
+            people = {y: src.read(1, window=window) * area[rows] for y, src in pop_srcs.items()}
+            for i, year in enumerate(precip_years):
+                pop = people[nearest_year(year, pop_years)]
+                weights = np.where(np.isfinite(pop) & np.isfinite(z[i]), pop, 0.0)
+                totals[i, 0] += np.bincount(lab, weights=weights.ravel(), minlength=len(names))
+                totals[i, 1] += np.bincount(lab, weights=(weights * (z[i] <= -z_threshold)).ravel(), minlength=len(names))
+                totals[i, 2] += np.bincount(lab, weights=(weights * (z[i] >= z_threshold)).ravel(), minlength=len(names))
+
+    df = pd.DataFrame({
+        "region": np.tile(names, len(precip_years)),
+        "year": np.repeat(precip_years, len(names)),
+        "population": totals[:, 0].ravel(),
+        "pop_drought": totals[:, 1].ravel(),
+        "pop_excess": totals[:, 2].ravel(),
+    })
+    df = df[df["population"] > 0].reset_index(drop=True)
+    df["share_drought"] = df["pop_drought"] / df["population"]
+    df["share_excess"] = df["pop_excess"] / df["population"]
+    return df
+
+
+def load_exposure(grid=None, z_threshold=1.0, adm_level=2):
+    """Cached exposure table: recomputed only when an aligned input raster is newer than the cache."""
+    stack = raster_align.AlignedStack(grid)
+    path = cache_path(stack.grid, z_threshold, adm_level)
+    inputs = [stack.path(layer, y) for layer in ("precipitation", "population") for y in stack.years(layer)]
+    if os.path.exists(path) and os.path.getmtime(path) >= max(os.path.getmtime(p) for p in inputs):
+        return pd.read_csv(path)
+    df = compute_exposure(stack.grid, z_threshold, adm_level)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, index=False)
+    return df
+
+
+if __name__ == "__main__":
+    # Usage: python exposure.py [z_threshold]
+    print(load_exposure(z_threshold=float(sys.argv[1]) if len(sys.argv) > 1 else 1.0).to_string(index=False))
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import raster_roi
+
+
+# Decoding threads (rasterio releases the GIL while GDAL reads)
+MAX_WORKERS = 4
+
+# Frames queued or running per player; older requests beyond this are cancelled
+MAX_PENDING = 4
+
+# Decoded frames kept in memory (least recently used dropped first)
+MAX_FRAMES = 64
+
+# Pixel size of the decoded frames, as in the players
+FRAME_SIZE = 600
+
+
+def frame_key(path, roi, max_size=FRAME_SIZE):
+    return path, tuple(sorted(roi.items())), max_size
+
+
+class FramePrefetcher:
+    """Decodes raster frames on a thread pool ahead of the players.
+
+    get() returns a frame (data, transform) from memory, from a read already in flight, or
+    reads it on the spot. prefetch() queues the frames a player is going to need next and
+    cancels the ones it queued before that have not started yet."""
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, max_frames=MAX_FRAMES):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frame")
+        self.max_pending = max_pending
+        self.max_frames = max_frames
+        self.frames = OrderedDict()
+        self.futures = {}
+        self.queued = {}  # (session, player) -> keys it asked for, oldest first
+        self.lock = threading.Lock()
+
+    def _decode(self, key):
+        path, roi, max_size = key
+        try:
+            frame = raster_roi.read_roi(path, max_size=max_size, **dict(roi))
+            with self.lock:
+                self.frames[key] = frame
+                self.frames.move_to_end(key)
+                while len(self.frames) > self.max_frames:
+                    self.frames.popitem(last=False)
+        finally:
+            # Also after a failed read, so the next request reads the frame again
+            with self.lock:
+                self.futures.pop(key, None)
+        return frame
+
+    def _submit(self, key):
+        # Called with the lock held
+        if key in self.frames or key in self.futures:
+            return
+        self.futures[key] = self.executor.submit(self._decode, key)
+
+    def get(self, path, roi, max_size=FRAME_SIZE):
+        key = frame_key(path, roi, max_size)
+        with self.lock:
+            if key in self.frames:
+                self.frames.move_to_end(key)
+                return self.frames[key]
+            future = self.futures.get(key)
+        if future is not None:
+            try:
+                return future.result()
+            except CancelledError:
+                pass
+        return self._decode(key)
+
+    def prefetch(self, session, player, paths, roi, max_size=FRAME_SIZE):
+        """Queues the frames of paths (most urgent first) for a player of a session. Frames
+        queued earlier by the same player of the same session, no longer wanted and wanted by no
+        other player, are cancelled if they have not started."""
+        owner = (session, player)
+        wanted = [frame_key(path, roi, max_size) for path in paths][:self.max_pending]
+        with self.lock:
+            others = {key for other, keys in self.queued.items() if other != owner for key in keys}
+            for key in self.queued.get(owner, []):
+                future = self.futures.get(key)
+                if key not in wanted and key not in others and future is not None and future.cancel():
+                    del self.futures[key]
+            for key in wanted:
+                self._submit(key)
+            self.queued[owner] = wanted
+            # Queues whose frames are all decoded (e.g. of closed sessions) hold nothing to cancel
+            for other in [o for o, keys in self.queued.items() if not any(k in self.futures for k in keys)]:
+                del self.queued[other]
+
+    def neighbours(self, files, index, playing):
+        """Indices to decode next: the following frames while playing, otherwise both sides."""
+        n = len(files)
+        if playing:
+            steps = range(1, self.max_pending + 1)
+        else:
+            steps = [1, -1, 2, -2]
+        indices = dict.fromkeys((index + s) % n for s in steps)
+        indices.pop(index, None)
+        return list(indices)[:self.max_pending]
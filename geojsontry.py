@@ -1,10 +1,10 @@
-import geopandas as gpd
 import geoplot
 import geoplot.crs as gcrs
 
-data = gpd.read_file(
-    r"D:\Utente\Download\hotosm_bfa_roads_lines_geojson\hotosm_bfa_roads_lines_geojson.geojson"
-)
+import roads
+
+# Roads converted once to GeoParquet (set ROADS_GEOJSON to the HOT OSM export), simplified for a country-wide view
+data = roads.simplified_roads(zoom=6)
 
 geoplot.polyplot(
     data,
@@ -15,4 +15,5 @@ geoplot.polyplot(
     figsize=(12, 8)
 )
 
-print(type(data))
\ No newline at end of file
+print(type(data))
+print(roads.adm_road_density().sort_values("density_km_km2", ascending=False).head(10))
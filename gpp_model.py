@@ -0,0 +1,244 @@
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+import exposure
+import gpp_vat
+import raster_align
+
+
+# Model, metrics and the prediction / residual GeoTIFFs (one pair per year)
+MODEL_PATH = "gpp_model/"
+
+# GPP (kg C / m² / year) predicted per pixel from these layers, all on the GPP grid;
+# land cover is a class code, handled as a categorical feature
+TARGET = "gpp"
+FEATURES = ["precipitation", "landcover", "population"]
+CATEGORICAL = ["landcover"]
+
+# Rows of the grid read per pass
+BLOCK_ROWS = 256
+
+# Training pixels drawn at random over all the years (bounds the memory of the fit),
+# a share of them held out to measure the fit
+MAX_SAMPLES = 1_000_000
+VALIDATION_SHARE = 0.2
+SEED = 0
+
+MODEL_PARAMS = {
+    "max_iter": 300,
+    "learning_rate": 0.1,
+    "max_leaf_nodes": 63,
+    "early_stopping": True,
+    "validation_fraction": 0.1,
+    "random_state": SEED,
+}
+
+
+def model_file():
+    return os.path.join(MODEL_PATH, "model.pkl")
+
+
+def metrics_file():
+    return os.path.join(MODEL_PATH, "metrics.json")
+
+
+def output_path(year, kind):
+    # kind: "pred" or "resid"
+    return os.path.join(MODEL_PATH, f"{year}_{kind}.tif")
+
+
+def model_grid():
+    """The native GPP grid: the target is never resampled, the predictors are brought onto it."""
+    return raster_align.TargetGrid.from_layer(TARGET)
+
+
+def model_years(stack):
+    return stack.common_years(TARGET, *[f for f in FEATURES if f != "population"])
+
+
+def _input_paths(stack, year, pop_years):
+    # Population is only available every 5 years: the closest year is used
+    paths = {layer: stack.path(layer, year) for layer in [TARGET] + FEATURES if layer != "population"}
+    paths["population"] = stack.path("population", exposure.nearest_year(year, pop_years))
+    return paths
+
+
+def block_arrays(srcs, window):
+    """Features (pixels x FEATURES, float32) and target (kg C / m² / year, NaN for nodata and
+    fill codes) of one block of rows."""
+    X = np.stack([srcs[layer].read(1, window=window).ravel() for layer in FEATURES], axis=1)
+    raw = srcs[TARGET].read(1, window=window).ravel().astype(np.float64)
+    y = np.where(raw < gpp_vat.GPP_FILL_MIN, raw * gpp_vat.GPP_SCALE, np.nan)
+    return X, y
+
+
+def _blocks(grid, block_rows=BLOCK_ROWS):
+    for row0 in range(0, grid.height, block_rows):
+        yield Window(0, row0, grid.width, min(block_rows, grid.height - row0))
+
+
+# --- WORKERS ---
+# One year per task; the gradient boosting threads are limited to one per worker process
+
+_model = None
+
+
+def _init_worker(path=None):
+    global _model
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    if path is not None:
+        with open(path, "rb") as f:
+            _model = pickle.load(f)
+
+
+def _sample_year(task):
+    """Training pixels of one year: every block of rows is read once and each pixel with a
+    target and a rainfall value is kept with probability rate."""
+    grid, year, paths, rate = task
+    rng = np.random.default_rng([SEED, year])
+    X_parts, y_parts = [], []
+    srcs = {layer: rasterio.open(path) for layer, path in paths.items()}
+    try:
+        for window in _blocks(grid):
+            X, y = block_arrays(srcs, window)
+            keep = np.isfinite(y) & np.isfinite(X[:, FEATURES.index("precipitation")])
+            keep &= rng.random(len(y)) < rate
+            X_parts.append(X[keep])
+            y_parts.append(y[keep])
+    finally:
+        for src in srcs.values():
+            src.close()
+    return year, np.concatenate(X_parts), np.concatenate(y_parts)
+
+
+def _predict_year(task):
+    """Writes the prediction and residual (observed - predicted) rasters of one year, block by block."""
+    grid, year, paths = task
+    profile = grid.profile()
+    sq_error, n = 0.0, 0
+    srcs = {layer: rasterio.open(path) for layer, path in paths.items()}
+    try:
+        with rasterio.open(output_path(year, "pred"), "w", **profile) as pred_dst, \
+                rasterio.open(output_path(year, "resid"), "w", **profile) as resid_dst:
+            for window in _blocks(grid):
+                X, y = block_arrays(srcs, window)
+                pred = np.full(len(y), np.nan, dtype=np.float32)
+                known = np.isfinite(X[:, FEATURES.index("precipitation")])
+                if known.any():
+                    pred[known] = _model.predict(X[known])
+                resid = (y - pred).astype(np.float32)
+                shape = (int(window.height), int(window.width))
+                pred_dst.write(pred.reshape(shape), 1, window=window)
+                resid_dst.write(resid.reshape(shape), 1, window=window)
+                valid = np.isfinite(resid)
+                sq_error += float(np.square(resid[valid], dtype=np.float64).sum())
+                n += int(valid.sum())
+    finally:
+        for src in srcs.values():
+            src.close()
+    return {"year": year, "pixels": n, "rmse": float(np.sqrt(sq_error / n)) if n else None}
+
+
+# --- TRAINING AND INFERENCE ---
+
+def _tasks(stack, years):
+    pop_years = stack.years("population")
+    # Population years are shared by several tasks: aligned here, before the workers start
+    for year in pop_years:
+        stack.path("population", year)
+    return [(stack.grid, year, _input_paths(stack, year, pop_years)) for year in years]
+
+
+def _pool(workers, model_path=None):
+    # spawn: every worker starts a clean interpreter with its own GDAL and OpenMP state
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(model_path,))
+
+
+def train(grid=None, years=None, max_samples=MAX_SAMPLES, workers=None):
+    """Fits the model on pixels subsampled from every year (extracted in parallel, one year per
+    worker) and saves it with its validation scores. Returns the metrics."""
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    stack = raster_align.AlignedStack(grid or model_grid())
+    years = years or model_years(stack)
+    tasks = _tasks(stack, years)
+    # Upper bound of the kept pixels: max_samples if every pixel of every year were valid
+    rate = min(1.0, max_samples / (len(years) * stack.grid.width * stack.grid.height))
+
+    started = time.perf_counter()
+    with _pool(workers) as pool:
+        samples = list(pool.map(_sample_year, [task + (rate,) for task in tasks]))
+    X = np.concatenate([s[1] for s in samples])
+    y = np.concatenate([s[2] for s in samples])
+    extract_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(SEED)
+    held_out = rng.random(len(y)) < VALIDATION_SHARE
+    model = HistGradientBoostingRegressor(categorical_features=[f in CATEGORICAL for f in FEATURES], **MODEL_PARAMS)
+    started = time.perf_counter()
+    model.fit(X[~held_out], y[~held_out])
+    fit_seconds = time.perf_counter() - started
+
+    pred = model.predict(X[held_out])
+    residual = y[held_out] - pred
+    metrics = {
+        "features": FEATURES,
+        "years": [int(year) for year in years],
+        "grid": stack.grid.key,
+        "train_pixels": int((~held_out).sum()),
+        "validation_pixels": int(held_out.sum()),
+        "validation_r2": float(1 - np.square(residual).sum() / np.square(y[held_out] - y[held_out].mean()).sum()),
+        "validation_rmse": float(np.sqrt(np.square(residual).mean())),
+        "iterations": int(model.n_iter_),
+        "extract_seconds": round(extract_seconds, 2),
+        "fit_seconds": round(fit_seconds, 2),
+    }
+    os.makedirs(MODEL_PATH, exist_ok=True)
+    with open(model_file(), "wb") as f:
+        pickle.dump(model, f)
+    with open(metrics_file(), "w") as f:
+        json.dump(metrics, f, indent=2)
+    return metrics
+
+
+def predict(grid=None, years=None, workers=None):
+    """Writes the prediction and residual GeoTIFFs of every year with the saved model, one year
+    per worker. Returns the per-year residual RMSE."""
+    stack = raster_align.AlignedStack(grid or model_grid())
+    tasks = _tasks(stack, years or model_years(stack))
+    os.makedirs(MODEL_PATH, exist_ok=True)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        with _pool(workers, model_file()) as pool:
+            return list(pool.map(_predict_year, tasks))
+
+
+if __name__ == "__main__":
+    # Usage: python gpp_model.py [--years 2010 2011 ...] [--max-samples N] [--workers N] [--predict-only]
+    parser = argparse.ArgumentParser(description="Pixel model of GPP from rainfall, land cover and population.")
+    parser.add_argument("--years", type=int, nargs="+")
+    parser.add_argument("--max-samples", type=int, default=MAX_SAMPLES)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--predict-only", action="store_true", help="reuse the saved model")
+    args = parser.parse_args()
+    if not args.predict_only:
+        metrics = train(years=args.years, max_samples=args.max_samples, workers=args.workers)
+        print(f"{metrics['train_pixels']:,} training pixels, validation R² {metrics['validation_r2']:.3f}, "
+              f"RMSE {metrics['validation_rmse']:.4f} kg C/m²/year "
+              f"(extraction {metrics['extract_seconds']} s, fit {metrics['fit_seconds']} s)")
+    started = time.perf_counter()
+    for row in predict(years=args.years, workers=args.workers):
+        print(f"{row['year']}: residual RMSE {row['rmse']:.4f} over {row['pixels']:,} pixels")
+    print(f"-> {MODEL_PATH} ({time.perf_counter() - started:.1f} s)")
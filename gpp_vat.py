@@ -0,0 +1,123 @@
+import os
+import struct
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import rasterio
+
+
+GPP_FOLDER = "MODIS_Gross_Primary_Production_GPP/"
+
+# Compact copies of the raster attribute tables (.npz), rebuilt when the source changes
+VAT_CACHE_PATH = "vat_cache/"
+
+# MOD17A3 GPP: raw value * 0.0001 = kg C / m² / year; values from 65529 up are fill codes
+GPP_SCALE = 0.0001
+GPP_FILL_MIN = 65529
+
+# Legend classes of annual GPP (kg C / m² / year)
+GPP_CLASSES = [
+    ("< 0.05", 0.0, 0.05),
+    ("0.05 - 0.1", 0.05, 0.1),
+    ("0.1 - 0.2", 0.1, 0.2),
+    ("0.2 - 0.3", 0.2, 0.3),
+    ("0.3 - 0.5", 0.3, 0.5),
+    ("> 0.5", 0.5, np.inf),
+]
+FILL_CLASS = "Water / not vegetated"
+
+
+def read_dbf(path):
+    """Minimal dBASE III reader for the .vat.dbf files: {field name: numpy array}."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    n_records, header_len, record_len = struct.unpack("<IHH", raw[4:12])
+    fields = []
+    for offset in range(32, header_len - 1, 32):
+        if raw[offset] == 0x0D:  # end of the field descriptors
+            break
+        name = raw[offset:offset + 11].split(b"\0")[0].decode("ascii")
+        fields.append((name, chr(raw[offset + 11]), raw[offset + 16]))
+
+    # Fixed-width records: one byte deletion flag, then the fields side by side
+    dtype = np.dtype([("_deleted", "S1")] + [(name, f"S{length}") for name, _, length in fields])
+    records = np.frombuffer(raw, dtype=dtype, count=n_records, offset=header_len)
+    records = records[records["_deleted"] != b"*"]
+    table = {}
+    for name, kind, _ in fields:
+        column = np.char.strip(records[name])
+        if kind in "NF":
+            table[name] = column.astype(np.float64)
+        else:
+            table[name] = np.char.decode(column, "utf-8")
+    return table
+
+
+def _cache_file(path):
+    return os.path.join(VAT_CACHE_PATH, os.path.basename(path) + ".npz")
+
+
+@lru_cache(maxsize=64)
+def _load_vat(path, mtime):
+    cache = _cache_file(path)
+    if os.path.exists(cache) and os.path.getmtime(cache) >= mtime:
+        with np.load(cache) as npz:
+            return {k: npz[k] for k in npz.files}
+
+    vat_path = path + ".vat.dbf"
+    if os.path.exists(vat_path):
+        table = read_dbf(vat_path)
+        vat = {"value": table["Value"].astype(np.int64), "count": table["Count"].astype(np.int64)}
+        if "Name" in table:
+            vat["name"] = table["Name"]
+    else:
+        # No attribute table: count the raster values once
+        with rasterio.open(path) as src:
+            data = src.read(1)
+            nodata = src.nodata
+        values, counts = np.unique(data[data != nodata] if nodata is not None else data, return_counts=True)
+        vat = {"value": values.astype(np.int64), "count": counts.astype(np.int64)}
+
+    with rasterio.open(path) as src:
+        vat["pixel_area_km2"] = np.array(abs(src.transform.a * src.transform.e) / 1e6)
+    os.makedirs(VAT_CACHE_PATH, exist_ok=True)
+    np.savez(cache, **vat)
+    return vat
+
+
+def load_vat(path):
+    """Value / count (and name, if present) arrays of a raster's attribute table, parsed once and cached."""
+    return _load_vat(path, os.path.getmtime(path + ".vat.dbf") if os.path.exists(path + ".vat.dbf") else os.path.getmtime(path))
+
+
+def gpp_path(year):
+    return os.path.join(GPP_FOLDER, f"{year}_GP.tif")
+
+
+def class_histogram(year):
+    """Pixels and area (km²) per GPP legend class for one year, from the attribute table."""
+    vat = load_vat(gpp_path(year))
+    values, counts = vat["value"], vat["count"]
+
+    # Class index of every distinct raster value, then one weighted bincount
+    edges = np.array([low for _, low, _ in GPP_CLASSES[1:]])
+    class_index = np.digitize(values * GPP_SCALE, edges)
+    class_index[values >= GPP_FILL_MIN] = len(GPP_CLASSES)
+    pixels = np.bincount(class_index, weights=counts, minlength=len(GPP_CLASSES) + 1)
+
+    labels = [label for label, _, _ in GPP_CLASSES] + [FILL_CLASS]
+    return pd.DataFrame({
+        "class": labels,
+        "pixels": pixels.astype(np.int64),
+        "area_km2": pixels * float(vat["pixel_area_km2"]),
+    })
+
+
+if __name__ == "__main__":
+    # Usage: python gpp_vat.py [year]
+    for year in ([int(sys.argv[1])] if len(sys.argv) > 1 else range(2010, 2024)):
+        if os.path.exists(gpp_path(year)):
+            print(year)
+            print(class_histogram(year).to_string(index=False))
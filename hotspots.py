@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse as sp
+import shapely
+from shapely.geometry import shape
+
+import choropleth
+import ingest
+import partitions
+import raster_roi
+
+
+# Spatial weights (one file per admin level) and statistics (one file per country, period and
+# data version)
+HOTSPOT_PATH = os.path.join(partitions.STORE_PATH, "hotspots")
+
+# Neighbours: units whose boundaries touch (queen contiguity, with a tolerance in degrees for
+# the small gaps of the boundary file); units with no such neighbour get their K_NEAREST
+# nearest units by centroid distance
+CONTIGUITY_TOLERANCE = 0.001
+K_NEAREST = 4
+
+# Rainfall periods, as calendar months: the whole year and the main rainy season
+PERIODS = {
+    "year": list(range(1, 13)),
+    "season": [5, 6, 7, 8, 9, 10],
+}
+
+# Conditional permutations per period and significance level of the pseudo p-values
+PERMUTATIONS = 999
+ALPHA = 0.05
+SEED = 0
+
+# Cluster classes of the local Moran's I quadrants (significant units only): code -> (label, RGBA)
+CLUSTERS = {
+    0: ("Not significant", [235, 235, 235, 160]),
+    1: ("Wet cluster (high-high)", [33, 102, 172, 220]),
+    2: ("Dry cluster (low-low)", [178, 24, 43, 220]),
+    3: ("Wet outlier (high-low)", [146, 197, 222, 220]),
+    4: ("Dry outlier (low-high)", [244, 165, 130, 220]),
+}
+
+
+# --- SPATIAL WEIGHTS ---
+
+def weights_path(adm_level=2):
+    return os.path.join(HOTSPOT_PATH, f"weights_adm{adm_level}.npz")
+
+
+def unit_geometries(pcodes, adm_level=2):
+    """Boundary geometry of every pcode, None for the pcodes missing from the boundary file."""
+    geoms = {f["properties"].get(f"ADM{adm_level}_PCODE"): shape(f["geometry"]) for f in raster_roi.load_boundaries(adm_level)}
+    return [geoms.get(pcode) for pcode in pcodes]
+
+
+def build_weights(geoms, tolerance=CONTIGUITY_TOLERANCE, k=K_NEAREST):
+    """Binary (0/1) sparse weights between the units: contiguity, with the k nearest units for
+    the units that touch no other. Rows of the units with no geometry are empty."""
+    n = len(geoms)
+    present = np.array([i for i, g in enumerate(geoms) if g is not None], dtype=np.int64)
+    polygons = np.array([geoms[i] for i in present], dtype=object)
+    tree = shapely.STRtree(polygons)
+    i, j = tree.query(polygons, predicate="dwithin", distance=tolerance)
+    keep = i != j
+    rows, cols = present[i[keep]], present[j[keep]]
+
+    isolated = np.setdiff1d(present, rows)
+    if len(isolated) and len(present) > 1:
+        # Centroid distances with the longitudes scaled to the local km per degree
+        centroids = shapely.get_coordinates(shapely.centroid(polygons))
+        centroids[:, 0] *= np.cos(np.radians(centroids[:, 1].mean()))
+        pos = np.searchsorted(present, isolated)
+        dist = np.linalg.norm(centroids[pos, None, :] - centroids[None, :, :], axis=2)
+        dist[np.arange(len(pos)), pos] = np.inf
+        nearest = np.argsort(dist, axis=1)[:, :min(k, len(present) - 1)]
+        rows = np.concatenate([rows, np.repeat(isolated, nearest.shape[1])])
+        cols = np.concatenate([cols, present[nearest.ravel()]])
+
+    weights = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, n))
+    weights.data[:] = 1.0  # pairs found twice
+    return weights
+
+
+def load_weights(pcodes, adm_level=2):
+    """Weights between the units in the order of pcodes, built once and rebuilt when the units
+    or the boundary file change."""
+    path = weights_path(adm_level)
+    source = raster_roi.ADM_BOUNDARIES.get(adm_level)
+    if os.path.exists(path) and (source is None or not os.path.exists(source) or os.path.getmtime(path) >= os.path.getmtime(source)):
+        with np.load(path, allow_pickle=False) as npz:
+            if np.array_equal(npz["pcodes"], pcodes):
+                n = len(pcodes)
+                return sp.csr_matrix((np.ones(len(npz["indices"])), npz["indices"], npz["indptr"]), shape=(n, n))
+    weights = build_weights(unit_geometries(pcodes, adm_level))
+    os.makedirs(HOTSPOT_PATH, exist_ok=True)
+    np.savez(path, pcodes=np.asarray(pcodes), indptr=weights.indptr, indices=weights.indices)
+    return weights
+
+
+# --- STATISTICS ---
+
+def period_anomalies(cube, months):
+    """Standardized anomaly of the rainfall total over `months` of every complete year, per unit
+    (each unit against its own years): (pcode, year) array and the years."""
+    n_years = cube.values.shape[1] // 12
+    by_month = cube.values[:, :n_years * 12].reshape(len(cube.pcodes), n_years, 12)
+    # The total of a period with a missing month is missing
+    totals = by_month[:, :, [m - 1 for m in months]].sum(axis=2, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(totals, axis=1, keepdims=True)
+        std = np.nanstd(totals, axis=1, keepdims=True)
+        anomalies = np.where(std > 0, (totals - mean) / std, np.nan)
+    return anomalies, cube.first_year + np.arange(n_years)
+
+
+def pseudo_p_values(observed, simulated):
+    """Two-sided pseudo p-values: twice the share of the simulations at least as extreme as the
+    observed value on the side where it lies."""
+    permutations = simulated.shape[1]
+    larger = (simulated >= observed[:, None]).sum(axis=1)
+    larger = np.minimum(larger, permutations - larger)
+    return np.minimum(2 * (larger + 1.0) / (permutations + 1.0), 1.0)
+
+
+def local_statistics(weights, z, permutations=PERMUTATIONS, rng=None):
+    """Gi*, local Moran's I and pseudo p-values of one period for the units with a value.
+
+    z is the anomaly standardized over these units. With binary weights both statistics of a
+    unit only depend on the sum of its neighbours' values (its own value is fixed): the
+    conditional permutations draw that sum for every unit and every permutation at once."""
+    rng = rng or np.random.default_rng(SEED)
+    n = len(z)
+    k = np.asarray(weights.sum(axis=1)).ravel()
+    lag_sum = weights @ z
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Gi* with the unit itself among its neighbours (weights k + 1); z has mean 0 and std 1
+        w_star = k + 1
+        gi = (lag_sum + z) / np.sqrt((n * w_star - w_star ** 2) / (n - 1))
+        moran = z * lag_sum / k
+
+    # One draw of neighbours without replacement per permutation, shared by all the units: unit
+    # i takes the first k_i, the ids from i up are shifted by one to skip the unit itself
+    k_max = int(k.max()) if n else 0
+    if n < 2 or k_max == 0:
+        return gi, moran, np.full(n, np.nan)
+    draws = rng.permuted(np.tile(np.arange(n - 1), (permutations, 1)), axis=1)[:, :k_max]
+    units = np.arange(n)[:, None, None]
+    ids = draws[None, :, :] + (draws[None, :, :] >= units)
+    taken = np.arange(k_max)[None, None, :] < k[:, None, None]
+    simulated = np.where(taken, z[ids], 0.0).sum(axis=2)
+    p = pseudo_p_values(lag_sum, simulated)
+    p[k == 0] = np.nan
+    return gi, moran, p
+
+
+def cluster_classes(z, lag_sum, p, alpha=ALPHA):
+    """Codes of CLUSTERS from the Moran quadrant of the significant units."""
+    high, high_lag = z > 0, lag_sum > 0
+    quadrant = np.select([high & high_lag, ~high & ~high_lag, high & ~high_lag], [1, 2, 3], default=4)
+    return np.where(p <= alpha, quadrant, 0)
+
+
+def compute_hotspots(cube, weights, months, permutations=PERMUTATIONS, seed=SEED):
+    """Anomalies, Gi* (z-scores), local Moran's I, pseudo p-values and cluster codes of every
+    unit and year, as (pcode, year) arrays (NaN / -1 where the unit has no value)."""
+    anomalies, years = period_anomalies(cube, months)
+    gi, moran, p = (np.full(anomalies.shape, np.nan) for _ in range(3))
+    clusters = np.full(anomalies.shape, -1, dtype=np.int8)
+    has_neighbours = np.diff(weights.indptr) > 0
+    rng = np.random.default_rng(seed)
+    for t in range(len(years)):
+        valid = np.isfinite(anomalies[:, t]) & has_neighbours
+        if valid.sum() < 3:
+            continue
+        x = anomalies[valid, t]
+        z = (x - x.mean()) / (x.std() or 1.0)
+        sub = weights[valid][:, valid]
+        gi[valid, t], moran[valid, t], p[valid, t] = local_statistics(sub, z, permutations, rng)
+        clusters[valid, t] = np.where(np.isfinite(p[valid, t]), cluster_classes(z, sub @ z, p[valid, t]), -1)
+    return {"pcodes": cube.pcodes, "years": years, "anomaly": anomalies.astype(np.float32),
+            "gi": gi.astype(np.float32), "moran": moran.astype(np.float32), "p": p.astype(np.float32),
+            "cluster": clusters}
+
+
+def hotspot_path(country, period, version):
+    return os.path.join(HOTSPOT_PATH, f"hotspots_{country}_{period}_v{version}.npz")
+
+
+@lru_cache(maxsize=4)
+def load_hotspots(country="BFA", period="year", version=0):
+    """Hotspot statistics of a country and period at a data version, computed once and saved."""
+    path = hotspot_path(country, period, version)
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as npz:
+            return {k: npz[k] for k in npz.files}
+    cube = choropleth.load_cube(country, version)
+    result = compute_hotspots(cube, load_weights(cube.pcodes), PERIODS[period])
+    os.makedirs(HOTSPOT_PATH, exist_ok=True)
+    np.savez(path, **result)
+    return result
+
+
+def cluster_colors(hotspots, year, adm_level=2):
+    """RGBA fill of every boundary feature (in the order of their idx) for the clusters of a year."""
+    codes = choropleth.feature_values(hotspots["pcodes"], hotspots["cluster"][:, list(hotspots["years"]).index(year)], adm_level)
+    return [CLUSTERS[int(c)][1] if np.isfinite(c) and c >= 0 else choropleth.NO_DATA_COLOR for c in codes]
+
+
+if __name__ == "__main__":
+    # Usage: python hotspots.py [year|season]
+    period = sys.argv[1] if len(sys.argv) > 1 else "year"
+    started = time.perf_counter()
+    hotspots = load_hotspots("BFA", period, ingest.data_version("BFA"))
+    print(f"{len(hotspots['pcodes'])} units x {len(hotspots['years'])} years in {time.perf_counter() - started:.1f} s "
+          f"-> {hotspot_path('BFA', period, ingest.data_version('BFA'))}")
+    for t, year in enumerate(hotspots["years"]):
+        counts = np.bincount(hotspots["cluster"][:, t][hotspots["cluster"][:, t] >= 0], minlength=len(CLUSTERS))
+        print(year, "  ".join(f"{CLUSTERS[c][0].split(' (')[0]}: {n}" for c, n in enumerate(counts) if c and n))
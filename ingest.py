@@ -0,0 +1,262 @@
+import argparse
+import contextlib
+import json
+import os
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import partitions
+import query_backend
+import rainfall_cube
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locks
+    fcntl = None
+
+
+# Watermarks of the ingested data (last date, version, version of each touched month)
+WATERMARK_PATH = os.path.join(partitions.STORE_PATH, "_watermarks.json")
+
+# Precomputed monthly rainfall per Pcode, kept up to date by the ingest
+MONTHLY_DATASET = "rainfall-monthly"
+
+
+def load_watermarks():
+    if not os.path.exists(WATERMARK_PATH):
+        return {}
+    with open(WATERMARK_PATH) as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks):
+    tmp_path = WATERMARK_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, WATERMARK_PATH)
+
+
+@contextlib.contextmanager
+def watermark_lock():
+    """Exclusive lock of the writers of the store (ingest, build_monthly), taken around the whole
+    read-modify-write of the watermark: two ingests never hand out the same version."""
+    os.makedirs(partitions.STORE_PATH, exist_ok=True)
+    with open(WATERMARK_PATH + ".lock", "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def get_watermark(country="BFA"):
+    return load_watermarks().get("rainfall", {}).get(country)
+
+
+def store_generation(dataset="rainfall", source=rainfall_cube.RAW_CSV):
+    """Id of the current build of the store, renewed at every rebuild of the watermark (and so
+    after partitions.py --rebuild, which wipes it): versions restart there, keys made with this
+    id do not collide with the results computed before.
+
+    Only build_monthly creates the id. Before that the data comes from the dataset folder or,
+    with no store, straight from the source CSV: their mtime and size stand in for it, so
+    replacing the CSV is seen too."""
+    generation = load_watermarks().get("generation")
+    if generation:
+        return generation
+    path = partitions.dataset_path(dataset) if partitions.has_dataset(dataset) else source
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return "none"
+    return f"{os.path.basename(os.path.normpath(path))}-{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def data_version(country="BFA"):
+    watermark = get_watermark(country)
+    return watermark["version"] if watermark else 0
+
+
+def window_version(country, start, end):
+    """Latest ingest version that touched a month inside [start, end].
+
+    Cached results keyed on this value stay valid when new dekads fall outside the window."""
+    watermark = get_watermark(country)
+    if not watermark:
+        return 0
+    lo = pd.Timestamp(start).strftime("%Y-%m")
+    hi = pd.Timestamp(end).strftime("%Y-%m")
+    return max((v for m, v in watermark["months"].items() if lo <= m <= hi), default=0)
+
+
+def _read_new_rows(csv_path):
+    df = pd.read_csv(csv_path, low_memory=False)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df = df.dropna(subset=["date"])  # Drops the HXL tag row, if present
+    df["rfh"] = pd.to_numeric(df["rfh"], errors="coerce")
+    return df
+
+
+def _monthly(df):
+    out = df.groupby(["Pcode", df["date"].dt.year.rename("year"), df["date"].dt.month.rename("month")])["rfh"].agg(
+        rfh="sum", n="count").reset_index()
+    return out
+
+
+def build_monthly(country="BFA"):
+    """Full rebuild of the monthly aggregate and of the watermark, from the partitioned store."""
+    with watermark_lock():
+        return _build_monthly(country)
+
+
+def _build_monthly(country):
+    df = partitions.read_dataset("rainfall", country=country, columns=["Pcode", "date", "rfh"])
+    monthly = _monthly(df)
+    monthly["country"] = country
+    monthly["adm_level"] = 2
+    partitions.write_partitions(monthly, MONTHLY_DATASET)
+
+    # Versions only go up: the artefacts keyed on the previous versions are never served again
+    watermarks = load_watermarks()
+    previous = watermarks.get("rainfall", {}).get(country)
+    version = previous["version"] + 1 if previous else 1
+    watermarks.setdefault("rainfall", {})[country] = {
+        "max_date": df["date"].max().strftime("%Y-%m-%d"),
+        "rows": int(len(df)),
+        "version": version,
+        "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "months": {m: version for m in sorted(df["date"].dt.strftime("%Y-%m").unique())},
+    }
+    watermarks["generation"] = uuid.uuid4().hex
+    save_watermarks(watermarks)
+    return monthly
+
+
+def read_monthly(country="BFA", build=True):
+    """Monthly aggregate (Pcode, year, month, rfh, n), built from the store on first use. With
+    build=False nothing is written: without the aggregate it is computed from the rainfall rows
+    (the store, else the raw CSV) and not saved."""
+    if not partitions.has_dataset(MONTHLY_DATASET):
+        if not build:
+            return _monthly(query_backend.read_rainfall(country))
+        if not partitions.has_dataset("rainfall"):
+            partitions.build_rainfall(country=country)
+        build_monthly(country)
+    return partitions.read_dataset(MONTHLY_DATASET, country=country, columns=["Pcode", "year", "month", "rfh", "n"])
+
+
+def _update_monthly(new_rows, country):
+    # Sums and counts are additive: only the touched year partitions are read and rewritten
+    years = sorted(new_rows["date"].dt.year.unique())
+    delta = _monthly(new_rows)
+    if partitions.has_dataset(MONTHLY_DATASET):
+        current = partitions.read_dataset(MONTHLY_DATASET, country=country, years=(years[0], years[-1]),
+                                          columns=["Pcode", "year", "month", "rfh", "n"])
+        current = current[current["year"].isin(years)]
+        delta = pd.concat([current, delta]).groupby(["Pcode", "year", "month"], as_index=False)[["rfh", "n"]].sum()
+    delta["country"] = country
+    delta["adm_level"] = 2
+    partitions.write_partitions(delta, MONTHLY_DATASET)
+
+
+def ingest(csv_path, country="BFA", on_overlap="skip"):
+    """Append the (Pcode, date) rows of csv_path that are not in the store yet.
+
+    on_overlap="skip" drops rows already present, on_overlap="reject" refuses the whole file."""
+    new_rows = _read_new_rows(csv_path)
+    new_rows = new_rows.drop_duplicates(subset=["Pcode", "date"], keep="last")
+    if new_rows.empty:
+        return 0
+    with watermark_lock():
+        return _ingest(csv_path, new_rows, country, on_overlap)
+
+
+def _ingest(csv_path, new_rows, country, on_overlap):
+    if not partitions.has_dataset("rainfall"):
+        # Only the raw CSV so far: the store starts from its full history, the new rows go on top
+        partitions.build_rainfall(country=country)
+        _build_monthly(country)
+    elif get_watermark(country) is None:
+        _build_monthly(country)
+
+    # Only the keys in the date range of the new file are read
+    if partitions.has_dataset("rainfall"):
+        existing = partitions.read_dataset(
+            "rainfall", country=country,
+            years=(new_rows["date"].dt.year.min(), new_rows["date"].dt.year.max()),
+            date_range=(new_rows["date"].min(), new_rows["date"].max()),
+            columns=["Pcode", "date"],
+        )
+        existing["date"] = existing["date"].astype(new_rows["date"].dtype)
+        overlap = new_rows.merge(existing, on=["Pcode", "date"], how="left", indicator=True)["_merge"] == "both"
+        overlap = overlap.to_numpy()
+        if overlap.any():
+            if on_overlap == "reject":
+                raise ValueError(f"{int(overlap.sum())} rows of {csv_path} are already in the store")
+            new_rows = new_rows[~overlap]
+    if new_rows.empty:
+        return 0
+
+    watermarks = load_watermarks()
+    watermark = watermarks.setdefault("rainfall", {}).setdefault(
+        country, {"max_date": None, "rows": 0, "version": 0, "months": {}})
+    version = watermark["version"] + 1
+
+    # Append as new files inside the year partitions, the existing files are not rewritten
+    new_rows = new_rows.copy()
+    new_rows["country"] = country
+    new_rows["adm_level"] = 2
+    new_rows["year"] = new_rows["date"].dt.year
+    _append(new_rows, "rainfall", version)
+    _update_monthly(new_rows, country)
+
+    max_date = new_rows["date"].max().strftime("%Y-%m-%d")
+    watermark["max_date"] = max(filter(None, [watermark["max_date"], max_date]))
+    watermark["rows"] += int(len(new_rows))
+    watermark["version"] = version
+    watermark["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for month in new_rows["date"].dt.strftime("%Y-%m").unique():
+        watermark["months"][month] = version
+    save_watermarks(watermarks)
+    return len(new_rows)
+
+
+def _append(df, name, version):
+    df["adm_level"] = df["adm_level"].astype("int8")
+    df["year"] = df["year"].astype("int16")
+    # Keep the schema of the existing files, so the new fragments can be read together with them
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if partitions.has_dataset(name):
+        schema = ds.dataset(partitions.dataset_path(name), format="parquet",
+                            partitioning=partitions.PARTITIONING).schema
+        table = table.select([f for f in schema.names if f in table.column_names]).cast(
+            pa.schema([schema.field(f) for f in schema.names if f in table.column_names]))
+    ds.write_dataset(
+        table,
+        partitions.dataset_path(name),
+        format="parquet",
+        partitioning=partitions.PARTITIONING,
+        existing_data_behavior="overwrite_or_ignore",
+        basename_template=f"ingest-v{version}-{{i}}.parquet",
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append new rainfall dekads to the partitioned store.")
+    parser.add_argument("csv_path", nargs="?", help="CSV with the new rows (same columns as bfa-rainfall-adm2-full.csv)")
+    parser.add_argument("--country", default="BFA")
+    parser.add_argument("--reject", action="store_true", help="refuse the file if any (Pcode, date) row is already present")
+    parser.add_argument("--rebuild-aggregates", action="store_true", help="rebuild monthly aggregates and watermark from scratch")
+    args = parser.parse_args()
+
+    if args.rebuild_aggregates:
+        build_monthly(args.country)
+    if args.csv_path:
+        added = ingest(args.csv_path, country=args.country, on_overlap="reject" if args.reject else "skip")
+        print(f"{added} new rows, watermark: {get_watermark(args.country)['max_date']}")
@@ -0,0 +1,221 @@
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import psutil
+
+
+# Scratch copy of the app with synthetic rainfall: the real rasters and CSVs of the repo are
+# linked, nothing is downloaded, so the test runs offline
+WORK_PATH = "loadtest_work/"
+SYNTHETIC_CSV = "bfa-rainfall-adm2-full.csv"
+SYNTHETIC_UNITS = 45
+SYNTHETIC_YEARS = (1981, 2024)
+
+# Files and folders of the repo used by the app
+LINKED = ["Climate_Precipitation_Data", "MODIS_Gross_Primary_Production_GPP", "Gridded_Population_Density_Data",
+          "Modis_Land_Cover_Data", "7.jpeg", "climate-change_bfa.csv", "environment_bfa.csv",
+          "sahel-biomass-by-ach-gis4tech.csv", "bfa_adm1.geojson", "bfa_adm2.geojson"]
+
+# Simulated users sweep, visits of the scenario per user and per-run timeout (s)
+SESSIONS = [1, 2, 4, 8]
+ITERATIONS = 2
+RUN_TIMEOUT = 300
+
+# Interval of the CPU / memory sampler (s)
+SAMPLE_INTERVAL = 0.1
+
+# One visit of a simulated user: (action, argument). Every step is one script run, timed.
+# AppTest does not run fragment timers, so every "tick" step stands for one 0.5 s playback step
+# of a playing player.
+SCENARIO = [
+    ("page", "Rainfall Analysis"),
+    ("period", ("2000-01-01", "2010-12-31")),
+    ("page", "Seasonal Analysis"),
+    ("checkbox", "Select specific years"),
+    ("page", "Drought (SPI)"),
+    ("page", "Geographical Distribution"),
+    ("button", "play_button_1"),
+    ("tick", None),
+    ("tick", None),
+    ("tick", None),
+    ("slider", ("frame_slider_2", 3)),
+    ("button", "play_button_1"),
+    ("next_page", None),
+    ("page", "Land Use"),
+    ("period", ("2010-01-01", "2020-12-31")),
+]
+
+
+def synthetic_rainfall(path, n_units=SYNTHETIC_UNITS, years=SYNTHETIC_YEARS, seed=0):
+    """Dekadal rainfall of n_units ADM2 units in the layout of the HDX CSV (HXL tag row included):
+    gamma-distributed totals shaped by a May-October rainy season."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(f"{years[0]}-01-01", f"{years[1]}-12-21", freq="D")
+    dates = dates[dates.day.isin([1, 11, 21])]
+    pcodes = [f"BF{i:04d}" for i in range(n_units)]
+    date = np.repeat(dates, n_units)
+    season = np.sin((date.month.to_numpy() - 4) / 12 * 2 * np.pi).clip(0)
+    df = pd.DataFrame({
+        "date": date.strftime("%Y-%m-%d"),
+        "adm_level": 2,
+        "adm_id": np.tile(np.arange(n_units), len(dates)),
+        "Pcode": np.tile(pcodes, len(dates)),
+        "n_pixels": 100,
+        "rfh": (rng.gamma(2.0, 20.0, len(date)) * season).round(2),
+        "rfh_avg": 30.0,
+    })
+    hxl = pd.DataFrame([{"date": "#date", "adm_level": "#adm_level", "adm_id": "#adm2+id", "Pcode": "#adm2+code",
+                         "n_pixels": "#indicator", "rfh": "#indicator+rfh", "rfh_avg": "#indicator+rfh_avg"}])
+    pd.concat([hxl, df.astype(str)]).to_csv(path, index=False)
+
+
+def prepare_workdir(work_path=WORK_PATH):
+    """Copies the app modules into work_path, links the repo data, writes the synthetic rainfall
+    and builds the partitioned store there. Returns the absolute path of app.py in it."""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    work_path = os.path.abspath(work_path)
+    os.makedirs(work_path, exist_ok=True)
+    for path in glob.glob(os.path.join(repo, "*.py")):
+        shutil.copy(path, work_path)
+    for name in LINKED:
+        target = os.path.join(work_path, name)
+        if os.path.exists(os.path.join(repo, name)) and not os.path.lexists(target):
+            os.symlink(os.path.join(repo, name), target)
+    if not os.path.exists(os.path.join(work_path, SYNTHETIC_CSV)):
+        synthetic_rainfall(os.path.join(work_path, SYNTHETIC_CSV))
+        subprocess.run([sys.executable, "partitions.py"], cwd=work_path, check=True, stdout=subprocess.DEVNULL)
+    return os.path.join(work_path, "app.py")
+
+
+# --- SIMULATED SESSIONS ---
+
+def _step(at, action, arg):
+    if action == "page":
+        at.radio(key="selected_page").set_value(arg)
+    elif action == "period":
+        at.sidebar.slider[0].set_value(tuple(pd.Timestamp(d).date() for d in arg))
+    elif action == "checkbox":
+        box = next(c for c in at.checkbox if c.label == arg)
+        box.set_value(not box.value)
+    elif action == "button":
+        at.button(key=arg).click()
+    elif action == "slider":
+        key, value = arg
+        at.slider(key=key).set_value(value)
+    elif action == "next_page":
+        next(b for b in at.button if b.label.startswith("Next page")).click()
+    return at.run()
+
+
+def run_session(app_path, iterations, results, lock):
+    """One simulated user: a fresh session, then the scenario `iterations` times; every script
+    run is recorded as (action, seconds, ok)."""
+    from streamlit.testing.v1 import AppTest
+
+    records = []
+    at = AppTest.from_file(app_path, default_timeout=RUN_TIMEOUT)
+    started = time.perf_counter()
+    at.run()
+    records.append(("open", time.perf_counter() - started, not at.exception))
+    for _ in range(iterations):
+        for action, arg in SCENARIO:
+            started = time.perf_counter()
+            try:
+                at = _step(at, action, arg)
+                ok = not at.exception
+            except Exception:
+                ok = False
+            records.append((action, time.perf_counter() - started, ok))
+    with lock:
+        results.extend(records)
+
+
+class ResourceSampler(threading.Thread):
+    """Samples the CPU time and resident memory of this process (the replica) in the background."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.process = psutil.Process()
+        self.interval = interval
+        self.rss = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.rss.append(self.process.memory_info().rss)
+            self.stopped.wait(self.interval)
+
+    def __enter__(self):
+        self.cpu_start = self.process.cpu_times()
+        self.wall_start = time.perf_counter()
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.join()
+        cpu = self.process.cpu_times()
+        self.cpu_seconds = (cpu.user - self.cpu_start.user) + (cpu.system - self.cpu_start.system)
+        self.wall_seconds = time.perf_counter() - self.wall_start
+
+
+def run_load(app_path, sessions, iterations=ITERATIONS):
+    """Runs `sessions` simulated users at the same time in this process, which plays the replica:
+    the sessions share its caches, threads and interpreter as on a Streamlit server."""
+    results, lock = [], threading.Lock()
+    threads = [threading.Thread(target=run_session, args=(app_path, iterations, results, lock)) for _ in range(sessions)]
+    with ResourceSampler() as sampler:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    seconds = np.array([s for _, s, _ in results])
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99]) * 1000
+    return {
+        "sessions": sessions,
+        "runs": len(results),
+        "errors": sum(not ok for _, _, ok in results),
+        "runs_per_second": len(results) / sampler.wall_seconds,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "cpu_percent": 100 * sampler.cpu_seconds / sampler.wall_seconds,
+        "rss_peak_mb": max(sampler.rss) / 1024 ** 2,
+        "by_action_p95_ms": {action: float(np.percentile([s for a, s, _ in results if a == action], 95) * 1000)
+                             for action in dict.fromkeys(a for a, _, _ in results)},
+    }
+
+
+def load_test(sessions=SESSIONS, iterations=ITERATIONS, work_path=WORK_PATH):
+    """Sweeps the number of simultaneous users after one warm-up user (caches filled)."""
+    app_path = prepare_workdir(work_path)
+    os.chdir(os.path.dirname(app_path))  # the app reads its data from relative paths
+    run_load(app_path, 1, 1)
+    return [run_load(app_path, n, iterations) for n in sessions]
+
+
+if __name__ == "__main__":
+    # Usage: python loadtest.py [--sessions 1 2 4 8] [--iterations N] [--json results.json]
+    parser = argparse.ArgumentParser(description="Simulated concurrent sessions against one replica of app.py.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=SESSIONS)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--work-path", default=WORK_PATH)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+    rows = load_test(args.sessions, args.iterations, args.work_path)
+    print(f"{psutil.cpu_count()} CPUs")
+    print(pd.DataFrame(rows).drop(columns="by_action_p95_ms").round(1).to_string(index=False))
+    print("p95 per action (ms), last run:", {a: round(v) for a, v in rows[-1]["by_action_p95_ms"].items()})
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(rows, f, indent=2)
@@ -49,3 +49,22 @@ plt.title("Previsione delle precipitazioni con Facebook Prophet")
 plt.xlabel("Data")
 plt.ylabel("Precipitazione (mm)")
 plt.show()
+
+# Previsione dello SPI-3 della stessa unità (indice di siccità mensile calcolato da spi.py)
+import spi
+
+spi_unit = spi.compute_spi(scale=3)
+if 'Pcode' in df.columns and pcode_value in spi_unit.columns:
+    df_spi = spi_unit[pcode_value].dropna().reset_index()
+    df_spi.columns = ['ds', 'y']
+
+    model_spi = Prophet(daily_seasonality=False, weekly_seasonality=False, yearly_seasonality=True)
+    model_spi.fit(df_spi)
+    forecast_spi = model_spi.predict(model_spi.make_future_dataframe(periods=12, freq='MS'))
+
+    fig = model_spi.plot(forecast_spi)
+    plt.axhline(-1, color='firebrick', linestyle='--')  # soglia di siccità moderata
+    plt.title(f"Previsione dello SPI-3 per {pcode_value}")
+    plt.xlabel("Data")
+    plt.ylabel("SPI-3")
+    plt.show()
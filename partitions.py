@@ -0,0 +1,157 @@
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+
+# Root folder of the partitioned data store (country / adm_level / year)
+STORE_PATH = "data_store/"
+
+# Sahel country names -> ISO3 code used as partition key
+COUNTRY_CODES = {
+    "Burkina Faso": "BFA",
+    "Mauritania": "MRT",
+    "Senegal": "SEN",
+    "Mali": "MLI",
+    "Niger": "NER",
+    "Chad": "TCD",
+}
+COUNTRY_NAMES = {code: name for name, code in COUNTRY_CODES.items()}
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("country", pa.string()), ("adm_level", pa.int8()), ("year", pa.int16())]),
+    flavor="hive",
+)
+
+
+def dataset_path(name):
+    return os.path.join(STORE_PATH, name)
+
+
+def has_dataset(name):
+    return os.path.isdir(dataset_path(name))
+
+
+def write_partitions(df, name):
+    """Write the DataFrame to the data store, replacing only the partitions it touches."""
+    df = df.copy()
+    df["country"] = df["country"].astype(str)
+    df["adm_level"] = df["adm_level"].astype("int8")
+    df["year"] = df["year"].astype("int16")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table,
+        dataset_path(name),
+        format="parquet",
+        partitioning=PARTITIONING,
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+
+
+def _filter_expression(country=None, adm_level=None, years=None, date_range=None):
+    expr = None
+
+    def _and(a, b):
+        return b if a is None else a & b
+
+    if country is not None:
+        countries = [country] if isinstance(country, str) else list(country)
+        expr = _and(expr, ds.field("country").isin(countries))
+    if adm_level is not None:
+        expr = _and(expr, ds.field("adm_level") == adm_level)
+    if years is not None:
+        start_year, end_year = years
+        expr = _and(expr, (ds.field("year") >= start_year) & (ds.field("year") <= end_year))
+    if date_range is not None:
+        start, end = (pd.Timestamp(d) for d in date_range)
+        expr = _and(expr, (ds.field("date") >= start) & (ds.field("date") <= end))
+    return expr
+
+
+def read_dataset(name, country=None, adm_level=None, years=None, date_range=None, columns=None):
+    """Read only the requested partitions: country / adm_level / year filters
+    are resolved on the folder names, without opening the other files."""
+    dataset = ds.dataset(dataset_path(name), format="parquet", partitioning=PARTITIONING)
+    expr = _filter_expression(country, adm_level, years, date_range)
+    table = dataset.to_table(columns=columns, filter=expr)
+    return table.to_pandas()
+
+
+def list_partitions(name, key):
+    """Available values of a partition key (e.g. the countries), read from the folder names."""
+    values = set()
+    root = dataset_path(name)
+    if not os.path.isdir(root):
+        return []
+    for dirpath, dirnames, _ in os.walk(root):
+        for d in dirnames:
+            if d.startswith(f"{key}="):
+                values.add(d.split("=", 1)[1])
+    return sorted(values)
+
+
+def date_bounds(name, country=None):
+    """First and last date of a dataset, reading only the 'date' column of the first and last year."""
+    years = [int(y) for y in list_partitions(name, "year")]
+    dates = read_dataset(name, country=country, years=(min(years), min(years)), columns=["date"])["date"]
+    last = read_dataset(name, country=country, years=(max(years), max(years)), columns=["date"])["date"]
+    return dates.min(), last.max()
+
+
+# --- CONVERSION OF THE CSV SOURCES ---
+def build_rainfall(csv_path="bfa-rainfall-adm2-full.csv", country="BFA"):
+    df = pd.read_csv(csv_path, low_memory=False)
+    df = df.iloc[1:]  # HXL tag row
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["rfh"] = pd.to_numeric(df["rfh"], errors="coerce")
+    df = df.dropna(subset=["date"])
+    df["country"] = country
+    df["adm_level"] = 2
+    df["year"] = df["date"].dt.year
+    write_partitions(df, "rainfall")
+    return len(df)
+
+
+def build_indicators(csv_path, name):
+    # World Bank CSVs (climate-change_bfa.csv, environment_bfa.csv): national data, adm_level 0
+    df = pd.read_csv(csv_path)
+    df = df[~df["Country Name"].astype(str).str.startswith("#")]
+    df["Year"] = pd.to_numeric(df["Year"], errors="coerce")
+    df = df.dropna(subset=["Year"])
+    df["Year"] = df["Year"].astype(int)
+    df["country"] = df["Country ISO3"]
+    df["adm_level"] = 0
+    df["year"] = df["Year"]
+    write_partitions(df, name)
+    return len(df)
+
+
+def build_biomass(csv_path="sahel-biomass-by-ach-gis4tech.csv"):
+    # Commune-level biomass anomalies (adm_level 3), with a comma as decimal separator
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["z_gpp"] = pd.to_numeric(df["z_gpp"].astype(str).str.replace(",", "."), errors="coerce")
+    df["country"] = df["Country"].map(COUNTRY_CODES)
+    df["adm_level"] = 3
+    df["year"] = df["date"].dt.year
+    write_partitions(df, "biomass")
+    return len(df)
+
+
+def build_all(rebuild=False):
+    if rebuild and os.path.isdir(STORE_PATH):
+        shutil.rmtree(STORE_PATH)
+    if os.path.exists("bfa-rainfall-adm2-full.csv"):
+        print("rainfall:", build_rainfall(), "rows")
+    print("climate-change:", build_indicators("climate-change_bfa.csv", "climate-change"), "rows")
+    print("environment:", build_indicators("environment_bfa.csv", "environment"), "rows")
+    print("biomass:", build_biomass(), "rows")
+
+
+if __name__ == "__main__":
+    # Usage: python partitions.py [--rebuild]
+    build_all(rebuild="--rebuild" in sys.argv)
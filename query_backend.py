@@ -0,0 +1,267 @@
+import os
+
+import pandas as pd
+
+import partitions
+import rainfall_cube
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:  # optional dependency
+    pl = None
+
+
+# Backend selection: "cube" keeps a dense float32 (unit x date) array in memory, "pandas" the
+# whole long table, "duckdb" and "polars" stream over the partitioned parquet store and only
+# materialize the aggregates.
+BACKENDS = ["cube", "pandas", "duckdb", "polars"]
+DEFAULT_BACKEND = os.environ.get("RAINFALL_BACKEND", "cube")
+
+# Rows shown in the raw data preview by the out-of-core backends
+PREVIEW_ROWS = 10000
+
+# Memory cap and spill folder for DuckDB
+DUCKDB_MEMORY_LIMIT = os.environ.get("DUCKDB_MEMORY_LIMIT", "1GB")
+DUCKDB_TEMP_DIR = os.environ.get("DUCKDB_TEMP_DIR", ".duckdb_tmp/")
+
+
+def available_backends():
+    names = ["cube", "pandas"]
+    if duckdb is not None:
+        names.append("duckdb")
+    if pl is not None:
+        names.append("polars")
+    return names
+
+
+def _normalize(df):
+    # Same dtypes whatever the engine, so that results compare equal to the pandas path
+    df = df.reset_index(drop=True)
+    if "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"]).astype("datetime64[ns]")
+    for col in ("year", "month"):
+        if col in df.columns:
+            df[col] = df[col].astype("int64")
+    for col in ("rfh", "min_rain", "max_rain"):
+        if col in df.columns:
+            df[col] = df[col].astype("float64")
+    return df
+
+
+class PandasBackend:
+    """Aggregations on an in-memory DataFrame (the original behaviour of the app)."""
+
+    name = "pandas"
+
+    def __init__(self, df):
+        self.df = df
+
+    def _window(self, start, end):
+        return self.df[(self.df["date"] >= pd.Timestamp(start)) & (self.df["date"] <= pd.Timestamp(end))]
+
+    def date_bounds(self):
+        return self.df["date"].min(), self.df["date"].max()
+
+    def preview(self):
+        return self.df
+
+    def daily_sum(self, start, end):
+        out = self._window(start, end).groupby("date")["rfh"].sum().reset_index()
+        return _normalize(out.sort_values(by="date"))
+
+    def monthly_sum(self, start, end):
+        df_filtered = self._window(start, end)
+        out = df_filtered.groupby([df_filtered["date"].dt.year.rename("year"),
+                                   df_filtered["date"].dt.month.rename("month")])["rfh"].sum().reset_index()
+        return _normalize(out)
+
+    def annual_totals(self, start=None, end=None):
+        df_filtered = self.df if start is None else self._window(start, end)
+        out = df_filtered.groupby(df_filtered["date"].dt.year.rename("year"))["rfh"].sum().reset_index()
+        return _normalize(out)
+
+    def seasonal_extremes(self, start, end, months):
+        df_filtered = self._window(start, end)
+        df_season = df_filtered[df_filtered["date"].dt.month.isin(months)]
+        out = df_season.groupby(df_season["date"].dt.year.rename("year"))["rfh"].agg(
+            min_rain="min", max_rain="max").reset_index()
+        return _normalize(out)
+
+
+class CubeBackend:
+    """Same queries as axis reductions on the dense rainfall cube."""
+
+    name = "cube"
+
+    def __init__(self, cube):
+        self.cube = cube
+
+    def date_bounds(self):
+        return pd.Timestamp(self.cube.dates[0]), pd.Timestamp(self.cube.dates[-1])
+
+    def preview(self):
+        return self.cube.to_frame(limit=PREVIEW_ROWS)
+
+    def daily_sum(self, start, end):
+        dates, totals = self.cube.national_totals(start, end)
+        return _normalize(pd.DataFrame({"date": dates, "rfh": totals}))
+
+    def monthly_sum(self, start, end):
+        years, months, totals = self.cube.monthly_totals(start, end)
+        return _normalize(pd.DataFrame({"year": years, "month": months, "rfh": totals}))
+
+    def annual_totals(self, start=None, end=None):
+        years, totals = self.cube.annual_totals(start, end)
+        return _normalize(pd.DataFrame({"year": years, "rfh": totals}))
+
+    def seasonal_extremes(self, start, end, months):
+        years, mins, maxs = self.cube.seasonal_extremes(start, end, months)
+        return _normalize(pd.DataFrame({"year": years, "min_rain": mins, "max_rain": maxs}))
+
+
+class DuckDBBackend:
+    """Same queries as SQL over the parquet store; DuckDB streams the files and spills to disk."""
+
+    name = "duckdb"
+
+    def __init__(self, country, dataset="rainfall"):
+        self.country = country
+        self.con = duckdb.connect()
+        self.con.execute(f"SET memory_limit = '{DUCKDB_MEMORY_LIMIT}'")
+        self.con.execute(f"SET temp_directory = '{DUCKDB_TEMP_DIR}'")
+        glob = os.path.join(partitions.dataset_path(dataset), "**", "*.parquet")
+        self.source = (f"read_parquet('{glob}', hive_partitioning = true, "
+                       "hive_types = {'country': VARCHAR, 'adm_level': TINYINT, 'year': SMALLINT})")
+
+    def _query(self, sql, params=()):
+        # One cursor per query: the backend is shared between Streamlit sessions
+        return self.con.cursor().execute(sql, [self.country, *params]).df()
+
+    def _window_sql(self, start, end):
+        # The year condition prunes partitions before the date filter is applied
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        return ("country = ? AND year BETWEEN ? AND ? AND date BETWEEN ? AND ?",
+                (start.year, end.year, start.to_pydatetime(), end.to_pydatetime()))
+
+    def date_bounds(self):
+        out = self._query(f"SELECT MIN(date) AS lo, MAX(date) AS hi FROM {self.source} WHERE country = ?")
+        return pd.Timestamp(out["lo"].iloc[0]), pd.Timestamp(out["hi"].iloc[0])
+
+    def preview(self):
+        return self._query(f"SELECT * FROM {self.source} WHERE country = ? LIMIT {PREVIEW_ROWS}")
+
+    def daily_sum(self, start, end):
+        where, params = self._window_sql(start, end)
+        out = self._query(f"SELECT date, COALESCE(SUM(rfh), 0) AS rfh FROM {self.source} "
+                          f"WHERE {where} GROUP BY date ORDER BY date", params)
+        return _normalize(out)
+
+    def monthly_sum(self, start, end):
+        where, params = self._window_sql(start, end)
+        out = self._query(f"SELECT YEAR(date) AS year, MONTH(date) AS month, COALESCE(SUM(rfh), 0) AS rfh "
+                          f"FROM {self.source} WHERE {where} GROUP BY 1, 2 ORDER BY 1, 2", params)
+        return _normalize(out)
+
+    def annual_totals(self, start=None, end=None):
+        if start is None:
+            where, params = "country = ?", ()
+        else:
+            where, params = self._window_sql(start, end)
+        out = self._query(f"SELECT YEAR(date) AS year, COALESCE(SUM(rfh), 0) AS rfh "
+                          f"FROM {self.source} WHERE {where} GROUP BY 1 ORDER BY 1", params)
+        return _normalize(out)
+
+    def seasonal_extremes(self, start, end, months):
+        where, params = self._window_sql(start, end)
+        month_list = ", ".join(str(int(m)) for m in months)
+        out = self._query(f"SELECT YEAR(date) AS year, MIN(rfh) AS min_rain, MAX(rfh) AS max_rain "
+                          f"FROM {self.source} WHERE {where} AND MONTH(date) IN ({month_list}) "
+                          "GROUP BY 1 ORDER BY 1", params)
+        return _normalize(out)
+
+
+class PolarsBackend:
+    """Same queries as Polars lazy frames, collected with the streaming engine."""
+
+    name = "polars"
+
+    def __init__(self, country, dataset="rainfall"):
+        glob = os.path.join(partitions.dataset_path(dataset), "**", "*.parquet")
+        self.frame = pl.scan_parquet(glob, hive_partitioning=True).filter(pl.col("country") == country)
+
+    @staticmethod
+    def _collect(lazy):
+        try:
+            out = lazy.collect(engine="streaming")
+        except TypeError:  # polars < 1.0
+            out = lazy.collect(streaming=True)
+        return out.to_pandas()
+
+    def _window(self, start, end):
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        return self.frame.filter(
+            pl.col("year").is_between(start.year, end.year)
+            & pl.col("date").is_between(start.to_pydatetime(), end.to_pydatetime())
+        )
+
+    def date_bounds(self):
+        out = self._collect(self.frame.select(pl.col("date").min().alias("lo"), pl.col("date").max().alias("hi")))
+        return pd.Timestamp(out["lo"].iloc[0]), pd.Timestamp(out["hi"].iloc[0])
+
+    def preview(self):
+        return self._collect(self.frame.head(PREVIEW_ROWS))
+
+    def daily_sum(self, start, end):
+        out = self._window(start, end).group_by("date").agg(pl.col("rfh").sum()).sort("date")
+        return _normalize(self._collect(out))
+
+    def monthly_sum(self, start, end):
+        out = (self._window(start, end)
+               .group_by(pl.col("date").dt.year().alias("year"), pl.col("date").dt.month().alias("month"))
+               .agg(pl.col("rfh").sum())
+               .sort("year", "month"))
+        return _normalize(self._collect(out))
+
+    def annual_totals(self, start=None, end=None):
+        frame = self.frame if start is None else self._window(start, end)
+        out = frame.group_by(pl.col("date").dt.year().alias("year")).agg(pl.col("rfh").sum()).sort("year")
+        return _normalize(self._collect(out))
+
+    def seasonal_extremes(self, start, end, months):
+        out = (self._window(start, end)
+               .filter(pl.col("date").dt.month().is_in(list(months)))
+               .group_by(pl.col("date").dt.year().alias("year"))
+               .agg(pl.col("rfh").min().alias("min_rain"), pl.col("rfh").max().alias("max_rain"))
+               .sort("year"))
+        return _normalize(self._collect(out))
+
+
+def read_rainfall(country="BFA"):
+    """Rainfall table of a country: from the partitioned store, else from the raw CSV."""
+    if partitions.has_dataset("rainfall"):
+        return partitions.read_dataset("rainfall", country=country)
+    df = pd.read_csv(rainfall_cube.RAW_CSV, skiprows=[1], low_memory=False)  # HXL tag row
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    df["rfh"] = pd.to_numeric(df["rfh"], errors="coerce")
+    return df.dropna(subset=["date"])
+
+
+def get_backend(name, country="BFA", df=None, version=0):
+    """Returns the requested backend, falling back to pandas when the engine or the
+    partitioned store is not available."""
+    if name == "cube":
+        if df is not None:
+            return CubeBackend(rainfall_cube.DenseCube.from_frame(df))
+        return CubeBackend(rainfall_cube.load_cube(country, version))
+    if name == "duckdb" and duckdb is not None and partitions.has_dataset("rainfall"):
+        return DuckDBBackend(country)
+    if name == "polars" and pl is not None and partitions.has_dataset("rainfall"):
+        return PolarsBackend(country)
+    if df is None:
+        df = read_rainfall(country)
+    return PandasBackend(df)
@@ -0,0 +1,158 @@
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import partitions
+import raster_roi
+
+
+# Cube files, one per country and data version, so a new worker loads the arrays directly
+CUBE_PATH = os.path.join(partitions.STORE_PATH, "cube")
+
+RAW_CSV = "bfa-rainfall-adm2-full.csv"
+
+
+class DenseCube:
+    """Rainfall as a float32 array (ADM2 unit x date), NaN where there is no observation.
+
+    pcodes, names and dates are small lookup arrays for the two axes; dates are sorted, so a
+    date window is a slice of columns and every aggregation is a reduction along an axis."""
+
+    def __init__(self, values, pcodes, dates, names=None):
+        self.values = values
+        self.pcodes = np.asarray(pcodes)
+        self.dates = np.asarray(dates, dtype="datetime64[ns]")
+        self.names = np.asarray(names) if names is not None else self.pcodes
+        dates_index = pd.DatetimeIndex(self.dates)
+        self.years = dates_index.year.to_numpy()
+        self.months = dates_index.month.to_numpy()
+        self._unit = {pcode: i for i, pcode in enumerate(self.pcodes)}
+
+    @classmethod
+    def from_frame(cls, df):
+        """Builds the cube from a long table with Pcode, date and rfh columns."""
+        df = df[df["date"].notna() & df["Pcode"].notna()]
+        unit_idx, pcodes = pd.factorize(df["Pcode"], sort=True)
+        date_idx, dates = pd.factorize(pd.to_datetime(df["date"]), sort=True)
+        values = np.full((len(pcodes), len(dates)), np.nan, dtype=np.float32)
+        values[unit_idx, date_idx] = pd.to_numeric(df["rfh"], errors="coerce").to_numpy(dtype=np.float32)
+        units = raster_roi.adm_units(2)
+        names = [units.get(p, p) for p in pcodes]
+        return cls(values, np.asarray(pcodes, dtype=str), dates.to_numpy(), np.asarray(names, dtype=str))
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.dates.nbytes + self.pcodes.nbytes + self.names.nbytes
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, values=self.values, pcodes=self.pcodes, dates=self.dates.astype("int64"), names=self.names)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as npz:
+            return cls(npz["values"], npz["pcodes"], npz["dates"].astype("datetime64[ns]"), npz["names"])
+
+    # --- query API ---
+
+    def window(self, start=None, end=None):
+        """Column slice of the dates from start to end (inclusive)."""
+        i = 0 if start is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(start), "ns"), side="left")
+        j = len(self.dates) if end is None else np.searchsorted(self.dates, np.datetime64(pd.Timestamp(end), "ns"), side="right")
+        return slice(i, j)
+
+    def window_sum(self, start=None, end=None):
+        """Total rainfall per unit over the window (NaN for units with no observation)."""
+        block = self.values[:, self.window(start, end)]
+        totals = np.nansum(block, axis=1, dtype=np.float64)
+        return np.where(np.isfinite(block).any(axis=1), totals, np.nan)
+
+    def unit_series(self, pcode, start=None, end=None):
+        """Rainfall of one unit, as a Series indexed by date."""
+        cols = self.window(start, end)
+        return pd.Series(self.values[self._unit[pcode], cols], index=pd.DatetimeIndex(self.dates[cols]), name=pcode)
+
+    def national_totals(self, start=None, end=None):
+        """Sum over all the units for every date of the window: (dates, totals)."""
+        cols = self.window(start, end)
+        return self.dates[cols], np.nansum(self.values[:, cols], axis=0, dtype=np.float64)
+
+    def _group_totals(self, keys, totals):
+        # keys are sorted with the dates: contiguous groups, reduced with one reduceat
+        if len(keys) == 0:
+            return keys, totals
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        return keys[starts], np.add.reduceat(totals, starts)
+
+    def monthly_totals(self, start=None, end=None):
+        cols = self.window(start, end)
+        _, totals = self.national_totals(start, end)
+        keys, sums = self._group_totals(self.years[cols] * 100 + self.months[cols], totals)
+        return keys // 100, keys % 100, sums
+
+    def annual_totals(self, start=None, end=None):
+        cols = self.window(start, end)
+        _, totals = self.national_totals(start, end)
+        return self._group_totals(self.years[cols], totals)
+
+    def seasonal_extremes(self, start, end, months):
+        """Lowest and highest single observation per year, over the dates whose month is in months."""
+        cols = np.arange(len(self.dates))[self.window(start, end)]
+        cols = cols[np.isin(self.months[cols], list(months))]
+        if len(cols) == 0:
+            return cols, np.array([]), np.array([])
+        block = self.values[:, cols]
+        finite = np.isfinite(block)
+        # Per-date extremes over the units, then per-year extremes over the dates
+        day_min = np.where(finite, block, np.inf).min(axis=0)
+        day_max = np.where(finite, block, -np.inf).max(axis=0)
+        years = self.years[cols]
+        starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]])
+        mins, maxs = np.minimum.reduceat(day_min, starts), np.maximum.reduceat(day_max, starts)
+        mins[~np.isfinite(mins)] = np.nan
+        maxs[~np.isfinite(maxs)] = np.nan
+        return years[starts], mins, maxs
+
+    def to_frame(self, limit=None):
+        """Long table (Pcode, name, date, rfh) of the observed values, first `limit` rows."""
+        units, cols = np.nonzero(np.isfinite(self.values))
+        if limit is not None:
+            order = np.lexsort((units, cols))[:limit]
+            units, cols = units[order], cols[order]
+        return pd.DataFrame({
+            "Pcode": self.pcodes[units],
+            "name": self.names[units],
+            "date": self.dates[cols],
+            "rfh": self.values[units, cols],
+        })
+
+
+def cube_path(country, version):
+    return os.path.join(CUBE_PATH, f"rainfall_{country}_v{version}.npz")
+
+
+@lru_cache(maxsize=2)
+def load_cube(country="BFA", version=0):
+    """Cube of a country at a data version: from its .npz, else built from the partitioned
+    store (or the raw CSV) and saved."""
+    path = cube_path(country, version)
+    if os.path.exists(path):
+        return DenseCube.load(path)
+    if partitions.has_dataset("rainfall"):
+        df = partitions.read_dataset("rainfall", country=country, adm_level=2, columns=["Pcode", "date", "rfh"])
+    else:
+        df = pd.read_csv(RAW_CSV, usecols=["Pcode", "date", "rfh"], skiprows=[1])
+    cube = DenseCube.from_frame(df)
+    cube.save(path)
+    return cube
+
+
+if __name__ == "__main__":
+    # Usage: python rainfall_cube.py [country]
+    import ingest
+    country = sys.argv[1] if len(sys.argv) > 1 else "BFA"
+    cube = load_cube(country, ingest.data_version(country))
+    print(f"{len(cube.pcodes)} units x {len(cube.dates)} dates, {cube.nbytes / 1024 ** 2:.1f} MB -> {cube_path(country, ingest.data_version(country))}")
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import re
+import sys
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import rasterio
+from rasterio.crs import CRS
+from rasterio.transform import Affine, from_origin
+from rasterio.warp import Resampling, reproject
+
+import gpp_vat
+
+
+# Folder with the rasters resampled on a common grid (one subfolder per target grid)
+ALIGNED_PATH = "aligned_rasters/"
+
+# The four raster layers: folder, file name pattern (the year is the named group),
+# resampling used to bring them on the target grid and CRS to use when the file has none
+LAYERS = {
+    "precipitation": {
+        "folder": "Climate_Precipitation_Data/",
+        "pattern": r"^(?P<year>\d{4})R\.tif$",
+        "resampling": Resampling.average,
+        "crs": "EPSG:4326",
+    },
+    "gpp": {
+        "folder": "MODIS_Gross_Primary_Production_GPP/",
+        "pattern": r"^(?P<year>\d{4})_GP\.tif$",
+        "resampling": Resampling.average,
+        "crs": "+proj=sinu +lon_0=0 +x_0=0 +y_0=0 +R=6371007.181 +units=m +no_defs",
+    },
+    "landcover": {
+        "folder": "Modis_Land_Cover_Data/",
+        "pattern": r"^(?P<year>\d{4})LCT\.tif$",
+        "resampling": Resampling.nearest,  # class codes must not be averaged
+        "crs": "+proj=sinu +lon_0=0 +x_0=0 +y_0=0 +R=6371007.181 +units=m +no_defs",
+    },
+    "population": {
+        "folder": "Gridded_Population_Density_Data/",
+        # Assaba GeoTIFFs and national overviews (mrt_pd_<year>_1km.tif.ovr)
+        "pattern": r"^(?:Assaba_Pop_(?P<year>\d{4})\.tif|mrt_pd_(?P<ovr_year>\d{4})_1km\.tif\.ovr)$",
+        "resampling": Resampling.average,  # people / km², a density: average, not sum
+        "crs": "EPSG:4326",
+    },
+}
+
+# Layer whose grid is used when no target grid is given
+DEFAULT_TARGET = "population"
+
+# Version of the aligned files, in their name: bumped when the resampling changes, so the files
+# aligned before are rebuilt (2: GPP fill codes masked before averaging)
+ALIGN_VERSION = 2
+
+# Arrays kept in memory by an AlignedStack, least recently used dropped first
+MAX_ARRAYS = 8
+
+
+def read_tfw(file_path):
+    """Reads the world file (.tfw) next to a raster, returns an Affine or None."""
+    tfw_path = re.sub(r"\.tif(\.ovr)?$", ".tfw", file_path)
+    if not os.path.exists(tfw_path):
+        return None
+    with open(tfw_path) as f:
+        a, d, b, e, c, f_ = [float(line.strip()) for line in f if line.strip()]
+    # The world file refers to the centre of the upper-left pixel
+    return Affine(a, b, c - a / 2 - b / 2, d, e, f_ - d / 2 - e / 2)
+
+
+def list_layer_files(layer):
+    """{year: path} for a layer, from the file names (Assaba files win over national overviews)."""
+    spec = LAYERS[layer]
+    files = {}
+    for name in sorted(os.listdir(spec["folder"])):
+        match = re.match(spec["pattern"], name)
+        if not match:
+            continue
+        year = int(match.group("year") or match.groupdict().get("ovr_year"))
+        path = os.path.join(spec["folder"], name)
+        # The national overviews carry no geotransform: usable only with a .tfw next to them
+        if name.endswith(".ovr") and (year in files or read_tfw(path) is None):
+            continue
+        files[year] = path
+    return dict(sorted(files.items()))
+
+
+def source_georeference(layer, path, src):
+    """CRS and transform of a source raster: from the file, else from the .tfw and the layer CRS."""
+    crs = src.crs or CRS.from_user_input(LAYERS[layer]["crs"])
+    transform = src.transform
+    if transform.is_identity:
+        transform = read_tfw(path)
+    return crs, transform
+
+
+class TargetGrid:
+    """Common grid every layer is resampled on."""
+
+    def __init__(self, crs, transform, width, height):
+        self.crs = CRS.from_user_input(crs)
+        self.transform = transform
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_layer(cls, layer=DEFAULT_TARGET, year=None):
+        files = list_layer_files(layer)
+        path = files[year] if year is not None else next(p for p in files.values() if p.endswith(".tif"))
+        with rasterio.open(path) as src:
+            crs, transform = source_georeference(layer, path, src)
+            return cls(crs, transform, src.width, src.height)
+
+    @classmethod
+    def from_bounds(cls, left, bottom, right, top, resolution, crs="EPSG:4326"):
+        width = int(np.ceil((right - left) / resolution))
+        height = int(np.ceil((top - bottom) / resolution))
+        return cls(crs, from_origin(left, top, resolution, resolution), width, height)
+
+    @property
+    def shape(self):
+        return (self.height, self.width)
+
+    @property
+    def bounds(self):
+        left, top = self.transform.c, self.transform.f
+        return (left, top + self.transform.e * self.height, left + self.transform.a * self.width, top)
+
+    @property
+    def key(self):
+        # Short id of the grid, used as cache folder name
+        text = f"{self.crs.to_wkt()}|{tuple(self.transform)[:6]}|{self.width}x{self.height}"
+        return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+    def profile(self):
+        return {
+            "driver": "GTiff", "dtype": "float32", "count": 1, "nodata": np.nan,
+            "crs": self.crs, "transform": self.transform, "width": self.width, "height": self.height,
+            "tiled": True, "blockxsize": 128, "blockysize": 128, "compress": "deflate",
+        }
+
+
+def aligned_path(grid, layer, year):
+    return os.path.join(ALIGNED_PATH, grid.key, f"{layer}_{year}_v{ALIGN_VERSION}.tif")
+
+
+def align_file(layer, year, grid, resampling=None):
+    """Resamples one source file on the grid and writes it in the cache. Returns the cached path,
+    or None when the source has no usable georeferencing."""
+    path = list_layer_files(layer)[year]
+    out_path = aligned_path(grid, layer, year)
+    if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(path):
+        return out_path
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(path) as src:
+            crs, transform = source_georeference(layer, path, src)
+            if transform is None:
+                warnings.warn(f"{path} has no georeferencing (no .tfw next to it), skipped")
+                return None
+            data = src.read(1).astype(np.float32)
+            if src.nodata is not None:
+                data[data == np.float32(src.nodata)] = np.nan
+            if layer == "gpp":
+                # Every fill code (water, barren, ...), not only the declared nodata
+                data[data >= gpp_vat.GPP_FILL_MIN] = np.nan
+
+    out = np.full(grid.shape, np.nan, dtype=np.float32)
+    reproject(
+        source=data, destination=out,
+        src_transform=transform, src_crs=crs, src_nodata=np.nan,
+        dst_transform=grid.transform, dst_crs=grid.crs, dst_nodata=np.nan,
+        resampling=resampling or LAYERS[layer]["resampling"],
+    )
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with rasterio.open(out_path, "w", **grid.profile()) as dst:
+        dst.write(out, 1)
+    return out_path
+
+
+def align_all(grid=None, layers=None):
+    """Builds the cache of aligned rasters for every layer and year."""
+    grid = grid or TargetGrid.from_layer()
+    done = {}
+    for layer in layers or LAYERS:
+        for year in list_layer_files(layer):
+            out_path = align_file(layer, year, grid)
+            if out_path:
+                done.setdefault(layer, []).append(year)
+    return done
+
+
+class AlignedStack:
+    """Lazy reader of the aligned layers: stack["gpp", 2015] returns a float32 array on the
+    common grid (NaN = nodata), resampled on first access and then read from the cache. The
+    last max_arrays arrays read stay in memory."""
+
+    def __init__(self, grid=None, max_arrays=MAX_ARRAYS):
+        self.grid = grid or TargetGrid.from_layer()
+        self.max_arrays = max_arrays
+        self._arrays = OrderedDict()
+
+    def years(self, layer):
+        return list(list_layer_files(layer))
+
+    def common_years(self, *layers):
+        years = set(self.years(layers[0]))
+        for layer in layers[1:]:
+            years &= set(self.years(layer))
+        return sorted(years)
+
+    def path(self, layer, year):
+        return align_file(layer, year, self.grid)
+
+    def __getitem__(self, key):
+        if key not in self._arrays:
+            path = self.path(*key)
+            if path is None:
+                raise KeyError(key)
+            with rasterio.open(path) as src:
+                self._arrays[key] = src.read(1)
+            while len(self._arrays) > self.max_arrays:
+                self._arrays.popitem(last=False)
+        self._arrays.move_to_end(key)
+        return self._arrays[key]
+
+
+if __name__ == "__main__":
+    # Usage: python raster_align.py [target_layer]
+    target = TargetGrid.from_layer(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TARGET)
+    for layer, years in align_all(target).items():
+        print(f"{layer}: {years[0]}-{years[-1]} ({len(years)} years) -> {os.path.join(ALIGNED_PATH, target.key)}")
@@ -0,0 +1,164 @@
+import json
+import os
+import re
+import sys
+import warnings
+from functools import lru_cache
+
+import numpy as np
+import rasterio
+
+import anomaly
+import gpp_vat
+import raster_align
+
+
+# Metadata and statistics of every raster, so the pages list frames and draw legends
+# without opening the files; refreshed for the files whose mtime changed
+CATALOG_PATH = "raster_catalog.json"
+
+# Bins of the value histogram of the continuous layers
+HISTOGRAM_BINS = 32
+
+# Layers whose values are class codes: the histogram counts every class
+CLASS_LAYERS = ["landcover"]
+
+# Catalogued layers: the four source layers and the z-score rasters of the anomaly layers,
+# each with the source layer that gives its CRS when the file has none
+LAYERS = {layer: {"source": layer} for layer in raster_align.LAYERS}
+LAYERS.update({
+    f"{layer}_anomaly": {"source": layer, "folder": anomaly.layer_folder(layer), "pattern": r"^(?P<year>\d{4})_z\.tif$"}
+    for layer in anomaly.ANOMALY_LAYERS
+})
+
+
+def layer_files(layer):
+    """{year: path} of a catalogued layer, from the folder listing."""
+    spec = LAYERS[layer]
+    if "folder" not in spec:
+        return raster_align.list_layer_files(layer)
+    if not os.path.isdir(spec["folder"]):
+        return {}
+    files = {}
+    for name in sorted(os.listdir(spec["folder"])):
+        match = re.match(spec["pattern"], name)
+        if match:
+            files[int(match.group("year"))] = os.path.join(spec["folder"], name)
+    return files
+
+
+def _mtime(path):
+    # The world file is part of the georeference
+    tfw_path = re.sub(r"\.tif(\.ovr)?$", ".tfw", path)
+    return max(os.path.getmtime(path), os.path.getmtime(tfw_path) if os.path.exists(tfw_path) else 0.0)
+
+
+def _valid_values(layer, data):
+    # Pixels that are not nodata, NaN or (GPP) fill codes
+    valid = data.compressed()
+    valid = valid[np.isfinite(valid)] if valid.dtype.kind == "f" else valid
+    if layer == "gpp":
+        valid = valid[valid < gpp_vat.GPP_FILL_MIN]
+    return valid
+
+
+def _histogram(layer, values):
+    if len(values) == 0:
+        return {"edges": [], "counts": []}
+    if layer in CLASS_LAYERS:
+        classes, counts = np.unique(values, return_counts=True)
+        return {"values": classes.tolist(), "counts": counts.tolist()}
+    counts, edges = np.histogram(values, bins=HISTOGRAM_BINS)
+    return {"edges": edges.tolist(), "counts": counts.tolist()}
+
+
+def describe(layer, year, path):
+    """Catalog entry of one raster: georeference, layout and value statistics."""
+    with rasterio.open(path) as src:
+        crs, transform = raster_align.source_georeference(LAYERS[layer]["source"], path, src)
+        transform_source = "tif" if not src.transform.is_identity else "tfw" if transform is not None else None
+        data = src.read(1, masked=True)
+        entry = {
+            "layer": layer,
+            "year": year,
+            "path": path,
+            "mtime": _mtime(path),
+            "crs": crs.to_string() if crs else None,
+            "transform": list(transform)[:6] if transform is not None else None,
+            "transform_source": transform_source,
+            "shape": [src.height, src.width],
+            "dtype": src.dtypes[0],
+            "nodata": None if src.nodata is None or np.isnan(src.nodata) else float(src.nodata),
+        }
+    values = _valid_values(layer, data)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        stats = (float(values.min()), float(values.max()), float(values.mean(dtype=np.float64))) if len(values) else (None, None, None)
+    entry.update(zip(["min", "max", "mean"], stats))
+    entry["valid_pixels"] = int(len(values))
+    entry["histogram"] = _histogram(layer, values)
+    return entry
+
+
+@lru_cache(maxsize=1)
+def _read(path, mtime):
+    with open(path) as f:
+        return json.load(f)
+
+
+def refresh(layers=None):
+    """Brings the catalog up to date with one scan of the layer folders: new files and files
+    whose mtime changed are described again, removed files are dropped. Returns the catalog."""
+    layers = list(layers or LAYERS)
+    catalog = _read(CATALOG_PATH, os.path.getmtime(CATALOG_PATH)) if os.path.exists(CATALOG_PATH) else {"files": {}}
+    files = dict(catalog["files"])
+    changed = False
+    for layer in layers:
+        current = {path: year for year, path in layer_files(layer).items()}
+        for path in [p for p, entry in files.items() if entry["layer"] == layer and p not in current]:
+            del files[path]
+            changed = True
+        for path, year in current.items():
+            entry = files.get(path)
+            if entry is None or entry["mtime"] != _mtime(path) or entry["year"] != year:
+                files[path] = describe(layer, year, path)
+                changed = True
+    catalog = {"files": dict(sorted(files.items()))}
+    if changed:
+        tmp_path = CATALOG_PATH + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(catalog, f)
+        os.replace(tmp_path, CATALOG_PATH)
+    return catalog
+
+
+def load_catalog():
+    """The catalog as last saved (built on first use); the files are not looked at."""
+    if not os.path.exists(CATALOG_PATH):
+        return refresh()
+    return _read(CATALOG_PATH, os.path.getmtime(CATALOG_PATH))
+
+
+def frames(catalog, layer):
+    """Entries of a layer sorted by year: the frames of its player."""
+    return sorted((entry for entry in catalog["files"].values() if entry["layer"] == layer), key=lambda e: e["year"])
+
+
+def layer_range(catalog, layer):
+    """Lowest minimum and highest maximum over the years of a layer, (None, None) if empty."""
+    entries = [e for e in frames(catalog, layer) if e["min"] is not None]
+    if not entries:
+        return None, None
+    return min(e["min"] for e in entries), max(e["max"] for e in entries)
+
+
+if __name__ == "__main__":
+    # Usage: python raster_catalog.py [layer ...]
+    catalog = refresh(sys.argv[1:] or None)
+    for layer in sys.argv[1:] or LAYERS:
+        entries = frames(catalog, layer)
+        if entries:
+            vmin, vmax = layer_range(catalog, layer)
+            print(f"{layer}: {entries[0]['year']}-{entries[-1]['year']} ({len(entries)} files), "
+                  f"{entries[0]['dtype']} {entries[0]['shape'][1]}x{entries[0]['shape'][0]}, values {vmin:g} to {vmax:g}")
+    print(f"-> {CATALOG_PATH}")
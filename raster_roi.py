@@ -0,0 +1,114 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.features import geometry_mask
+from rasterio.warp import transform_geom
+from rasterio.errors import WindowError
+from rasterio.windows import Window, from_bounds
+from shapely.geometry import box, mapping, shape
+
+
+# Administrative boundaries (HDX COD-AB GeoJSON, EPSG:4326), used to look up ADM units by Pcode or name
+ADM_BOUNDARIES = {
+    1: "bfa_adm1.geojson",
+    2: "bfa_adm2.geojson",
+}
+
+# Named regions of interest that have no boundary file, as (left, bottom, right, top) in EPSG:4326
+REGIONS = {
+    "Assaba": (-12.8429, 15.1079, -10.5846, 18.3163),
+}
+
+
+@lru_cache(maxsize=4)
+def load_boundaries(adm_level=2):
+    """Features of the boundary file for an admin level, read once per process."""
+    path = ADM_BOUNDARIES.get(adm_level)
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["features"]
+
+
+def adm_units(adm_level=2):
+    """{pcode: name} of the units in the boundary file."""
+    units = {}
+    for feature in load_boundaries(adm_level):
+        props = feature["properties"]
+        pcode = props.get(f"ADM{adm_level}_PCODE")
+        units[pcode] = props.get(f"ADM{adm_level}_FR") or props.get(f"ADM{adm_level}_EN") or pcode
+    return units
+
+
+def adm_geometry(pcode=None, name=None):
+    """Shapely geometry of an ADM unit, by Pcode or by name (any admin level)."""
+    for adm_level in ADM_BOUNDARIES:
+        for feature in load_boundaries(adm_level):
+            props = feature["properties"]
+            if pcode is not None and props.get(f"ADM{adm_level}_PCODE") == pcode:
+                return shape(feature["geometry"])
+            if name is not None and name in (props.get(f"ADM{adm_level}_FR"), props.get(f"ADM{adm_level}_EN")):
+                return shape(feature["geometry"])
+    raise KeyError(f"ADM unit not found: {pcode or name}")
+
+
+def roi_geometry(bbox=None, pcode=None, name=None, region=None):
+    """Region of interest as a geometry in EPSG:4326."""
+    if bbox is not None:
+        return box(*bbox)
+    if region is not None:
+        return box(*REGIONS[region])
+    return adm_geometry(pcode=pcode, name=name)
+
+
+def roi_window(src, geometry):
+    """Pixel window of the raster covering the geometry (EPSG:4326), clipped to the raster;
+    None when the geometry does not overlap the raster."""
+    geom = transform_geom("EPSG:4326", src.crs, mapping(geometry))
+    left, bottom, right, top = shape(geom).bounds
+    window = from_bounds(left, bottom, right, top, transform=src.transform)
+    window = window.round_offsets(op="floor").round_lengths(op="ceil")
+    try:
+        window = window.intersection(Window(0, 0, src.width, src.height))
+    except WindowError:  # empty intersection
+        return None, geom
+    return (window if window.width > 0 and window.height > 0 else None), geom
+
+
+def read_roi(path, bbox=None, pcode=None, name=None, region=None, max_size=None,
+             resampling=Resampling.nearest, band=1):
+    """Reads only the part of a raster covering the region of interest.
+
+    The region is a bbox (EPSG:4326), an ADM Pcode or name, or a key of REGIONS; with none of
+    them the full extent is read. When max_size is given and the window is larger, the read is
+    decimated and GDAL serves it from the overviews. Returns a masked array (nodata and pixels
+    outside the region are masked) and the affine transform of the returned array, or
+    (None, None) when the region is outside the extent of the raster."""
+    with rasterio.open(path) as src:
+        if bbox is None and pcode is None and name is None and region is None:
+            geom = None
+            window = Window(0, 0, src.width, src.height)
+        else:
+            geometry = roi_geometry(bbox=bbox, pcode=pcode, name=name, region=region)
+            window, geom = roi_window(src, geometry)
+            if window is None:
+                return None, None
+
+        height, width = int(window.height), int(window.width)
+        if max_size is not None and max(height, width) > max_size:
+            scale = max_size / max(height, width)
+            height, width = max(1, int(round(height * scale))), max(1, int(round(width * scale)))
+
+        data = src.read(band, window=window, out_shape=(height, width), resampling=resampling, masked=True)
+        transform = src.window_transform(window) * rasterio.Affine.scale(
+            window.width / width, window.height / height)
+
+    # Clip to the region shape in the same pass (pixels of the window outside the polygon)
+    if geom is not None:
+        outside = geometry_mask([geom], out_shape=(height, width), transform=transform)
+        data.mask = np.ma.getmaskarray(data) | outside
+    return data, transform
@@ -0,0 +1,364 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import gpp_vat
+import ingest
+import partitions
+import rainfall_cube
+import raster_align
+import raster_roi
+import season
+
+
+# Output folder: <period>/adm<level>/<pcode>.<format>, plus the manifest of everything generated
+REPORTS_PATH = "reports/"
+MANIFEST_PATH = os.path.join(REPORTS_PATH, "manifest.json")
+FORMATS = ("png", "pdf")
+
+# Land-use indicators of the Land Use page (national figures)
+LAND_INDICATORS = {
+    "Agricultural land (% of land area)": ("Agricultural land (%)", "green", "-"),
+    "Forest area (% of land area)": ("Forest area (%)", "brown", "--"),
+    "Arable land (% of land area)": ("Arable land (%)", "blue", ":"),
+}
+
+# Raster panels: layer, title, colormap
+RASTER_PANELS = [
+    ("precipitation", "Precipitation", "Blues"),
+    ("gpp", "GPP (kg C/m²/year)", "YlGn"),
+]
+
+# Largest side (pixels) of the raster reads; a brief does not need more
+RASTER_SIZE = 400
+
+# MODIS MCD12Q1 land cover classes (IGBP legend, LC_Type1), used when the attribute table has no names
+IGBP_CLASSES = {
+    1: "Evergreen needleleaf forest", 2: "Evergreen broadleaf forest", 3: "Deciduous needleleaf forest",
+    4: "Deciduous broadleaf forest", 5: "Mixed forest", 6: "Closed shrubland", 7: "Open shrubland",
+    8: "Woody savanna", 9: "Savanna", 10: "Grassland", 11: "Permanent wetland", 12: "Cropland",
+    13: "Urban and built-up", 14: "Cropland / natural vegetation", 15: "Snow and ice", 16: "Barren",
+    17: "Water",
+}
+
+MONTH_LABELS = ["J", "F", "M", "A", "M", "J", "J", "A", "S", "O", "N", "D"]
+
+
+def parse_period(text):
+    """"2010-2020" or "2015" -> (first year, last year)."""
+    first, _, last = text.partition("-")
+    return int(first), int(last or first)
+
+
+def period_label(period):
+    return f"{period[0]}-{period[1]}" if period[0] != period[1] else str(period[0])
+
+
+def unit_members(adm_level):
+    """{pcode: (name, ADM2 pcodes it covers)} of the units of an admin level."""
+    units = raster_roi.adm_units(adm_level)
+    if adm_level == 2:
+        return {pcode: (name, [pcode]) for pcode, name in units.items()}
+    members = {pcode: [] for pcode in units}
+    for feature in raster_roi.load_boundaries(2):
+        props = feature["properties"]
+        adm2 = props.get("ADM2_PCODE")
+        # COD-AB pcodes are hierarchical: the ADM1 pcode prefixes its ADM2 pcodes
+        parent = props.get(f"ADM{adm_level}_PCODE") or next((p for p in members if adm2 and adm2.startswith(p)), None)
+        if parent in members:
+            members[parent].append(adm2)
+    return {pcode: (units[pcode], members[pcode]) for pcode in units}
+
+
+def report_path(job, fmt):
+    return os.path.join(REPORTS_PATH, period_label(job["period"]), f"adm{job['adm_level']}", f"{job['pcode']}.{fmt}")
+
+
+def report_jobs(adm_levels, periods, pcodes=None):
+    jobs = []
+    for adm_level in adm_levels:
+        for pcode, (name, members) in unit_members(adm_level).items():
+            if pcodes and pcode not in pcodes:
+                continue
+            for period in periods:
+                jobs.append({"adm_level": adm_level, "pcode": pcode, "name": name, "members": members, "period": period})
+    return jobs
+
+
+def load_indicators(country):
+    """Land-use indicators of the country, one column per indicator, indexed by year."""
+    if partitions.has_dataset("climate-change"):
+        df = partitions.read_dataset("climate-change", country=country)
+    else:
+        df = pd.read_csv("climate-change_bfa.csv")
+        df = df[df["Country Name"] == partitions.COUNTRY_NAMES.get(country, country)]
+    df = df[df["Indicator Name"].isin(LAND_INDICATORS)]
+    df = df.assign(Year=pd.to_numeric(df["Year"], errors="coerce"), Value=pd.to_numeric(df["Value"], errors="coerce"))
+    df = df.pivot_table(index="Year", columns="Indicator Name", values="Value").sort_index()
+    df.index = df.index.astype(int)
+    return df
+
+
+def prepare_shared(country="BFA"):
+    """Aggregates every report uses, computed once in the parent process: the cube and the
+    seasons are written to the store (workers load the .npz files), the small tables travel
+    to the workers with the pool initializer."""
+    version = ingest.data_version(country)
+    rainfall_cube.load_cube(country, version)
+    season.load_seasons(country, version)
+    return {
+        "country": country,
+        "version": version,
+        "indicators": load_indicators(country),
+        "rasters": {layer: raster_align.list_layer_files(layer) for layer in ("precipitation", "gpp", "landcover")},
+    }
+
+
+# --- WORKERS ---
+# Each worker process has its own matplotlib (Agg backend) and its own copy of the shared data
+
+_shared = None
+
+
+def _init_worker(shared):
+    global _shared
+    import matplotlib
+    matplotlib.use("Agg")
+    _shared = shared
+
+
+def _latest_file(layer, period):
+    files = {year: path for year, path in _shared["rasters"][layer].items() if year <= period[1]}
+    if not files:
+        return None, None
+    year = max(files)
+    return year, files[year]
+
+
+def _unit_read(path, pcode):
+    # None when the unit is outside the raster (the rasters only cover part of the country)
+    data, _ = raster_roi.read_roi(path, pcode=pcode, max_size=RASTER_SIZE)
+    return data if data is not None and data.count() else None
+
+
+def _no_data(ax, text):
+    ax.text(0.5, 0.5, text, ha="center", va="center", fontsize=9, color="gray", transform=ax.transAxes)
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+
+def render_report(job):
+    """Draws the brief of one unit and period and saves it in every format. Returns its
+    manifest entry."""
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.ticker import MaxNLocator
+
+    started = time.perf_counter()
+    entry = {k: job[k] for k in ("adm_level", "pcode", "name")}
+    entry.update(period=period_label(job["period"]), version=_shared["version"])
+    try:
+        first, last = job["period"]
+        cube = rainfall_cube.load_cube(_shared["country"], _shared["version"])
+        rows = [cube._unit[p] for p in job["members"] if p in cube._unit]
+        cols = cube.window(f"{first}-01-01", f"{last}-12-31")
+        fig = plt.figure(figsize=(11.7, 8.3))  # A4 landscape
+        title = f"{job['name']} ({job['pcode']}) – {entry['period']}"
+        fig.suptitle(title, fontsize=15, fontweight="bold")
+        grid = fig.add_gridspec(3, 3, hspace=0.55, wspace=0.3)
+
+        # Rainfall: dekadal series and annual totals (mean over the ADM2 units of the unit)
+        ax = fig.add_subplot(grid[0, :2])
+        ax_annual = fig.add_subplot(grid[0, 2])
+        if rows:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # dates with no value in any unit
+                series = np.nanmean(cube.values[rows], axis=0)
+            ax.plot(cube.dates[cols], series[cols], color="b", linewidth=1)
+            ax.set_ylabel("mm / dekad")
+            annual = pd.Series(series, index=cube.years).groupby(level=0).sum(min_count=1)
+            ax_annual.bar(annual.loc[first:last].index, annual.loc[first:last], color="steelblue")
+            ax_annual.axhline(annual.mean(), color="gray", linestyle="--", linewidth=1, label="Long-term mean")
+            ax_annual.legend(fontsize=7)
+            ax_annual.set_ylabel("mm")
+
+            # Seasonal: monthly means of the period against the long-term means
+            ax_month = fig.add_subplot(grid[1, 0])
+            monthly = pd.Series(series, index=pd.MultiIndex.from_arrays([cube.years, cube.months])).groupby(level=[0, 1]).sum(min_count=1)
+            period_mean = monthly.loc[first:last].groupby(level=1).mean().reindex(range(1, 13))
+            all_mean = monthly.groupby(level=1).mean().reindex(range(1, 13))
+            ax_month.bar(range(1, 13), period_mean, color="b", alpha=0.7, label=entry["period"])
+            ax_month.plot(range(1, 13), all_mean, color="k", marker="o", markersize=3, label="All years")
+            ax_month.set_xticks(range(1, 13))
+            ax_month.set_xticklabels(MONTH_LABELS)
+            ax_month.legend(fontsize=7)
+            ax_month.set_title("Average monthly rainfall (mm)", fontsize=10)
+        else:
+            _no_data(ax, "No rainfall data for this unit")
+            _no_data(ax_annual, "")
+            _no_data(fig.add_subplot(grid[1, 0]), "")
+        ax.set_title("Dekadal rainfall", fontsize=10)
+        ax_annual.set_title("Annual rainfall", fontsize=10)
+
+        # Rainy season: median onset and cessation over the unit's ADM2 units
+        ax = fig.add_subplot(grid[1, 1])
+        seasons = season.load_seasons(_shared["country"], _shared["version"])
+        season_rows = np.flatnonzero(np.isin(seasons["pcodes"], job["members"]))
+        in_period = (seasons["years"] >= first) & (seasons["years"] <= last)
+        if season_rows.size and in_period.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                for metric, color in [("onset", "green"), ("cessation", "darkorange")]:
+                    values = np.nanmedian(seasons[metric][season_rows][:, in_period], axis=0)
+                    ax.plot(seasons["years"][in_period], values, marker="o", markersize=3, color=color, label=metric.capitalize())
+            ticks = pd.date_range("2001-04-01", "2001-12-01", freq="2MS")
+            ax.set_yticks(ticks.dayofyear)
+            ax.set_yticklabels(ticks.strftime("%d %b"))
+            ax.legend(fontsize=7)
+        else:
+            _no_data(ax, "No season detected")
+        ax.set_title("Rainy season", fontsize=10)
+
+        # Land use: national indicators, and the land cover classes of the unit
+        ax = fig.add_subplot(grid[1, 2])
+        indicators = _shared["indicators"].loc[first - 5:last]
+        for column, (label, color, style) in LAND_INDICATORS.items():
+            if column in indicators:
+                ax.plot(indicators.index, indicators[column], color=color, linestyle=style, label=label)
+        if indicators.empty:
+            _no_data(ax, "No land-use indicators")
+        else:
+            ax.xaxis.set_major_locator(MaxNLocator(nbins=5, integer=True))
+            ax.legend(fontsize=7)
+        ax.set_title("Land use (national, % of land area)", fontsize=10)
+
+        ax = fig.add_subplot(grid[2, 0])
+        year, path = _latest_file("landcover", job["period"])
+        data = _unit_read(path, job["pcode"]) if path else None
+        if data is not None:
+            values, counts = np.unique(data.compressed(), return_counts=True)
+            vat = gpp_vat.load_vat(path)
+            names = dict(zip(vat["value"].tolist(), vat["name"])) if "name" in vat else IGBP_CLASSES
+            order = np.argsort(counts)[::-1][:8]
+            ax.barh([str(names.get(int(v), v)) for v in values[order]][::-1], (counts[order] / counts.sum() * 100)[::-1], color="olive")
+            ax.tick_params(axis="y", labelsize=7)
+            ax.set_xlabel("% of the unit")
+        else:
+            _no_data(ax, "Outside the land cover rasters")
+        ax.set_title(f"Land cover {year or ''}", fontsize=10)
+
+        # Rasters of the last year of the period, clipped to the unit
+        for i, (layer, title, cmap) in enumerate(RASTER_PANELS):
+            ax = fig.add_subplot(grid[2, 1 + i])
+            year, path = _latest_file(layer, job["period"])
+            data = _unit_read(path, job["pcode"]) if path else None
+            if data is not None and layer == "gpp":
+                # Fill values (water, not vegetated) left out, raw counts to kg C/m²/year
+                data = np.ma.masked_greater_equal(data, gpp_vat.GPP_FILL_MIN) * gpp_vat.GPP_SCALE
+            if data is not None:
+                image = ax.imshow(data.astype(np.float64), cmap=cmap)  # float32 fill values overflow the colormap
+                fig.colorbar(image, ax=ax, shrink=0.8)
+                ax.set_xticks([])
+                ax.set_yticks([])
+            else:
+                _no_data(ax, "Outside the raster coverage")
+            ax.set_title(f"{title} {year or ''}", fontsize=10)
+
+        entry["files"] = {}
+        for fmt in FORMATS:
+            path = report_path(job, fmt)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if fmt == "pdf":
+                with PdfPages(path, metadata={"Title": title}) as pdf:
+                    pdf.savefig(fig)
+            else:
+                fig.savefig(path, dpi=100)
+            entry["files"][fmt] = path
+        plt.close(fig)
+        entry["status"] = "ok"
+    except Exception as e:  # one failed brief must not stop the batch
+        plt.close("all")
+        entry.update(status="error", error=f"{type(e).__name__}: {e}")
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    return entry
+
+
+# --- BATCH ---
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {"reports": []}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    os.makedirs(REPORTS_PATH, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _entry_key(entry):
+    return entry["adm_level"], entry["pcode"], entry["period"]
+
+
+def generate(country="BFA", adm_levels=(1, 2), periods=None, pcodes=None, workers=None, force=False):
+    """Renders the briefs of every unit and period on a process pool and updates the manifest.
+    Briefs already generated from the current data version are skipped unless force is set."""
+    started = time.perf_counter()
+    shared = prepare_shared(country)
+    if periods is None:
+        last = int(rainfall_cube.load_cube(country, shared["version"]).years.max()) - 1
+        periods = [(last - 9, last)]
+    manifest = load_manifest()
+    done = {_entry_key(e): e for e in manifest["reports"]}
+
+    jobs = []
+    for job in report_jobs(adm_levels, periods, pcodes):
+        previous = done.get((job["adm_level"], job["pcode"], period_label(job["period"])))
+        if (not force and previous and previous["status"] == "ok" and previous["version"] == shared["version"]
+                and all(os.path.exists(p) for p in previous["files"].values())):
+            continue
+        jobs.append(job)
+
+    workers = workers or os.cpu_count()
+    # spawn: every worker starts a clean interpreter (no pyplot state or GUI backend inherited)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(shared,)) as pool:
+        for entry in pool.map(render_report, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+            done[_entry_key(entry)] = entry
+
+    manifest = {
+        "country": country,
+        "version": shared["version"],
+        "generated": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "reports": sorted(done.values(), key=_entry_key),
+    }
+    save_manifest(manifest)
+    failed = [e for e in manifest["reports"] if e["status"] != "ok"]
+    return len(jobs), failed, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    # Usage: python reports.py [--adm 1 2] [--period 2010-2020 ...] [--pcode BF46 ...] [--workers N] [--force]
+    parser = argparse.ArgumentParser(description="Generate PNG / PDF briefs for every ADM unit and period.")
+    parser.add_argument("--country", default="BFA")
+    parser.add_argument("--adm", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--period", nargs="+", type=parse_period, help="YYYY or YYYY-YYYY (default: the last 10 complete years)")
+    parser.add_argument("--pcode", nargs="+")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--force", action="store_true", help="regenerate the briefs that are up to date")
+    args = parser.parse_args()
+    n, failed, seconds = generate(args.country, args.adm, args.period, args.pcode, args.workers, args.force)
+    print(f"{n} reports in {seconds:.1f} s -> {MANIFEST_PATH}")
+    for entry in failed:
+        print(f"  failed: {entry['pcode']} {entry['period']}: {entry['error']}")
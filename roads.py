@@ -0,0 +1,196 @@
+import os
+import sys
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import rasterio
+import shapely
+from pyproj import Transformer
+from shapely import STRtree
+
+import partitions
+import raster_align
+import raster_roi
+
+
+# HOT OSM roads export (EPSG:4326), converted once to GeoParquet in the data store
+ROADS_GEOJSON = os.environ.get("ROADS_GEOJSON", "hotosm_bfa_roads_lines_geojson.geojson")
+ROADS_PARQUET = os.path.join(partitions.STORE_PATH, "roads", "roads.parquet")
+ROADS_COLUMNS = ["osm_id", "name", "highway", "surface", "geometry"]
+
+# Metric CRS for lengths and areas (UTM 30N covers Burkina Faso)
+METRIC_CRS = "EPSG:32630"
+
+# Cell size (degrees, about 1 km) of the default road density grid, laid over the roads' extent
+DENSITY_RESOLUTION = 0.01
+
+# Simplification tolerance (degrees) of the geometries drawn at each zoom level
+ZOOM_TOLERANCES = {
+    6: 0.01,
+    8: 0.002,
+    10: 0.0005,
+    12: 0.0001,
+}
+
+
+def convert_roads(geojson_path=None, rebuild=False):
+    """Converts the GeoJSON export to GeoParquet, with the length of every road in km."""
+    geojson_path = geojson_path or ROADS_GEOJSON
+    # Deployments may ship only the parquet: it is reused when the GeoJSON is missing
+    if not rebuild and os.path.exists(ROADS_PARQUET) and (
+            not os.path.exists(geojson_path) or os.path.getmtime(ROADS_PARQUET) >= os.path.getmtime(geojson_path)):
+        return ROADS_PARQUET
+    roads = gpd.read_file(geojson_path, engine="pyogrio")
+    roads = roads[[c for c in ROADS_COLUMNS if c in roads.columns]]
+    roads = roads[roads.geometry.notna() & ~roads.geometry.is_empty].reset_index(drop=True)
+    roads["length_km"] = roads.geometry.to_crs(METRIC_CRS).length / 1000
+    os.makedirs(os.path.dirname(ROADS_PARQUET), exist_ok=True)
+    roads.to_parquet(ROADS_PARQUET, index=False)
+    return ROADS_PARQUET
+
+
+@lru_cache(maxsize=1)
+def load_roads():
+    """Road network (GeoDataFrame, EPSG:4326), read once per process."""
+    return gpd.read_parquet(convert_roads())
+
+
+@lru_cache(maxsize=1)
+def road_index():
+    """STRtree over the road geometries: positions in the tree are row positions in load_roads()."""
+    return STRtree(load_roads().geometry.to_numpy())
+
+
+def roads_within(geometry=None, pcode=None, name=None, bbox=None, highway=None):
+    """Roads intersecting a geometry, an ADM unit (Pcode or name) or a bbox, found through the index."""
+    if geometry is None:
+        geometry = raster_roi.roi_geometry(bbox=bbox, pcode=pcode, name=name)
+    roads = load_roads()
+    hits = np.sort(road_index().query(geometry, predicate="intersects"))
+    found = roads.iloc[hits]
+    if highway is not None:
+        found = found[found["highway"].isin(highway)]
+    return found
+
+
+def clipped_lengths(polygons, crs="EPSG:4326", highway=None):
+    """Length (km) of road inside each polygon, for all the polygons in one bulk query.
+
+    The index returns the (polygon, road) pairs whose boxes intersect; only those pairs are
+    clipped, in a vectorized call, and the lengths are summed per polygon with a bincount."""
+    roads = load_roads()
+    road_geoms = roads.geometry.to_numpy()
+    if highway is not None:
+        keep = roads["highway"].isin(highway).to_numpy()
+    else:
+        keep = np.ones(len(roads), dtype=bool)
+    polygons = np.asarray(polygons)
+    if crs != "EPSG:4326":
+        polygons = gpd.GeoSeries(polygons, crs=crs).to_crs("EPSG:4326").to_numpy()
+
+    poly_idx, road_idx = road_index().query(polygons, predicate="intersects")
+    poly_idx, road_idx = poly_idx[keep[road_idx]], road_idx[keep[road_idx]]
+    pieces = shapely.intersection(road_geoms[road_idx], polygons[poly_idx])
+    lengths = gpd.GeoSeries(pieces, crs="EPSG:4326").to_crs(METRIC_CRS).length.to_numpy() / 1000
+    return np.bincount(poly_idx, weights=lengths, minlength=len(polygons))
+
+
+def _cache_is_fresh(path):
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(ROADS_PARQUET)
+
+
+def adm_road_density(adm_level=2, highway=None):
+    """Road length (km) and density (km / km²) per ADM unit, cached as CSV next to the roads."""
+    convert_roads()
+    suffix = "_".join(sorted(highway)) if highway else "all"
+    path = os.path.join(os.path.dirname(ROADS_PARQUET), f"density_adm{adm_level}_{suffix}.csv")
+    if _cache_is_fresh(path):
+        return pd.read_csv(path)
+
+    units = raster_roi.adm_units(adm_level)
+    geoms = [raster_roi.adm_geometry(pcode=pcode) for pcode in units]
+    df = pd.DataFrame({"pcode": list(units), "name": list(units.values())})
+    df["length_km"] = clipped_lengths(geoms, highway=highway) if geoms else []
+    df["area_km2"] = gpd.GeoSeries(geoms, crs="EPSG:4326").to_crs(METRIC_CRS).area.to_numpy() / 1e6
+    df["density_km_km2"] = df["length_km"] / df["area_km2"]
+    df.to_csv(path, index=False)
+    return df
+
+
+def grid_road_density(grid=None, highway=None):
+    """Road density (km / km²) of every cell of a raster grid (by default a DENSITY_RESOLUTION
+    grid over the extent of the roads), written as a GeoTIFF in the aligned rasters folder of
+    the grid. Returns the path."""
+    convert_roads()
+    if grid is None:
+        # One cell of margin: the roads on the edges of the extent fall inside the grid
+        left, bottom, right, top = load_roads().total_bounds
+        pad = DENSITY_RESOLUTION
+        grid = raster_align.TargetGrid.from_bounds(left - pad, bottom - pad, right + pad, top + pad, DENSITY_RESOLUTION)
+    suffix = "_".join(sorted(highway)) if highway else "all"
+    path = os.path.join(raster_align.ALIGNED_PATH, grid.key, f"roads_density_{suffix}.tif")
+    if _cache_is_fresh(path):
+        return path
+
+    roads = load_roads()
+    if highway is not None:
+        roads = roads[roads["highway"].isin(highway)]
+    # Parts of a MultiLineString are separate lines: joining them would add the gaps in between
+    geoms = shapely.get_parts(roads.geometry.to_crs(grid.crs).to_numpy())
+
+    # Clipping every road against every cell it crosses is too slow for a full grid: the roads
+    # are cut in pieces shorter than a quarter of a cell instead, and each piece is counted in
+    # the cell holding its midpoint
+    step = min(abs(grid.transform.a), abs(grid.transform.e)) / 4
+    coords, line_idx = shapely.get_coordinates(shapely.segmentize(geoms, step), return_index=True)
+    same_line = line_idx[1:] == line_idx[:-1]
+    start, end = coords[:-1][same_line], coords[1:][same_line]
+    cols, rows = ~grid.transform * ((start[:, 0] + end[:, 0]) / 2, (start[:, 1] + end[:, 1]) / 2)
+    cols, rows = np.floor(cols).astype(np.int64), np.floor(rows).astype(np.int64)
+    inside = (cols >= 0) & (cols < grid.width) & (rows >= 0) & (rows < grid.height)
+
+    to_metric = Transformer.from_crs(grid.crs, METRIC_CRS, always_xy=True)
+    x0, y0 = to_metric.transform(start[inside, 0], start[inside, 1])
+    x1, y1 = to_metric.transform(end[inside, 0], end[inside, 1])
+    lengths = np.hypot(x1 - x0, y1 - y0) / 1000
+    cell_km = np.bincount(rows[inside] * grid.width + cols[inside], weights=lengths, minlength=grid.width * grid.height)
+
+    # Cell areas only change with the row on a north-up grid
+    xs, ys = grid.transform * (np.zeros(grid.height), np.arange(grid.height))
+    xs2, ys2 = grid.transform * (np.ones(grid.height), np.arange(grid.height) + 1)
+    first_column = shapely.box(np.minimum(xs, xs2), np.minimum(ys, ys2), np.maximum(xs, xs2), np.maximum(ys, ys2))
+    areas = gpd.GeoSeries(first_column, crs=grid.crs).to_crs(METRIC_CRS).area.to_numpy()[:, None] / 1e6
+    density = (cell_km.reshape(grid.shape) / areas).astype(np.float32)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with rasterio.open(path, "w", **grid.profile()) as dst:
+        dst.write(density, 1)
+    return path
+
+
+def simplified_roads(zoom, highway=None):
+    """Road geometries simplified for a zoom level (the closest configured one below it),
+    stored once per level as GeoParquet."""
+    level = max([z for z in ZOOM_TOLERANCES if z <= zoom] or [min(ZOOM_TOLERANCES)])
+    convert_roads()
+    path = os.path.join(os.path.dirname(ROADS_PARQUET), f"roads_z{level}.parquet")
+    if _cache_is_fresh(path):
+        roads = gpd.read_parquet(path)
+    else:
+        roads = load_roads().copy()
+        roads["geometry"] = shapely.simplify(roads.geometry.to_numpy(), ZOOM_TOLERANCES[level], preserve_topology=False)
+        # Roads shorter than the tolerance collapse to nothing at this zoom
+        roads = roads[shapely.length(roads.geometry.to_numpy()) > 0]
+        roads.to_parquet(path, index=False)
+    if highway is not None:
+        roads = roads[roads["highway"].isin(highway)]
+    return roads
+
+
+if __name__ == "__main__":
+    # Usage: python roads.py [roads.geojson]
+    convert_roads(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"{len(load_roads())} roads, {load_roads()['length_km'].sum():.0f} km -> {ROADS_PARQUET}")
+    print(adm_road_density().sort_values("density_km_km2", ascending=False).to_string(index=False))
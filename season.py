@@ -0,0 +1,162 @@
+import os
+import sys
+import warnings
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import ingest
+import partitions
+import rainfall_cube
+
+
+# Detected seasons, one file per country and data version
+SEASON_PATH = os.path.join(partitions.STORE_PATH, "season")
+
+# The rainfall series are dekadal (10-day totals starting on the 1st, 11th and 21st of the month)
+DEKADS_PER_YEAR = 36
+
+# Onset (Sivakumar's Sahel criterion on dekads): the first dekad from 1 May with at least
+# ONSET_RAIN mm, none of the following DRY_SPELL_DEKADS dekads below DRY_DEKAD mm (no long
+# dry spell after sowing); searched until 1 September, otherwise the season failed
+ONSET_START = (5, 1)
+ONSET_END = (9, 1)
+ONSET_RAIN = 20.0
+DRY_DEKAD = 5.0
+DRY_SPELL_DEKADS = 3
+
+# Cessation: from 1 September (and after the onset), the first dekad that starts
+# CESSATION_DEKADS dekads in a row below CESSATION_RAIN mm; the season ends on its first day
+CESSATION_START = (9, 1)
+CESSATION_RAIN = 10.0
+CESSATION_DEKADS = 2
+
+METRICS = ["onset", "cessation", "length"]
+
+
+def dekad_of(month, day):
+    return (month - 1) * 3 + min((day - 1) // 10, 2)
+
+
+def _shifted(values, k):
+    # values[..., t + k] at t, NaN past the end of the series
+    out = np.full(values.shape, np.nan, dtype=values.dtype)
+    out[..., :values.shape[-1] - k] = values[..., k:]
+    return out
+
+
+def _first(mask):
+    # Index of the first True along the last axis, -1 where there is none
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1), -1)
+
+
+def dekad_grid(cube):
+    """Rainfall as (unit, year, dekad) from the dense cube, NaN where a dekad has no value."""
+    years = np.arange(cube.years.min(), cube.years.max() + 1)
+    dates = pd.DatetimeIndex(cube.dates)
+    cols = (cube.years - years[0]) * DEKADS_PER_YEAR + (dates.month.to_numpy() - 1) * 3 + np.minimum((dates.day.to_numpy() - 1) // 10, 2)
+    grid = np.full((len(cube.pcodes), len(years) * DEKADS_PER_YEAR), np.nan, dtype=np.float32)
+    grid[:, cols] = cube.values
+    return grid.reshape(len(cube.pcodes), len(years), DEKADS_PER_YEAR), years
+
+
+def detect_seasons(grid, years):
+    """Onset, cessation (day of year) and length (days) of the rainy season of every unit and
+    year, all at once: (unit, year) arrays, NaN where the season is not detected."""
+    n_units, n_years, _ = grid.shape
+    # Shifts run along the whole series, so the dekads after late December are next January's
+    series = grid.reshape(n_units, -1)
+    dekad = np.arange(DEKADS_PER_YEAR)
+
+    no_dry_spell = np.ones(series.shape, dtype=bool)
+    for k in range(1, DRY_SPELL_DEKADS + 1):
+        no_dry_spell &= _shifted(series, k) >= DRY_DEKAD
+    onset_ok = ((series >= ONSET_RAIN) & no_dry_spell).reshape(grid.shape)
+    onset_ok &= (dekad >= dekad_of(*ONSET_START)) & (dekad < dekad_of(*ONSET_END))
+    onset = _first(onset_ok)
+
+    dry_run = np.ones(series.shape, dtype=bool)
+    for k in range(CESSATION_DEKADS):
+        dry_run &= _shifted(series, k) < CESSATION_RAIN
+    cessation_ok = dry_run.reshape(grid.shape)
+    cessation_ok &= (dekad >= dekad_of(*CESSATION_START)) & (dekad > onset[..., None])
+    cessation = np.where(onset >= 0, _first(cessation_ok), -1)
+
+    # Day of year of the first day of every dekad, per year (leap years included)
+    starts = pd.to_datetime(pd.DataFrame({
+        "year": np.repeat(years, DEKADS_PER_YEAR),
+        "month": np.tile(dekad // 3 + 1, n_years),
+        "day": np.tile(dekad % 3 * 10 + 1, n_years),
+    })).dt.dayofyear.to_numpy().reshape(n_years, DEKADS_PER_YEAR)
+    year_idx = np.broadcast_to(np.arange(n_years), onset.shape)
+    onset_doy = np.where(onset >= 0, starts[year_idx, np.maximum(onset, 0)], np.nan)
+    cessation_doy = np.where(cessation >= 0, starts[year_idx, np.maximum(cessation, 0)], np.nan)
+    return {"onset": onset_doy, "cessation": cessation_doy, "length": cessation_doy - onset_doy}
+
+
+def season_path(country, version):
+    return os.path.join(SEASON_PATH, f"season_{country}_v{version}.npz")
+
+
+@lru_cache(maxsize=2)
+def load_seasons(country="BFA", version=0):
+    """Seasons of every unit and year of a country at a data version: dict with pcodes, names,
+    years and the (unit, year) arrays of METRICS. Detected once and saved."""
+    path = season_path(country, version)
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as npz:
+            return {k: npz[k] for k in npz.files}
+    cube = rainfall_cube.load_cube(country, version)
+    grid, years = dekad_grid(cube)
+    seasons = {"pcodes": cube.pcodes, "names": cube.names, "years": years}
+    seasons.update({k: v.astype(np.float32) for k, v in detect_seasons(grid, years).items()})
+    os.makedirs(SEASON_PATH, exist_ok=True)
+    np.savez(path, **seasons)
+    return seasons
+
+
+def season_frame(seasons):
+    """Long table: Pcode, name, year, onset and cessation dates, length in days."""
+    n_units, n_years = seasons["onset"].shape
+    df = pd.DataFrame({
+        "Pcode": np.repeat(seasons["pcodes"], n_years),
+        "name": np.repeat(seasons["names"], n_years),
+        "year": np.tile(seasons["years"], n_units),
+    })
+    for metric in ("onset", "cessation"):
+        doy = seasons[metric].ravel()
+        df[metric] = pd.to_datetime(df["year"].astype(str), format="%Y") + pd.to_timedelta(doy - 1, unit="D")
+    df["length"] = seasons["length"].ravel()
+    return df
+
+
+def national_medians(seasons):
+    """Median of every metric over the units, per year (DataFrame indexed by year)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # years with no detected season
+        medians = {metric: np.nanmedian(seasons[metric], axis=0) for metric in METRICS}
+    return pd.DataFrame(medians, index=pd.Index(seasons["years"], name="year"))
+
+
+def trend(seasons, metric, min_years=10):
+    """Least-squares slope of a metric against the year, per unit, in days per decade; NaN for
+    units with fewer than min_years detected seasons."""
+    y = seasons[metric].astype(np.float64)
+    valid = np.isfinite(y)
+    n = valid.sum(axis=1)
+    x = np.where(valid, seasons["years"].astype(np.float64), 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x_mean = x.sum(axis=1) / n
+        y_mean = np.where(valid, y, 0.0).sum(axis=1) / n
+        dx = np.where(valid, x - x_mean[:, None], 0.0)
+        dy = np.where(valid, y - y_mean[:, None], 0.0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= min_years, slope * 10, np.nan)
+
+
+if __name__ == "__main__":
+    # Usage: python season.py [country]
+    country = sys.argv[1] if len(sys.argv) > 1 else "BFA"
+    seasons = load_seasons(country, ingest.data_version(country))
+    print(national_medians(seasons).tail(15).round(0).to_string())
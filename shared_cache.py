@@ -0,0 +1,327 @@
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locks, writes stay atomic
+    fcntl = None
+
+
+# "disk" (default), a redis:// URL or "local" (in-process Redis stand-in, for tests); replicas
+# share results through the same folder or server
+SHARED_CACHE_URL = os.environ.get("SHARED_CACHE_URL", "disk")
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", "shared_cache/")
+
+# Entries expire after DEFAULT_TTL seconds; the disk store is trimmed to MAX_BYTES, least recently used first
+DEFAULT_TTL = int(os.environ.get("SHARED_CACHE_TTL", 24 * 3600))
+MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+KEY_PREFIX = "sahel:"
+
+
+# Compare-and-delete: a lock is released only by the holder of its token
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def make_key(namespace, args, kwargs, scope=None):
+    """Stable key of a call: namespace (and scope) plus a hash of the pickled arguments."""
+    payload = pickle.dumps((args, sorted(kwargs.items())), protocol=4)
+    namespace = f"{namespace}@{scope}" if scope is not None else namespace
+    return f"{namespace}:{hashlib.sha256(payload).hexdigest()[:32]}"
+
+
+class DiskCache:
+    """Content-addressed store in a folder that several processes (or hosts, on a shared volume)
+    can use at once.
+
+    refs/<key hash>.json points to blobs/<sha256 of the value>, so identical results are stored
+    once. Writes go through a temporary file and os.replace; the index and the eviction are
+    serialized with an flock on .lock."""
+
+    def __init__(self, path=SHARED_CACHE_PATH, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._size = None  # bytes of blobs, counted once then kept up to date by this process
+        for sub in ("refs", "blobs", "locks"):
+            os.makedirs(os.path.join(path, sub), exist_ok=True)
+
+    def _ref_path(self, key):
+        return os.path.join(self.path, "refs", hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.path, "blobs", digest[:2], digest)
+
+    def _lock_path(self, name):
+        return os.path.join(self.path, "locks", hashlib.sha256(name.encode()).hexdigest()[:32])
+
+    @contextlib.contextmanager
+    def lock(self, name=".lock"):
+        with open(self._lock_path(name), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, key):
+        ref_path = self._ref_path(key)
+        try:
+            with open(ref_path) as f:
+                ref = json.load(f)
+            if ref["expires"] < time.time():
+                self.delete(key)
+                return None
+            with open(self._blob_path(ref["blob"]), "rb") as f:
+                value = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(ref_path)  # last access, for the eviction
+        return value
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        digest = hashlib.sha256(value).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            _atomic_write(blob_path, value)
+            if self._size is None:
+                self._size = self.size()
+            else:
+                self._size += len(value)
+        _atomic_write(self._ref_path(key), json.dumps({"key": key, "blob": digest, "expires": time.time() + ttl}).encode())
+        if self._size is not None and self._size > self.max_bytes:
+            self.evict()
+            self._size = self.size()
+
+    def delete(self, key):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._ref_path(key))
+
+    def size(self):
+        total = 0
+        for root, _, files in os.walk(os.path.join(self.path, "blobs")):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones until the store fits in
+        max_bytes, then the blobs no entry points to."""
+        with self.lock():
+            refs_dir = os.path.join(self.path, "refs")
+            refs = []
+            for name in os.listdir(refs_dir):
+                path = os.path.join(refs_dir, name)
+                try:
+                    with open(path) as f:
+                        ref = json.load(f)
+                    refs.append((os.path.getmtime(path), path, ref))
+                except (OSError, ValueError):
+                    continue
+            now = time.time()
+            live = []
+            # get() drops expired refs without the lock: a ref may be gone already
+            for mtime, path, ref in sorted(refs):
+                if ref["expires"] < now:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(path)
+                else:
+                    live.append((path, ref))
+
+            blob_sizes = {}
+            for root, _, files in os.walk(os.path.join(self.path, "blobs")):
+                for name in files:
+                    blob_sizes[name] = os.path.getsize(os.path.join(root, name))
+            total = sum(blob_sizes[ref["blob"]] for _, ref in live if ref["blob"] in blob_sizes)
+            while live and total > self.max_bytes:
+                path, ref = live.pop(0)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+                if all(other["blob"] != ref["blob"] for _, other in live):
+                    total -= blob_sizes.get(ref["blob"], 0)
+
+            referenced = {ref["blob"] for _, ref in live}
+            for digest in blob_sizes.keys() - referenced:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._blob_path(digest))
+
+            # Lock files of the keys with no entry left, except the ones held right now (a result
+            # being computed, this eviction's own lock)
+            kept = {self._lock_path(ref.get("key", "")) for _, ref in live}
+            locks_dir = os.path.join(self.path, "locks")
+            for name in os.listdir(locks_dir):
+                path = os.path.join(locks_dir, name)
+                if path not in kept:
+                    _remove_idle_lock(path)
+
+    def clear(self):
+        for name in os.listdir(os.path.join(self.path, "refs")):
+            os.remove(os.path.join(self.path, "refs", name))
+        self.evict()
+
+
+class RedisCache:
+    """Same interface on a Redis server (or anything speaking its protocol). Expiry is Redis' own
+    TTL; size limits and eviction come from the server's maxmemory / allkeys-lru settings."""
+
+    def __init__(self, client):
+        self.client = client
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(KEY_PREFIX + key)
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        self.client.set(KEY_PREFIX + key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(KEY_PREFIX + key)
+
+    @contextlib.contextmanager
+    def lock(self, name=".lock", timeout=600):
+        # The token tells this holder's lock from one taken by another replica after the timeout
+        lock_key = f"{KEY_PREFIX}lock:{name}"
+        token = uuid.uuid4().hex.encode()
+        while not self.client.set(lock_key, token, nx=True, ex=timeout):
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            self._release(keys=[lock_key], args=[token])
+
+    def clear(self):
+        for key in self.client.scan_iter(KEY_PREFIX + "*"):
+            self.client.delete(key)
+
+
+class LocalRedis:
+    """In-process stand-in for a Redis client (get / set with ex and nx / delete / scan_iter and
+    the lock release script), to run RedisCache without a server."""
+
+    def __init__(self):
+        self.data = {}
+        self.mutex = threading.Lock()
+
+    def get(self, key):
+        with self.mutex:
+            value, expires = self.data.get(key, (None, None))
+            if expires is not None and expires < time.time():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None, nx=False):
+        with self.mutex:
+            current = self.data.get(key)
+            if nx and current is not None and (current[1] is None or current[1] >= time.time()):
+                return None
+            self.data[key] = (value, time.time() + ex if ex else None)
+            return True
+
+    def delete(self, *keys):
+        with self.mutex:
+            return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match="*"):
+        prefix = match.rstrip("*")
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+    def register_script(self, script):
+        # Only RELEASE_SCRIPT is used: delete the key if it still holds the token
+        def release(keys, args):
+            with self.mutex:
+                value, expires = self.data.get(keys[0], (None, None))
+                if value == args[0] and (expires is None or expires >= time.time()):
+                    del self.data[keys[0]]
+                    return 1
+                return 0
+        return release
+
+
+def _atomic_write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove_idle_lock(path):
+    # A process that opened the file just before it is removed may still compute the same result
+    # as the next one: a duplicate computation at worst, the writes stay atomic
+    try:
+        with open(path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(path)
+    except OSError:  # held by another writer, or already gone
+        pass
+
+
+_cache = None
+
+
+def get_cache():
+    """Process-wide cache backend chosen by SHARED_CACHE_URL."""
+    global _cache
+    if _cache is None:
+        if SHARED_CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+            _cache = RedisCache.from_url(SHARED_CACHE_URL)
+        elif SHARED_CACHE_URL == "local":
+            _cache = RedisCache(LocalRedis())
+        else:
+            _cache = DiskCache()
+    return _cache
+
+
+def memoize(namespace, ttl=DEFAULT_TTL, scope=None):
+    """Caches the (picklable) result of a function in the shared backend.
+
+    The first process to miss a key computes it while holding the key's lock; the other
+    replicas wait on the lock and then read the stored result instead of recomputing it.
+    scope, if given, is called on every call and its value is part of the key (e.g. the
+    generation of the data store, so a rebuilt store does not get the old results)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            key = make_key(namespace, args, kwargs, scope() if scope is not None else None)
+            value = cache.get(key)
+            if value is None:
+                with cache.lock(key):
+                    value = cache.get(key)
+                    if value is None:
+                        result = func(*args, **kwargs)
+                        cache.set(key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+                        return result
+            return pickle.loads(value)
+        return wrapper
+    return decorator
+
+
+if __name__ == "__main__":
+    # Usage: python shared_cache.py [clear|evict]
+    cache = get_cache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+    elif isinstance(cache, DiskCache):
+        cache.evict()
+        print(f"{cache.size() / 1024 ** 2:.1f} MB in {cache.path}")
@@ -0,0 +1,168 @@
+import os
+import sys
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.special import digamma, gammainc, polygamma
+from scipy.stats import norm
+
+import choropleth
+import ingest
+import partitions
+
+
+# Fitted gamma parameters, one file per country
+SPI_PATH = os.path.join(partitions.STORE_PATH, "spi")
+
+# Accumulation periods (months)
+SPI_SCALES = [1, 3, 6, 12]
+
+# Reference period of the fits (WMO standard normal); all complete years when the data do not cover it
+CALIBRATION = (1991, 2020)
+
+# Drought classes on the SPI scale
+SPI_CLASSES = [
+    ("Extremely dry", -np.inf, -2.0),
+    ("Severely dry", -2.0, -1.5),
+    ("Moderately dry", -1.5, -1.0),
+    ("Near normal", -1.0, 1.0),
+    ("Moderately wet", 1.0, 1.5),
+    ("Very wet", 1.5, 2.0),
+    ("Extremely wet", 2.0, np.inf),
+]
+
+# Newton refinements of Thom's estimate of the gamma shape
+NEWTON_STEPS = 3
+
+# SPI is clipped to this range (the gamma tails are not reliable beyond it)
+SPI_LIMIT = 3.09
+
+
+def accumulate(values, scale):
+    """Rolling sum over `scale` months along the last axis; NaN where any month is missing."""
+    if scale == 1:
+        return values.astype(np.float64)
+    filled = np.nan_to_num(values, nan=0.0).astype(np.float64)
+    missing = np.isnan(values).astype(np.int32)
+    zero = np.zeros(values.shape[:-1] + (1,))
+    csum = np.concatenate([zero, np.cumsum(filled, axis=-1)], axis=-1)
+    cmiss = np.concatenate([zero, np.cumsum(missing, axis=-1)], axis=-1)
+    out = np.full(values.shape, np.nan)
+    out[..., scale - 1:] = csum[..., scale:] - csum[..., :-scale]
+    gaps = np.zeros(values.shape, dtype=bool)
+    gaps[..., scale - 1:] = (cmiss[..., scale:] - cmiss[..., :-scale]) > 0
+    gaps[..., :scale - 1] = True
+    out[gaps] = np.nan
+    return out
+
+
+def fit_gamma(samples):
+    """Gamma fit of every series at once (samples: (..., n) with NaN for missing years).
+
+    Zero totals are left out of the fit and counted in q, the probability of zero rain. alpha
+    starts from Thom's approximation and is refined with Newton steps on the maximum-likelihood
+    equation log(alpha) - digamma(alpha) = log(mean) - mean(log); beta = mean / alpha."""
+    valid = np.isfinite(samples)
+    positive = valid & (samples > 0)
+    n_valid = valid.sum(axis=-1)
+    n_pos = positive.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # units / months with no rainy year
+        q = np.where(n_valid > 0, (n_valid - n_pos) / n_valid, np.nan)
+        x = np.where(positive, samples, np.nan)
+        mean = np.nanmean(x, axis=-1)
+        a = np.log(mean) - np.nanmean(np.log(x), axis=-1)
+        alpha = (1 + np.sqrt(1 + 4 * a / 3)) / (4 * a)
+        # Thom is within ~0.1 % of the MLE: a few Newton steps bring it to machine precision
+        for _ in range(NEWTON_STEPS):
+            alpha = alpha - (np.log(alpha) - digamma(alpha) - a) / (1 / alpha - polygamma(1, alpha))
+        beta = mean / alpha
+    # Too few rainy years for a fit (dry-season months): SPI left undefined
+    bad = (n_pos < 3) | ~np.isfinite(alpha) | (alpha <= 0)
+    alpha[bad] = beta[bad] = np.nan
+    return alpha, beta, q
+
+
+def spi_values(totals, alpha, beta, q):
+    """SPI of accumulated totals given the gamma parameters (broadcast against totals)."""
+    cdf = q + (1 - q) * gammainc(alpha, np.where(totals > 0, totals, 0) / beta)
+    # Zero totals take the centre of the zero mass (q / 2) rather than its top, so a month that
+    # is dry in most years does not read as wet (Stagge et al., 2015)
+    cdf = np.where(totals == 0, q / 2, cdf)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return np.clip(norm.ppf(cdf), -SPI_LIMIT, SPI_LIMIT)
+
+
+def params_path(country):
+    return os.path.join(SPI_PATH, f"gamma_{country}.npz")
+
+
+def fit_params(cube, calibration=CALIBRATION):
+    """Gamma parameters per scale, unit and calendar month, from the calibration years."""
+    n_years = cube.values.shape[1] // 12
+    years = cube.first_year + np.arange(n_years)
+    in_period = (years >= calibration[0]) & (years <= calibration[1])
+    if in_period.sum() < 10:
+        in_period = np.ones(n_years, dtype=bool)
+    params = {"pcodes": cube.pcodes, "calibration": np.array([years[in_period][0], years[in_period][-1]]),
+              "newton_steps": np.array(NEWTON_STEPS)}
+    for scale in SPI_SCALES:
+        acc = accumulate(cube.values, scale)[:, :n_years * 12].reshape(len(cube.pcodes), n_years, 12)
+        # (unit, calendar month, year): one fit per unit and month, all at once
+        samples = acc[:, in_period, :].transpose(0, 2, 1)
+        params[f"alpha_{scale}"], params[f"beta_{scale}"], params[f"q_{scale}"] = fit_gamma(samples)
+    return params
+
+
+def load_params(country="BFA", cube=None, refit=False):
+    """Cached gamma parameters: fitted once, new dekads are only evaluated against them.
+    Refitted when the units or the fitting method change, or on request."""
+    path = params_path(country)
+    cube = cube or choropleth.load_cube(country, ingest.data_version(country))
+    if not refit and os.path.exists(path):
+        with np.load(path, allow_pickle=False) as npz:
+            params = {k: npz[k] for k in npz.files}
+        if np.array_equal(params["pcodes"], cube.pcodes) and params.get("newton_steps") == NEWTON_STEPS:
+            return params
+    params = fit_params(cube)
+    os.makedirs(SPI_PATH, exist_ok=True)
+    np.savez(path, **params)
+    return params
+
+
+def compute_spi(country="BFA", scale=3, version=None):
+    """SPI of every unit and month: DataFrame indexed by month (Timestamp), one column per Pcode."""
+    version = ingest.data_version(country) if version is None else version
+    cube = choropleth.load_cube(country, version)
+    params = load_params(country, cube)
+    acc = accumulate(cube.values, scale)
+    calendar_month = np.arange(acc.shape[1]) % 12
+    values = spi_values(acc, params[f"alpha_{scale}"][:, calendar_month], params[f"beta_{scale}"][:, calendar_month],
+                        params[f"q_{scale}"][:, calendar_month])
+    values[~np.isfinite(acc)] = np.nan
+    index = pd.to_datetime(cube.periods, format="%Y-%m")
+    return pd.DataFrame(values.T.astype(np.float32), index=index, columns=cube.pcodes)
+
+
+def drought_share(spi, threshold=-1.0):
+    """Share of the units with SPI at or below the threshold, per month."""
+    valid = spi.notna().sum(axis=1)
+    return (spi.le(threshold).sum(axis=1) / valid.where(valid > 0)).rename("share")
+
+
+def spi_class(value):
+    for label, low, high in SPI_CLASSES:
+        if low < value <= high or (low == -np.inf and value <= high):
+            return label
+    return "No data"
+
+
+if __name__ == "__main__":
+    # Usage: python spi.py [scale] [--refit]
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 3
+    if "--refit" in sys.argv:
+        load_params("BFA", refit=True)
+    df = compute_spi("BFA", scale)
+    print(df.tail(12).round(2).to_string())
@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import sys
+import warnings
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import gpp_vat
+import ingest
+import partitions
+import rainfall_cube
+import raster_align
+import raster_roi
+
+
+# Aligned panels, one parquet file per request (sources, axis, unit, window and source versions)
+ALIGNED_PATH = os.path.join(partitions.STORE_PATH, "aligned")
+
+# Common time axes, finest first. Every period is labelled by its first day: dekads start on
+# the 1st, 11th and 21st, seasons are the meteorological quarters DJF / MAM / JJA / SON
+# (December belongs to the following year's DJF)
+FREQUENCIES = ["dekad", "month", "season", "year"]
+PANDAS_FREQ = {"month": "M", "season": "Q-NOV", "year": "Y"}
+
+# Aggregations allowed when a source is coarsened, and ways to spread a coarse value onto a
+# finer axis: "repeat" for levels and rates (a % of land area holds for each month of the
+# year), "divide" for totals (an annual total split evenly over its months)
+AGGREGATIONS = ["sum", "mean", "min", "max", "first", "last"]
+SPREADS = ["repeat", "divide", None]
+
+# Largest side (pixels) of the raster reads used for the layer means
+RASTER_SIZE = 1000
+
+# name -> {"freq", "load", "rules", "version", "description"}
+SOURCES = {}
+
+
+def register_source(name, freq, load, rules, version=None, description=""):
+    """Registers a dataset with its native frequency.
+
+    load(country, unit) returns a DataFrame indexed by date (any date inside the native
+    period) with one column per variable. rules maps every column to (aggregation, spread).
+    version(country) returns anything that changes when the data does (cache key)."""
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency {freq!r}: use one of {FREQUENCIES}")
+    for column, (aggregation, spread) in rules.items():
+        if aggregation not in AGGREGATIONS or spread not in SPREADS:
+            raise ValueError(f"Invalid rule for {name}.{column}: {(aggregation, spread)}")
+    SOURCES[name] = {"freq": freq, "load": load, "rules": rules, "version": version or (lambda country: None),
+                     "description": description}
+
+
+# --- TIME AXES ---
+
+def period_start(dates, freq):
+    """First day of the period of the given frequency that contains each date."""
+    dates = pd.DatetimeIndex(dates)
+    if freq == "dekad":
+        day = np.minimum((dates.day.to_numpy() - 1) // 10, 2) * 10 + 1
+        return pd.DatetimeIndex(pd.to_datetime(pd.DataFrame({"year": dates.year, "month": dates.month, "day": day}))).as_unit("ns")
+    return dates.to_period(PANDAS_FREQ[freq]).start_time.as_unit("ns")
+
+
+def period_range(start, end, freq):
+    """Starts of all the periods of a frequency that overlap [start, end]."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if freq == "dekad":
+        months = pd.date_range(start.to_period("M").start_time, end, freq="MS")
+        starts = pd.DatetimeIndex(np.sort(np.concatenate([months + pd.Timedelta(days=d) for d in (0, 10, 20)])))
+    else:
+        starts = pd.period_range(start, end, freq=PANDAS_FREQ[freq]).start_time
+    first = period_start([start], freq)[0]
+    return pd.DatetimeIndex(starts[(starts >= first) & (starts <= end)]).as_unit("ns")
+
+
+def resample(df, native, freq, rules, name=""):
+    """Moves a source from its native frequency onto another axis with its rules.
+
+    Coarsening applies the aggregation of every column; a "sum" is left NaN for the periods
+    where some native period has no value, so partial totals never pass for complete ones.
+    Refining spreads every value over the finer periods it contains."""
+    df = df.sort_index()
+    if df.empty:
+        return df
+    native_starts = period_start(df.index, native)
+    if FREQUENCIES.index(freq) >= FREQUENCIES.index(native):
+        keys = period_start(native_starts, freq)
+        grouped = df.groupby(keys)
+        out = pd.DataFrame({column: grouped[column].agg(rules[column][0]) for column in df.columns})
+        # Native periods expected in each target period, against the ones with a value
+        expected = pd.Series(1, index=period_range(out.index.min(), out.index.max() + _period_end(freq), native))
+        expected = expected.groupby(period_start(expected.index, freq)).sum().reindex(out.index)
+        for column in df.columns:
+            if rules[column][0] == "sum":
+                observed = df[column].notna().groupby(keys).sum()
+                out.loc[observed < expected, column] = np.nan
+        return out
+
+    # Refine: one row per finer period, the value of the native period containing it
+    coarse = df.groupby(native_starts).last()
+    target = period_range(coarse.index.min(), coarse.index.max() + _period_end(native), freq)
+    parents = period_start(target, native)
+    out = coarse.reindex(parents)
+    out.index = target
+    counts = pd.Series(1, index=target).groupby(parents).transform("sum").to_numpy()
+    for column in df.columns:
+        spread = rules[column][1]
+        if spread is None:
+            raise ValueError(f"{name}.{column} is {native} data and has no rule to spread it onto a {freq} axis")
+        if spread == "divide":
+            out[column] = out[column] / counts
+    return out
+
+
+def _period_end(freq):
+    # Offset from a period start to the last day of that period
+    return {"dekad": pd.Timedelta(days=9), "month": pd.offsets.MonthEnd(0), "season": pd.offsets.MonthEnd(3),
+            "year": pd.offsets.YearEnd(0)}[freq]
+
+
+# --- ALIGNMENT ---
+
+@lru_cache(maxsize=32)
+def _native(name, country, unit, version):
+    return SOURCES[name]["load"](country, unit)
+
+
+def native(name, country="BFA", unit=None):
+    """A source at its own frequency (cached on the source version)."""
+    return _native(name, country, unit, json.dumps(SOURCES[name]["version"](country), default=str))
+
+
+def panel_path(key):
+    return os.path.join(ALIGNED_PATH, f"{key}.parquet")
+
+
+def align(names, freq="year", country="BFA", unit=None, start=None, end=None, how="outer"):
+    """Panel of several sources on a common axis: DataFrame indexed by period start, one column
+    "<source>.<variable>" per variable. unit selects an ADM Pcode (or a region / commune,
+    depending on the source) where the source has one; national sources ignore it.
+
+    Panels are saved in the store and reused until one of the sources changes."""
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency {freq!r}: use one of {FREQUENCIES}")
+    versions = {name: SOURCES[name]["version"](country) for name in names}
+    request = {"names": list(names), "freq": freq, "country": country, "unit": unit, "start": str(start),
+               "end": str(end), "how": how, "versions": versions}
+    key = hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()[:24]
+    path = panel_path(key)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    frames = []
+    for name in names:
+        spec = SOURCES[name]
+        df = resample(native(name, country, unit), spec["freq"], freq, spec["rules"], name)
+        frames.append(df.add_prefix(f"{name}."))
+    panel = pd.concat(frames, axis=1, join=how).sort_index()
+    panel.index.name = "period"
+    if start is not None:
+        panel = panel[panel.index >= period_start([start], freq)[0]]
+    if end is not None:
+        panel = panel[panel.index <= pd.Timestamp(end)]
+    os.makedirs(ALIGNED_PATH, exist_ok=True)
+    panel.to_parquet(path)
+    return panel
+
+
+# --- SOURCES ---
+
+def _load_rainfall(country, unit):
+    # Dekadal rfh: the unit's series, or the mean of the units
+    cube = rainfall_cube.load_cube(country, ingest.data_version(country))
+    if unit is not None:
+        return cube.unit_series(unit).rename("rfh").to_frame()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # dates with no unit reporting
+        values = np.nanmean(cube.values, axis=0)
+    return pd.DataFrame({"rfh": values}, index=pd.DatetimeIndex(cube.dates))
+
+
+def _store_version(name, csv_path):
+    path = partitions.dataset_path(name) if partitions.has_dataset(name) else csv_path
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+LAND_USE_INDICATORS = {
+    "Agricultural land (% of land area)": "agriculture",
+    "Forest area (% of land area)": "forest",
+    "Arable land (% of land area)": "arable",
+}
+
+
+def _load_land_use(country, unit):
+    if partitions.has_dataset("climate-change"):
+        df = partitions.read_dataset("climate-change", country=country)
+    else:
+        df = pd.read_csv("climate-change_bfa.csv")
+        df = df[df["Country Name"] == partitions.COUNTRY_NAMES.get(country, country)]
+    df = df[df["Indicator Name"].isin(LAND_USE_INDICATORS)]
+    df = df.assign(Year=pd.to_numeric(df["Year"], errors="coerce"), Value=pd.to_numeric(df["Value"], errors="coerce"))
+    wide = df.pivot_table(index="Year", columns="Indicator Name", values="Value").rename(columns=LAND_USE_INDICATORS)
+    wide.index = pd.to_datetime(wide.index.astype(int).astype(str), format="%Y")
+    wide.columns.name = None
+    return wide
+
+
+def _load_biomass(country, unit):
+    # Monthly biomass anomaly (z of GPP) of the communes: one commune / department, or their mean
+    if partitions.has_dataset("biomass"):
+        df = partitions.read_dataset("biomass", country=country)
+    else:
+        df = pd.read_csv("sahel-biomass-by-ach-gis4tech.csv", encoding="utf-8-sig")
+        df = df[df["Country"].map(partitions.COUNTRY_CODES) == country]
+        df["z_gpp"] = pd.to_numeric(df["z_gpp"].astype(str).str.replace(",", "."), errors="coerce")
+    df["date"] = pd.to_datetime(df["date"], errors="coerce")
+    if unit is not None:
+        df = df[(df["Commune/Municipality"] == unit) | (df["Moughataa/Department"] == unit)]
+    return df.groupby("date")[["z_gpp"]].mean()
+
+
+def _layer_loader(layer, column, scale=None):
+    def load(country, unit):
+        # Mean of the yearly raster over the unit (or the full extent)
+        roi = {} if unit is None else ({"region": unit} if unit in raster_roi.REGIONS else {"pcode": unit})
+        values = {}
+        for year, path in raster_align.list_layer_files(layer).items():
+            data, _ = raster_roi.read_roi(path, max_size=RASTER_SIZE, **roi)
+            if data is None:  # unit outside the raster
+                values[pd.Timestamp(year, 1, 1)] = np.nan
+                continue
+            if scale is not None:
+                data = np.ma.masked_greater_equal(data, gpp_vat.GPP_FILL_MIN) * scale
+            values[pd.Timestamp(year, 1, 1)] = float(data.mean()) if data.count() else np.nan
+        return pd.DataFrame({column: pd.Series(values, dtype=float)}).sort_index()
+    return load
+
+
+def _layer_version(layer):
+    def version(country):
+        return {year: os.path.getmtime(path) for year, path in raster_align.list_layer_files(layer).items()}
+    return version
+
+
+register_source("rainfall", "dekad", _load_rainfall, {"rfh": ("sum", "divide")},
+                version=ingest.data_version, description="CHIRPS rainfall (mm per dekad), ADM2 units")
+register_source("land_use", "year", _load_land_use,
+                {column: ("mean", "repeat") for column in LAND_USE_INDICATORS.values()},
+                version=lambda country: _store_version("climate-change", "climate-change_bfa.csv"),
+                description="World Bank land-use indicators (% of land area), national")
+register_source("biomass", "month", _load_biomass, {"z_gpp": ("mean", "repeat")},
+                version=lambda country: _store_version("biomass", "sahel-biomass-by-ach-gis4tech.csv"),
+                description="Biomass anomaly (z-score of GPP), communes of Mauritania and Senegal")
+register_source("precipitation", "year", _layer_loader("precipitation", "precipitation_mm"),
+                {"precipitation_mm": ("sum", "divide")}, version=_layer_version("precipitation"),
+                description="Annual precipitation raster (mm), mean over the unit")
+register_source("gpp", "year", _layer_loader("gpp", "gpp", scale=gpp_vat.GPP_SCALE),
+                {"gpp": ("mean", "repeat")}, version=_layer_version("gpp"),
+                description="MODIS GPP (kg C/m²/year), mean over the unit")
+register_source("population", "year", _layer_loader("population", "density"),
+                {"density": ("mean", "repeat")}, version=_layer_version("population"),
+                description="Population density (people/km²), mean over the unit")
+
+
+if __name__ == "__main__":
+    # Usage: python temporal.py freq source [source ...] [--unit PCODE] [--country ISO3]
+    args = sys.argv[1:]
+    unit = args[args.index("--unit") + 1] if "--unit" in args else None
+    country = args[args.index("--country") + 1] if "--country" in args else "BFA"
+    names = [a for a in args[1:] if a in SOURCES]
+    print(align(names, args[0], country=country, unit=unit).tail(12).to_string())
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+os.environ["AGENT_LLM"] = "local"  # before the import: the agent is built with LocalRulesLLM, offline
+
+import agent
+
+
+PCODES = ["BF0001", "BF0002"]
+YEARS = range(2000, 2006)
+# Annual total of every unit (mm, spread evenly over the 12 months): 2003 then 2001 are the driest
+ANNUAL = {2000: 600, 2001: 420, 2002: 660, 2003: 360, 2004: 720, 2005: 540}
+
+LANDCOVER = {
+    2010: {"value": np.array([10, 12]), "count": np.array([100, 50]), "name": np.array(["Grasslands", "Croplands"])},
+    2011: {"value": np.array([10, 12]), "count": np.array([80, 70]), "name": np.array(["Grasslands", "Croplands"])},
+}
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Synthetic monthly rainfall and land cover tables; counts the reads of the data sources."""
+    counts = {"read_monthly": 0, "load_vat": 0}
+
+    def read_monthly(country, build=True):
+        assert not build  # the tools never write the store
+        counts["read_monthly"] += 1
+        rows = [(pcode, year, month, ANNUAL[year] / 12) for pcode in PCODES for year in YEARS for month in range(1, 13)]
+        return pd.DataFrame(rows, columns=["Pcode", "year", "month", "rfh"])
+
+    def load_vat(path):
+        counts["load_vat"] += 1
+        return dict(LANDCOVER[int(path)], pixel_area_km2=0.25)
+
+    monkeypatch.setattr(agent.ingest, "read_monthly", read_monthly)
+    monkeypatch.setattr(agent.ingest, "data_version", lambda country="BFA": 1)
+    monkeypatch.setattr(agent.raster_align, "list_layer_files", lambda layer: {year: str(year) for year in LANDCOVER})
+    monkeypatch.setattr(agent.gpp_vat, "load_vat", load_vat)
+    for func in (agent.monthly_rainfall, agent.annual_rainfall, agent._rainfall_totals, agent._driest_years,
+                 agent._monthly_rainfall_year, agent._landcover_change, agent._gpp_classes):
+        func.cache_clear()
+    return counts
+
+
+def test_rainfall_totals(calls):
+    answer = agent.run_agent("How much rain fell in BF0001 from 2001-06 to 2001-09?")
+    assert answer == "Rainfall in BF0001 from 2001-06 to 2001-09: 140.0 mm over 4 months."
+
+
+def test_rainfall_totals_default_to_the_whole_record(calls):
+    answer = agent.run_agent("How much rain fell in BF0001?")
+    assert answer == "Rainfall in BF0001 from 2000-01 to 2005-12: 3300.0 mm over 72 months."
+
+
+def test_driest_years(calls):
+    answer = agent.run_agent("Which were the 2 driest years?")
+    assert answer == "Driest years in the country (mean of the ADM2 units): 2003 (360 mm), 2001 (420 mm)."
+
+
+def test_dry_season_is_not_driest_years(calls):
+    answer = agent.run_agent("How much rain fell each month of the 2003 dry season?")
+    assert answer.startswith("Monthly rainfall in 2003 (country mean): 01: 30 mm")
+
+
+def test_landcover_change(calls):
+    answer = agent.run_agent("How did land cover change between 2010 and 2011?")
+    assert answer == "Land cover change 2010-2011: Grasslands: -5 km²; Croplands: +5 km²."
+
+
+def test_memoized_tools_not_recomputed(calls):
+    questions = ["How much rain fell in BF0002 from 2000 to 2002?", "Which were the 3 driest years?",
+                 "How did land cover change between 2010 and 2011?"]
+    first = [agent.run_agent(q) for q in questions]
+    misses = [f.cache_info().misses for f in (agent._rainfall_totals, agent._driest_years, agent._landcover_change)]
+    assert calls == {"read_monthly": 1, "load_vat": 2}
+
+    assert [agent.run_agent(q) for q in questions] == first
+    assert [f.cache_info().misses for f in (agent._rainfall_totals, agent._driest_years, agent._landcover_change)] == misses
+    assert calls == {"read_monthly": 1, "load_vat": 2}
+
+
+@pytest.mark.parametrize("tool, input_text", [
+    (agent.landcover_change, "2010"),
+    (agent.landcover_change, "abc, def"),
+    (agent.landcover_change, "2010, 1999"),
+    (agent.monthly_rainfall_year, ""),
+    (agent.rainfall_totals, "BF0001, 20x1"),
+])
+def test_malformed_input_returns_an_error(calls, tool, input_text):
+    answer = tool(input_text)
+    assert answer.startswith(f"Invalid input {input_text!r}")
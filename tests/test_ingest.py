@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+import ingest
+import partitions
+
+
+PCODES = ["BF0001", "BF0002"]
+HXL = {"date": "#date", "adm_level": "#adm_level", "Pcode": "#adm2+code", "rfh": "#indicator+rfh"}
+
+
+def write_csv(path, dates, hxl=True):
+    rows = [{"date": d, "adm_level": 2, "Pcode": pcode, "rfh": 10.0} for d in dates for pcode in PCODES]
+    df = pd.DataFrame(rows, columns=list(HXL))
+    if hxl:
+        df = pd.concat([pd.DataFrame([HXL]), df])
+    df.to_csv(path, index=False)
+
+
+@pytest.fixture
+def deployment(tmp_path, monkeypatch):
+    """A deployment with only the raw CSV (2000-2001 dekads) and no partitioned store."""
+    monkeypatch.chdir(tmp_path)  # STORE_PATH and WATERMARK_PATH are relative to the working dir
+    history = pd.date_range("2000-01-01", "2001-12-31", freq="MS").strftime("%Y-%m-%d")
+    write_csv("bfa-rainfall-adm2-full.csv", history)
+    write_csv("new.csv", ["2002-01-01", "2002-01-11"], hxl=False)
+    return tmp_path
+
+
+def test_ingest_without_store_keeps_history(deployment):
+    assert not partitions.has_dataset("rainfall")
+    assert ingest.ingest("new.csv") == 4
+
+    rainfall = partitions.read_dataset("rainfall", country="BFA", columns=["Pcode", "date"])
+    assert len(rainfall) == 24 * len(PCODES) + 4
+    monthly = ingest.read_monthly("BFA")
+    assert sorted(monthly["year"].unique()) == [2000, 2001, 2002]
+    assert monthly.loc[monthly["year"] == 2002, "n"].sum() == 4
+
+    watermark = ingest.get_watermark("BFA")
+    assert watermark["max_date"] == "2002-01-11"
+    assert watermark["version"] == 2  # 1: the store built from the CSV, 2: the ingest
+    assert watermark["months"]["2000-01"] == 1 and watermark["months"]["2002-01"] == 2
+
+
+def test_ingest_twice_skips_present_rows(deployment):
+    ingest.ingest("new.csv")
+    assert ingest.ingest("new.csv") == 0
+    with pytest.raises(ValueError):
+        ingest.ingest("new.csv", on_overlap="reject")
+    assert ingest.data_version("BFA") == 2
+
+
+def test_store_generation_without_store_follows_the_csv(deployment):
+    before = ingest.store_generation()
+    write_csv("bfa-rainfall-adm2-full.csv", ["2000-01-01"])
+    assert ingest.store_generation() != before
+    # Reading the generation writes nothing
+    assert not (deployment / ingest.WATERMARK_PATH).exists()
+
+
+def test_read_monthly_without_build_writes_nothing(deployment):
+    monthly = ingest.read_monthly("BFA", build=False)
+    assert sorted(monthly["year"].unique()) == [2000, 2001]
+    assert monthly["n"].sum() == 24 * len(PCODES)
+    assert not partitions.has_dataset("rainfall") and not partitions.has_dataset(ingest.MONTHLY_DATASET)
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+import pytest
+
+import shared_cache
+
+
+@pytest.fixture(params=["disk", "redis"])
+def cache(request, tmp_path, monkeypatch):
+    """memoize backed by a DiskCache in a temporary folder, or by RedisCache on LocalRedis."""
+    if request.param == "disk":
+        backend = shared_cache.DiskCache(str(tmp_path / "shared_cache"))
+    else:
+        backend = shared_cache.RedisCache(shared_cache.LocalRedis())
+    monkeypatch.setattr(shared_cache, "_cache", backend)
+    return backend
+
+
+def counting(namespace, ttl=shared_cache.DEFAULT_TTL, delay=0.0, scope=None):
+    calls = []
+
+    @shared_cache.memoize(namespace, ttl=ttl, scope=scope)
+    def square(x):
+        calls.append(x)
+        time.sleep(delay)
+        return {"x": x, "square": x * x}
+
+    return square, calls
+
+
+def test_hit_and_miss(cache):
+    square, calls = counting("square")
+    assert square(3) == {"x": 3, "square": 9}
+    assert square(3) == {"x": 3, "square": 9}
+    assert square(4) == {"x": 4, "square": 16}
+    assert calls == [3, 4]
+
+
+def test_scope_is_part_of_the_key(cache):
+    generation = ["a"]
+    square, calls = counting("square", scope=lambda: generation[0])
+    square(3)
+    generation[0] = "b"
+    square(3)
+    assert calls == [3, 3]
+
+
+def test_ttl_expiry(cache):
+    square, calls = counting("square", ttl=0.2)
+    square(3)
+    square(3)
+    time.sleep(0.3)
+    square(3)
+    assert calls == [3, 3]
+
+
+def test_concurrent_misses_computed_once(cache):
+    square, calls = counting("square", delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(square(5))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [5]
+    assert results == [{"x": 5, "square": 25}] * 8
+
+
+def test_eviction_to_max_bytes(tmp_path, monkeypatch):
+    # Redis evicts on its own (maxmemory / allkeys-lru): only the disk store trims itself
+    backend = shared_cache.DiskCache(str(tmp_path / "shared_cache"), max_bytes=3000)
+    monkeypatch.setattr(shared_cache, "_cache", backend)
+
+    @shared_cache.memoize("blob")
+    def blob(i):
+        return bytes([i]) * 1000
+
+    for i in range(10):
+        blob(i)
+        time.sleep(0.01)  # distinct access times
+    assert backend.size() <= 3000
+    # The most recent entries are kept, the oldest ones were dropped
+    assert backend.get(shared_cache.make_key("blob", (9,), {})) is not None
+    assert backend.get(shared_cache.make_key("blob", (0,), {})) is None
+    # The lock files go with the entries: one per entry left, plus the eviction's own
+    locks = os.listdir(os.path.join(backend.path, "locks"))
+    assert len(locks) <= len(os.listdir(os.path.join(backend.path, "refs"))) + 1
+
+
+def test_redis_lock_released_only_by_its_holder():
+    client = shared_cache.LocalRedis()
+    backend = shared_cache.RedisCache(client)
+    lock_key = f"{shared_cache.KEY_PREFIX}lock:key"
+    with backend.lock("key", timeout=1):
+        # The lock expired and another replica took it
+        client.set(lock_key, b"other", ex=60)
+    assert client.get(lock_key) == b"other"
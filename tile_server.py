@@ -0,0 +1,303 @@
+import errno
+import io
+import json
+import math
+import os
+import re
+import socket
+import sys
+import threading
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import numpy as np
+import rasterio
+from matplotlib import colormaps
+from PIL import Image
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import Resampling, calculate_default_transform, reproject, transform_bounds
+from rasterio.transform import from_bounds as transform_from_bounds
+from rasterio.windows import from_bounds
+
+import gpp_vat
+import raster_align
+
+
+# Web Mercator pyramids and rendered tiles
+TILE_CACHE_PATH = "tile_cache/"
+TILE_SIZE = 256
+# Local interface only; TILE_PORT=0 picks a free port per process
+TILE_HOST = os.environ.get("TILE_HOST", "127.0.0.1")
+TILE_PORT = int(os.environ.get("TILE_PORT", "8765"))
+# URL the browser uses to reach the tile server (set it when the app runs behind a proxy)
+TILE_SERVER_URL = os.environ.get("TILE_SERVER_URL")
+
+WEB_MERCATOR = "EPSG:3857"
+ORIGIN = 20037508.342789244  # half of the Web Mercator world width, in metres
+
+# Same colormaps as the players of the Geographical Distribution page
+LAYER_CMAPS = {
+    "precipitation": "viridis",
+    "gpp": "plasma",
+    "population": "inferno",
+    "landcover": "magma",
+    "correlation": "RdBu",
+}
+
+# Layers derived from the yearly rasters: one map per key instead of one per year
+DERIVED_LAYERS = ["correlation"]
+
+TRANSPARENT = Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+
+
+def tile_bounds(z, x, y):
+    """Bounds of an XYZ tile in Web Mercator metres (left, bottom, right, top)."""
+    size = 2 * ORIGIN / 2 ** z
+    left = -ORIGIN + x * size
+    top = ORIGIN - y * size
+    return left, top - size, left + size, top
+
+
+def layer_files(layer):
+    """{year or map name: path} of a tiled layer."""
+    if layer == "correlation":
+        import correlation
+        return correlation.correlation_files()
+    return raster_align.list_layer_files(layer)
+
+
+def layer_resampling(layer):
+    return raster_align.LAYERS[layer]["resampling"] if layer in raster_align.LAYERS else Resampling.average
+
+
+def pyramid_path(layer, year):
+    return os.path.join(TILE_CACHE_PATH, "pyramids", f"{layer}_{year}.tif")
+
+
+def build_pyramid(layer, year):
+    """Web Mercator copy of a source raster with internal overviews, built once.
+
+    Sources that already carry overviews (internal, or an external .ovr next to the .tif)
+    are not copied: the tiles are warped on the fly and GDAL reads their overviews."""
+    src_path = layer_files(layer)[year]
+    with rasterio.open(src_path) as src:
+        if src.overviews(1) and src.crs is not None:
+            return src_path
+    out_path = pyramid_path(layer, year)
+    if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(src_path):
+        return out_path
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", rasterio.errors.NotGeoreferencedWarning)
+        with rasterio.open(src_path) as src:
+            crs, transform = raster_align.source_georeference(layer, src_path, src)
+            data = src.read(1).astype(np.float32)
+            if src.nodata is not None:
+                data[data == np.float32(src.nodata)] = np.nan
+            if layer == "gpp":
+                data[data >= gpp_vat.GPP_FILL_MIN] = np.nan
+            left, bottom, right, top = rasterio.transform.array_bounds(src.height, src.width, transform)
+            dst_transform, width, height = calculate_default_transform(
+                crs, WEB_MERCATOR, src.width, src.height, left, bottom, right, top)
+
+    resampling = layer_resampling(layer)
+    out = np.full((height, width), np.nan, dtype=np.float32)
+    reproject(data, out, src_transform=transform, src_crs=crs, src_nodata=np.nan,
+              dst_transform=dst_transform, dst_crs=WEB_MERCATOR, dst_nodata=np.nan, resampling=resampling)
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    profile = {"driver": "GTiff", "dtype": "float32", "count": 1, "nodata": np.nan, "crs": WEB_MERCATOR,
+               "transform": dst_transform, "width": width, "height": height,
+               "tiled": True, "blockxsize": TILE_SIZE, "blockysize": TILE_SIZE, "compress": "deflate"}
+    with rasterio.open(out_path, "w", **profile) as dst:
+        dst.write(out, 1)
+        # Halve the resolution until the whole raster fits in one tile
+        levels = max(1, math.ceil(math.log2(max(width, height) / TILE_SIZE)))
+        dst.build_overviews([2 ** i for i in range(1, levels + 1)], resampling)
+    return out_path
+
+
+def layer_range(layer):
+    """Colour scale of a layer (2nd-98th percentile over all years), stored once in a JSON file."""
+    if layer == "correlation":
+        return [-1.0, 1.0]
+    path = os.path.join(TILE_CACHE_PATH, "ranges.json")
+    ranges = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            ranges = json.load(f)
+    if layer not in ranges:
+        values = []
+        for year in layer_files(layer):
+            with rasterio.open(build_pyramid(layer, year)) as src:
+                # The smallest overview is enough for the percentiles
+                factor = (src.overviews(1) or [1])[-1]
+                data = src.read(1, out_shape=(max(1, src.height // factor), max(1, src.width // factor)),
+                                masked=True).astype(np.float32)
+                values.append(data.compressed())
+        values = np.concatenate(values)
+        values = values[np.isfinite(values)]
+        # Class codes keep their full range, continuous layers drop the outliers
+        low, high = (0, 100) if layer == "landcover" else (2, 98)
+        ranges[layer] = [float(np.percentile(values, low)), float(np.percentile(values, high))]
+        os.makedirs(TILE_CACHE_PATH, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(ranges, f)
+    return ranges[layer]
+
+
+def render_tile(layer, year, z, x, y):
+    """Colormapped RGBA image of one tile, or None when the tile does not touch the raster."""
+    path = build_pyramid(layer, year)
+    left, bottom, right, top = tile_bounds(z, x, y)
+    resampling = layer_resampling(layer)
+    with rasterio.open(path) as src:
+        bounds = src.bounds if src.crs == WEB_MERCATOR else transform_bounds(src.crs, WEB_MERCATOR, *src.bounds)
+        if left >= bounds[2] or right <= bounds[0] or bottom >= bounds[3] or top <= bounds[1]:
+            return None
+        if src.crs == WEB_MERCATOR:
+            # GDAL picks the overview matching the tile resolution
+            window = from_bounds(left, bottom, right, top, transform=src.transform)
+            data = src.read(1, window=window, out_shape=(TILE_SIZE, TILE_SIZE), boundless=True, masked=True,
+                            resampling=resampling).astype(np.float32)
+        else:
+            # Warp straight onto the tile grid
+            tile_transform = transform_from_bounds(left, bottom, right, top, TILE_SIZE, TILE_SIZE)
+            with WarpedVRT(src, crs=WEB_MERCATOR, transform=tile_transform, width=TILE_SIZE, height=TILE_SIZE,
+                           resampling=resampling) as vrt:
+                data = vrt.read(1, masked=True).astype(np.float32)
+
+    vmin, vmax = layer_range(layer)
+    scaled = np.clip((data.filled(np.nan) - vmin) / ((vmax - vmin) or 1), 0, 1)
+    rgba = colormaps[LAYER_CMAPS[layer]](np.nan_to_num(scaled), bytes=True)
+    rgba[..., 3] = np.where(np.isfinite(scaled), 255, 0)
+    return Image.fromarray(rgba, "RGBA")
+
+
+def get_tile(layer, year, z, x, y, fmt="png"):
+    """Encoded tile from the on-disk cache, rendered on the first request."""
+    path = os.path.join(TILE_CACHE_PATH, "tiles", layer, str(year), str(z), str(x), f"{y}.{fmt}")
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    image = render_tile(layer, year, z, x, y) or TRANSPARENT
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP" if fmt == "webp" else "PNG")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + f".{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
+    return buffer.getvalue()
+
+
+def server_url():
+    """Base URL of the tile server: TILE_SERVER_URL, else TILE_HOST (this machine's name when it
+    listens on every interface) and the port this process listens on (or TILE_PORT, served by a
+    sibling replica)."""
+    if TILE_SERVER_URL:
+        return TILE_SERVER_URL
+    port = _server.server_address[1] if _server is not None else TILE_PORT
+    host = socket.getfqdn() if TILE_HOST in ("", "0.0.0.0", "::") else TILE_HOST
+    return f"http://{f'[{host}]' if ':' in host else host}:{port}"
+
+
+def _is_loopback(host):
+    return host in ("localhost", "127.0.0.1", "::1") or host.startswith("127.")
+
+
+def reachable_from(browser_host):
+    """False when the tiles are served on the loopback interface but the browser reaches the app
+    through another host (the Host header of its requests): it would ask its own machine."""
+    if TILE_SERVER_URL or not browser_host:
+        return True
+    return _is_loopback(urlsplit(f"//{browser_host}").hostname or "") or not _is_loopback(TILE_HOST)
+
+
+def tile_url(layer, year, fmt="png"):
+    """URL template of a layer / year, for pydeck."""
+    return f"{server_url()}/tiles/{layer}/{year}/{{z}}/{{x}}/{{y}}.{fmt}"
+
+
+def boundaries_url(adm_level=2):
+    return f"{server_url()}/boundaries/adm{adm_level}.geojson"
+
+
+def layer_center(layer):
+    """(longitude, latitude) of the centre of a layer, for the initial map view."""
+    files = layer_files(layer)
+    path = next(iter(files.values()))
+    with rasterio.open(path) as src:
+        crs, transform = raster_align.source_georeference(layer, path, src)
+        bounds = rasterio.transform.array_bounds(src.height, src.width, transform)
+    left, bottom, right, top = transform_bounds(crs, "EPSG:4326", *bounds)
+    return (left + right) / 2, (bottom + top) / 2
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    route = re.compile(r"^/tiles/(?P<layer>\w+)/(?P<year>\w+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.(?P<fmt>png|webp)$")
+
+    boundaries_route = re.compile(r"^/boundaries/adm(?P<level>[12])\.geojson$")
+
+    def do_GET(self):
+        boundaries = self.boundaries_route.match(self.path)
+        if boundaries:
+            # Simplified ADM boundaries for the rainfall choropleth, cached by the browser
+            import choropleth
+            self._send(choropleth.simplified_boundaries(int(boundaries["level"])), "application/geo+json")
+            return
+        match = self.route.match(self.path)
+        if not match or match["layer"] not in LAYER_CMAPS:
+            self.send_error(404)
+            return
+        try:
+            year = match["year"] if match["layer"] in DERIVED_LAYERS else int(match["year"])
+            body = get_tile(match["layer"], year, int(match["z"]), int(match["x"]), int(match["y"]),
+                            match["fmt"])
+        except (KeyError, ValueError):  # no raster for that year
+            self.send_error(404)
+            return
+        self._send(body, f"image/{match['fmt']}")
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "public, max-age=86400")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_server(port=TILE_PORT, host=TILE_HOST):
+    """Starts the tile server in a background thread (once per process) and returns it.
+
+    When the port is taken, another replica on this host already serves the same tile cache:
+    its server is used and None is returned."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), TileHandler)
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    raise
+                return None
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+
+if __name__ == "__main__":
+    # Usage: python tile_server.py [port]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else TILE_PORT
+    _server = ThreadingHTTPServer((TILE_HOST, port), TileHandler)
+    print(f"Serving tiles on {server_url()}/tiles/<layer>/<year>/<z>/<x>/<y>.png")
+    _server.serve_forever()